@@ -1,80 +1,153 @@
 import os    
 import json    
+import time    
 import logging    
-import traceback  # Ajout de l'import traceback qui manquait  
-from flask import Flask, request, jsonify, render_template    
-from pymongo import MongoClient    
-from bson import ObjectId  # Import ObjectId for proper handling    
+import uuid    
+import threading    
+from flask import Flask, Response, request, jsonify, render_template, url_for    
 from services.vector_recommender import VectorRecommender    
+from services.shortlists import ShortlistService    
 from services.job_offer import JobOffer    
-from services.extractor import extract_text_from_pdf    
-from services.llm_structurer import LLMStructurer    
-from services.llm_recommender import LLMRecommender  # Ajout de l'import LLMRecommender  
+from services.skill_index import degree_level, experience_years    
+from services.cv_pipeline import process_cv_file, CVPipelineError    
+from services.job_queue import JobQueue, WorkerPool    
+from utils.mongodb import get_client, ensure_indexes, CVRepository, pool_metrics, convert_objectid_to_str    
+from utils.disk_cache import cache_metrics    
+from utils.result_cache import get_result_cache, result_cache_metrics    
+from utils.metrics import registry, start_request_timings, request_timings, server_timing_header    
     
 # Create Flask application    
 app = Flask(__name__)    
 logging.basicConfig(level=logging.DEBUG)    
 logger = logging.getLogger(__name__)    
     
-# Function to convert ObjectId to string in nested dictionaries and lists    
-def convert_objectid_to_str(obj):    
-    if isinstance(obj, ObjectId):    
-        return str(obj)    
-    elif isinstance(obj, dict):    
-        return {k: convert_objectid_to_str(v) for k, v in obj.items()}    
-    elif isinstance(obj, list):    
-        return [convert_objectid_to_str(item) for item in obj]    
-    return obj    
-    
-# MongoDB connection    
+    
+# MongoDB connection: one pooled client shared by all requests    
 def get_mongodb_client():    
     mongodb_uri = os.environ.get("MONGODB_URI", "mongodb://mongo:27017/cv_database")    
-    logger.debug(f"Connecting to MongoDB with URI: {mongodb_uri}")    
-    client = MongoClient(mongodb_uri)    
-    # Test the connection    
+    return get_client(mongodb_uri)    
+    
+# Secondary indexes (email lookups, upserts, incremental syncs) are created at startup,    
+# in the background so that an unreachable MongoDB does not delay the application start    
+def provision_indexes():    
     try:    
-        client.admin.command('ping')    
-        logger.debug("MongoDB connection successful")    
-        return client    
+        ensure_indexes(client=get_mongodb_client())    
     except Exception as e:    
-        logger.error(f"MongoDB connection failed: {str(e)}")    
-        raise    
+        logger.error(f"Erreur lors de la création des index MongoDB: {str(e)}")    
+    
+threading.Thread(target=provision_indexes, name="mongodb-indexes", daemon=True).start()    
+    
+# Vector recommenders are shared by all requests: the model and the CV vectors are loaded once    
+_vector_recommenders = {}    
+    
+def get_vector_recommender(vectorizer_type=None):    
+    vectorizer_type = vectorizer_type or os.environ.get("VECTORIZER_TYPE", "tfidf")    
+    if vectorizer_type not in _vector_recommenders:    
+        mongodb_uri = os.environ.get("MONGODB_URI", "mongodb://mongo:27017/cv_database")    
+        _vector_recommenders[vectorizer_type] = VectorRecommender(    
+            mongodb_uri=mongodb_uri,    
+            vectorizer_type=vectorizer_type    
+        )    
+    return _vector_recommenders[vectorizer_type]    
+    
+# Persisted job offers and their shortlists, kept up to date as CVs are uploaded    
+_shortlist_services = {}    
+    
+def get_shortlist_service():    
+    recommender = get_vector_recommender()    
+    if recommender.vectorizer_type not in _shortlist_services:    
+        _shortlist_services[recommender.vectorizer_type] = ShortlistService(recommender)    
+    return _shortlist_services[recommender.vectorizer_type]    
+    
+# Asynchronous ingestion: uploads are queued and processed by background workers    
+_ingestion = {"queue": None, "workers": None}    
+_ingestion_lock = threading.Lock()    
+    
+def process_cv_job(payload, set_stage):    
+    return process_cv_file(    
+        payload["file_path"],    
+        mongodb_client=get_mongodb_client(),    
+        vector_recommender=get_vector_recommender(),    
+        on_stage=set_stage,    
+        shortlists=get_shortlist_service()    
+    )    
+    
+def get_ingestion_queue():    
+    with _ingestion_lock:    
+        if _ingestion["queue"] is None:    
+            job_queue = JobQueue(os.environ.get("INGESTION_QUEUE_PATH", "data/jobs.sqlite3"))    
+            workers = WorkerPool(    
+                job_queue,    
+                handlers={"cv_ingestion": process_cv_job},    
+                workers=int(os.environ.get("INGESTION_WORKERS", 2))    
+            )    
+            workers.start()    
+            _ingestion["queue"], _ingestion["workers"] = job_queue, workers    
+        return _ingestion["queue"]    
+    
+# Per-request timing: duration histogram, and Server-Timing header with the stage spans if enabled    
+SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "false").lower() in ("1", "true", "yes")    
+    
+@app.before_request    
+def start_timer():    
+    request.start_time = time.perf_counter()    
+    start_request_timings()    
+    
+@app.after_request    
+def record_timing(response):    
+    start_time = getattr(request, "start_time", None)    
+    if start_time is None:    
+        return response    
+    elapsed = time.perf_counter() - start_time    
+    registry.observe(    
+        "http_request_duration_seconds", elapsed,    
+        endpoint=request.endpoint or "unknown", method=request.method, status=response.status_code    
+    )    
+    if SERVER_TIMING:    
+        timings = request_timings() + [("total", elapsed)]    
+        response.headers["Server-Timing"] = server_timing_header(timings)    
+    return response    
     
 @app.route('/')    
 def index():    
     return render_template('index.html')    
     
-@app.route('/api/recommander-cv', methods=['POST'])    
-def recommander_cv():    
-    # Get form data    
-    data = request.form    
+# Largest number of job offers accepted by the batch matching endpoint    
+MAX_BATCH_OFFERS = int(os.environ.get("MAX_BATCH_OFFERS", 100))    
+    
+# Extra CVs ranked beyond top_n, so that results still fill top_n after duplicate    
+# candidates (CVs saved before upserts were used) are dropped    
+DUPLICATE_MARGIN = int(os.environ.get("DUPLICATE_MARGIN", 5))    
         
-    # Create job offer object    
+def parse_job_offer(data):    
+    # Job offer fields and optional hard requirements (applied before scoring), from the form or a JSON object    
+    competences = data["competences"]    
+    if isinstance(competences, str):    
+        competences = competences.split(",")    
     offre = {    
         "titre": data["titre_poste"],    
-        "competences_requises": [comp.strip() for comp in data["competences"].split(",") if comp.strip()],    
+        "competences_requises": [comp.strip() for comp in competences if comp.strip()],    
         "experience": data["experience"],    
         "diplome": data["diplome"],    
         "description": data.get("description", "")    
     }    
+    min_skills = str(data.get("min_competences", "")).strip()    
+    prefilter = {    
+        "min_skills": int(min_skills) if min_skills else None,    
+        "min_degree_level": degree_level(offre["diplome"]) if data.get("diplome_obligatoire") else None,    
+        "min_experience_years": experience_years(offre["experience"]) if data.get("experience_obligatoire") else None    
+    }    
+    return JobOffer.from_dict(offre).to_dict(), prefilter    
         
-    # Initialize vector recommender    
-    mongodb_uri = os.environ.get("MONGODB_URI", "mongodb://mongo:27017/cv_database")    
-    recommender = VectorRecommender(    
-        mongodb_uri=mongodb_uri,    
-        vectorizer_type="tfidf"    
-    )    
-        
-    # Recommend CVs    
-    job_offer = JobOffer.from_dict(offre)    
-    recommendations = recommender.recommend_cvs(job_offer.to_dict(), top_n=5)    
-        
-    # Format results for display    
+def format_results(recommendations, top_n=None):    
+    # Format results for display, keeping the best CV of each candidate (at most top_n results)    
     results = []      
     seen_cvs = {}  # Dictionnaire pour suivre les CVs déjà vus    
     
     if recommendations:      
         for recommendation in recommendations:      
+            if top_n is not None and len(results) >= top_n:    
+                break    
             cv = recommendation["cv"]      
             score = recommendation["score"]      
                   
@@ -82,11 +155,11 @@ def recommander_cv():
             email = cv.get("informations_personnelles", {}).get("email", "")    
                 
             # Vérifier si ce CV a déjà été ajouté    
-            if email and email in seen_cvs:    
+            if email and email.strip().lower() in seen_cvs:    
                 continue  # Ignorer ce CV car il a déjà été ajouté    
                     
             # Marquer ce CV comme vu    
-            seen_cvs[email] = True    
+            seen_cvs[email.strip().lower()] = True    
                   
             # Extract relevant CV information      
             nom = cv.get("informations_personnelles", {}).get("nom", "")      
@@ -102,9 +175,126 @@ def recommander_cv():
                   
             results.append(result)    
         
+    return results    
+    
+def recommendation_cache_key(recommender, normalized_offer, prefilter, top_n):    
+    # Same normalized offer, same filters and same corpus: same recommendations    
+    return (    
+        json.dumps(normalized_offer, ensure_ascii=False, sort_keys=True),    
+        json.dumps(prefilter, sort_keys=True),    
+        top_n,    
+        recommender.corpus_version()    
+    )    
+    
+@app.route('/api/recommander-cv', methods=['POST'])    
+def recommander_cv():    
+    # Create job offer object from the form data    
+    try:    
+        job_offer, prefilter = parse_job_offer(request.form)    
+    except (KeyError, TypeError, ValueError, AttributeError) as e:    
+        return jsonify({"success": False, "error": f"Invalid job offer: {e}"}), 400    
+        
+    # Get the shared vector recommender    
+    recommender = get_vector_recommender()    
+        
+    # Recommend CVs: repeated submissions are served from the result cache (without    
+    # touching MongoDB) until a CV is added or removed; identical concurrent queries compute once.    
+    # The offer is matched in its normalized form, so that offers sharing a key get the same results    
+    normalized_offer = JobOffer.from_dict(job_offer).normalized_dict()    
+    key = recommendation_cache_key(recommender, normalized_offer, prefilter, 5 + DUPLICATE_MARGIN)    
+    recommendations = get_result_cache("recommander-cv").get_or_compute(    
+        key,    
+        lambda: recommender.recommend_cvs(normalized_offer, top_n=5 + DUPLICATE_MARGIN, **prefilter),    
+        should_cache=bool  # Empty results may come from a failed search    
+    )    
+        
     # Convert any ObjectId to string before JSON serialization    
-    results = convert_objectid_to_str(results)    
-    return jsonify(results)
+    results = convert_objectid_to_str(format_results(recommendations, top_n=5))    
+    return jsonify(results)    
+    
+@app.route('/api/recommander-cv/batch', methods=['POST'])    
+def recommander_cv_batch():    
+    # Job offers as a JSON body {"offres": [...], "top_n": 5} or an uploaded JSON file of offers    
+    if 'offres_file' in request.files:    
+        try:    
+            payload = {"offres": json.load(request.files['offres_file']), "top_n": request.form.get("top_n", 5)}    
+        except ValueError:    
+            return jsonify({"success": False, "error": "The offers file is not valid JSON"}), 400    
+    else:    
+        payload = request.get_json(silent=True) or {}    
+        
+    offres = payload.get("offres")    
+    if not isinstance(offres, list) or not offres:    
+        return jsonify({"success": False, "error": "A non-empty 'offres' list is required"}), 400    
+    if len(offres) > MAX_BATCH_OFFERS:    
+        return jsonify({"success": False, "error": f"At most {MAX_BATCH_OFFERS} job offers per request"}), 400    
+        
+    try:    
+        parsed = [parse_job_offer(offre) for offre in offres]    
+        top_n = int(payload.get("top_n", 5))    
+    except (KeyError, TypeError, ValueError, AttributeError) as e:    
+        return jsonify({"success": False, "error": f"Invalid job offer: {e}"}), 400    
+        
+    # All offers are scored against the CVs in one pass    
+    recommender = get_vector_recommender()    
+    batches = recommender.recommend_cvs_batch(    
+        [job_offer for job_offer, _ in parsed],    
+        top_n=top_n + DUPLICATE_MARGIN,    
+        prefilters=[prefilter for _, prefilter in parsed]    
+    )    
+        
+    results = [    
+        {"titre_poste": job_offer["titre"], "resultats": format_results(recommendations, top_n=top_n)}    
+        for (job_offer, _), recommendations in zip(parsed, batches)    
+    ]    
+    return jsonify(convert_objectid_to_str(results))    
+    
+@app.route('/api/offres', methods=['POST'])    
+def create_offre():    
+    # Save the job offer (form or JSON fields) and build its shortlist    
+    data = request.get_json(silent=True) if request.is_json else request.form    
+    try:    
+        job_offer, prefilter = parse_job_offer(data or {})    
+    except (KeyError, TypeError, ValueError, AttributeError) as e:    
+        return jsonify({"success": False, "error": f"Invalid job offer: {e}"}), 400    
+        
+    service = get_shortlist_service()    
+    offer_id = service.create_offer(job_offer, prefilter)    
+    shortlist = service.get_shortlist(offer_id, top_n=5 + DUPLICATE_MARGIN)    
+    return jsonify({    
+        "success": True,    
+        "offre_id": offer_id,    
+        "resultats": convert_objectid_to_str(format_results(shortlist["recommandations"], top_n=5))    
+    }), 201    
+    
+@app.route('/api/offres', methods=['GET'])    
+def list_offres():    
+    offres = [    
+        {"offre_id": str(offre["_id"]), "titre_poste": offre.get("titre", ""), "competences": offre.get("competences_requises", [])}    
+        for offre in get_shortlist_service().list_offers()    
+    ]    
+    return jsonify(offres)    
+    
+@app.route('/api/offres/<offre_id>/candidats', methods=['GET'])    
+def get_offre_candidats(offre_id):    
+    # Best candidates read from the materialized shortlist (?refresh=1 re-ranks the whole corpus)    
+    top_n = request.args.get("top_n", 5, type=int)    
+    refresh = request.args.get("refresh", "").lower() in ("1", "true", "yes")    
+    shortlist = get_shortlist_service().get_shortlist(offre_id, top_n=top_n + DUPLICATE_MARGIN, refresh=refresh)    
+    if shortlist is None:    
+        return jsonify({"success": False, "error": "Job offer not found"}), 404    
+    return jsonify({    
+        "success": True,    
+        "offre": convert_objectid_to_str(shortlist["offre"]),    
+        "resultats": convert_objectid_to_str(format_results(shortlist["recommandations"], top_n=top_n))    
+    })    
+    
+@app.route('/api/offres/<offre_id>/fermer', methods=['POST'])    
+def close_offre(offre_id):    
+    if not get_shortlist_service().close_offer(offre_id):    
+        return jsonify({"success": False, "error": "Job offer not found"}), 404    
+    return jsonify({"success": True, "offre_id": offre_id})    
+    
 @app.route('/upload-cv', methods=['POST'])    
 def upload_cv():    
     logger.debug("Début de la fonction upload_cv")    
@@ -120,132 +310,55 @@ def upload_cv():
         logger.error("Erreur: Nom de fichier vide")    
         return jsonify({"error": "No file selected"}), 400    
         
-    # Save uploaded file    
+    # Save uploaded file (prefixed so concurrent uploads of the same name do not collide)    
     upload_folder = "data/cvs"    
     os.makedirs(upload_folder, exist_ok=True)    
-    file_path = os.path.join(upload_folder, file.filename)    
+    file_path = os.path.join(upload_folder, f"{uuid.uuid4().hex[:8]}_{file.filename}")    
     file.save(file_path)    
         
-    # Process CV    
-    output_folder = "data/outputs"    
-    os.makedirs(output_folder, exist_ok=True)    
-    output_txt_path = os.path.join(output_folder, "output.txt")    
-    output_json_path = os.path.join(output_folder, "structured_cv.json")    
+    # Asynchronous mode: queue the CV and return a job id immediately    
+    if request.values.get("async", "").lower() in ("1", "true", "yes"):    
+        job_id = get_ingestion_queue().enqueue("cv_ingestion", {"file_path": file_path})    
+        _ingestion["workers"].notify()    
+        logger.debug(f"CV mis en file d'attente avec le job {job_id}")    
+        return jsonify({    
+            "success": True,    
+            "job_id": job_id,    
+            "status_url": url_for("get_job", job_id=job_id)    
+        }), 202    
         
-    # Extract and structure CV    
+    # Extract, structure and save CV    
     try:    
-        raw_text = extract_text_from_pdf(file_path, output_txt_path)    
-        logger.debug("Extraction du texte terminée")    
-            
-        # Structure CV via LLM    
-        logger.debug("Début de la structuration via LLM")    
-        api_key = os.environ.get("GROQ_API_KEY")    
-        if not api_key:    
-            logger.error("Clé API GROQ non définie")    
-            return jsonify({"success": False, "error": "GROQ API key not set"}), 500    
-                
-        structurer = LLMStructurer(api_key=api_key)    
-        cv_json = structurer.structure_cv(raw_text)    
-            
-        if cv_json:    
-            logger.debug("Structuration réussie, sauvegarde du JSON")    
-            # Log the CV JSON content for debugging    
-            logger.debug(f"CV JSON content preview: {json.dumps(cv_json, ensure_ascii=False)[:200]}...")    
-                
-            # Save structured CV    
-            with open(output_json_path, "w", encoding="utf-8") as f:    
-                json.dump(cv_json, f, ensure_ascii=False, indent=2)    
-                
-            # Save to MongoDB    
-            try:    
-                logger.debug("Tentative de connexion à MongoDB")    
-                client = get_mongodb_client()    
-                logger.debug("Connexion à MongoDB réussie")    
-                    
-                # Ensure we're using the right database - use explicit database name    
-                db = client["cv_database"]  # Use explicit database name instead of get_database()    
-                logger.debug(f"Using database: {db.name}")    
-                    
-                # Make sure the collection exists    
-                collection_name = "cvs"    
-                if collection_name not in db.list_collection_names():    
-                    logger.debug(f"Creating collection: {collection_name}")    
-                    db.create_collection(collection_name)    
-                    
-                # Save to MongoDB and get the ID as a string    
-                inserted_id = structurer.save_to_mongodb(cv_json, client)    
-                logger.debug(f"Données sauvegardées avec ID: {inserted_id}")    
-                client.close()    
-                    
-                # Make sure inserted_id is a string    
-                if inserted_id is not None:    
-                    inserted_id_str = str(inserted_id)    
-                else:    
-                    inserted_id_str = None    
-                  
-                recommendations_data = None  
-                try:    
-                    profiles_file = "data/profiles/it_profiles.json"    
-                    output_recommendations_path = "data/outputs/recommendations.json"    
-                        
-                    # Initialiser le recommandeur LLM avec la même clé API que le structureur    
-                    llm_recommender = LLMRecommender(api_key=api_key)    
-                    
-                    # Convert any ObjectId objects to strings before passing to the recommender  
-                    cv_json_converted = convert_objectid_to_str(cv_json)  
-                        
-                    # Recommander des profils    
-                    recommendations = llm_recommender.recommend_profiles(    
-                        cv_json=cv_json_converted,    
-                        profiles_file=profiles_file    
-                    )    
-                        
-                    # Sauvegarder les recommandations    
-                    if recommendations:    
-                        llm_recommender.save_recommendations_to_file(    
-                            recommendations,    
-                            output_recommendations_path    
-                        )    
-                        logger.debug(f"Recommandations de profils sauvegardées dans {output_recommendations_path}")  
-                        recommendations_data = recommendations  # Stocker les recommandations pour la réponse  
-                except Exception as e:    
-                    logger.error(f"Erreur lors de la recommandation de profils: {str(e)}")    
-                    # Ne pas faire échouer le processus principal si la recommandation échoue  
-                
-                # Puis, dans la création de response_data, ajoutez les recommandations  
-                response_data = {    
-                    "success": True,    
-                    "message": "CV processed and saved successfully",    
-                    "cv_data": cv_json,    
-                    "recommendations": recommendations_data,  # Ajouter les recommandations  
-                    "id": inserted_id_str    
-                }    
-                    
-                # Convert any ObjectId objects to strings in the entire response    
-                response_data = convert_objectid_to_str(response_data)    
-                    
-                # Return JSON response with string ID    
-                return jsonify(response_data)    
-            except Exception as e:    
-                logger.error(f"Erreur lors de la sauvegarde dans MongoDB: {str(e)}")    
-                logger.debug(traceback.format_exc())  # Add stack trace for better debugging    
-                return jsonify({    
-                    "success": False,    
-                    "error": f"Error saving to MongoDB: {str(e)}"    
-                }), 500    
-        else:    
-            logger.error("Échec de la structuration du CV")    
-            return jsonify({    
-                "success": False,    
-                "error": "CV structuring failed"    
-            }), 500    
-    except Exception as e:    
-        logger.error(f"Erreur lors du traitement du CV: {str(e)}")    
-        logger.debug(traceback.format_exc())  # Add stack trace for better debugging    
+        response_data = process_cv_file(    
+            file_path,    
+            mongodb_client=get_mongodb_client(),    
+            vector_recommender=get_vector_recommender(),    
+            shortlists=get_shortlist_service()    
+        )    
+        return jsonify(response_data)    
+    except CVPipelineError as e:    
         return jsonify({    
             "success": False,    
-            "error": f"Error processing CV: {str(e)}"    
+            "error": str(e)    
         }), 500    
+    
+    
+@app.route('/jobs/<job_id>', methods=['GET'])    
+def get_job(job_id):    
+    job = get_ingestion_queue().get(job_id)    
+    if job is None:    
+        return jsonify({"success": False, "error": "Job not found"}), 404    
+        
+    response_data = {    
+        "success": job["status"] != "failed",    
+        "job_id": job["id"],    
+        "status": job["status"],    
+        "stage": job["stage"],    
+        "attempts": job["attempts"],    
+        "result": job["result"],    
+        "error": job["error"]    
+    }    
+    return jsonify(response_data)    
 
 
 @app.route('/api/get-cv', methods=['GET'])  
@@ -255,14 +368,8 @@ def get_cv():
         return jsonify({"success": False, "error": "Email parameter is required"}), 400  
       
     try:  
-        # Connexion à MongoDB  
-        client = get_mongodb_client()  
-        db = client["cv_database"]  
-        collection = db["cvs"]  
-          
         # Recherche du CV par email  
-        cv = collection.find_one({"informations_personnelles.email": email})  
-        client.close()  
+        cv = CVRepository(client=get_mongodb_client()).find_by_email(email)    
           
         if cv:  
             # Convertir ObjectId en string  
@@ -276,5 +383,26 @@ def get_cv():
         return jsonify({"success": False, "error": f"Error retrieving CV: {str(e)}"}), 500
     
     
+@app.route('/api/db-metrics', methods=['GET'])    
+def db_metrics():    
+    # Connection pool metrics of the shared MongoDB client    
+    return jsonify(pool_metrics())    
+    
+    
+@app.route('/api/cache-metrics', methods=['GET'])    
+def get_cache_metrics():    
+    # Hit rates and sizes of the on-disk caches (extraction, profiles, LLM responses)    
+    # and of the in-memory result caches    
+    metrics = cache_metrics()    
+    metrics.update({f"results:{name}": stats for name, stats in result_cache_metrics().items()})    
+    return jsonify(metrics)    
+    
+    
+@app.route('/metrics', methods=['GET'])    
+def metrics():    
+    # Stage latencies, request durations and LLM token counts in the Prometheus text format    
+    return Response(registry.render_prometheus(), mimetype="text/plain; version=0.0.4")    
+    
+    
 if __name__ == '__main__':    
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
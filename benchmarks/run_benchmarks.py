@@ -0,0 +1,329 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+DEFAULT_SIZES = "1000,10000,100000,500000"
+DEFAULT_MODES = "tfidf,sentence_transformer"
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of the current process in MB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_summary(latencies):
+    """Return the mean and percentiles of latencies given in seconds, in milliseconds."""
+    values = np.asarray(latencies) * 1000
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3)
+    }
+
+
+def _isolate_caches():
+    """Point the on-disk caches to a temporary directory and disable the LLM response cache."""
+    cache_dir = tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ["CACHE_DIR"] = cache_dir
+    os.environ["LLM_CACHE_TTL"] = "0"
+    return cache_dir
+
+
+def run_matching_case(mode, size, queries, top_n, seed, model_name=None, ann_backend=None):
+    """
+    Benchmark recommend_cvs on a synthetic corpus, in a fresh process.
+
+    The CVs are served from memory instead of MongoDB, so the figures cover
+    vectorization, scoring and result formatting only.
+
+    Returns:
+        dict: Indexing time, query latencies, throughput, peak RSS and, with an ANN
+            index, its recall@top_n against exact search on the benchmark offers
+    """
+    import services.vector_recommender as vector_recommender_module
+    from benchmarks.synthetic import generate_cvs, generate_job_offers
+    from benchmarks.stubs import InMemoryCVRepository
+
+    cache_dir = _isolate_caches()
+    store_dir = tempfile.mkdtemp(prefix="bench-vectors-")
+    try:
+        start = time.perf_counter()
+        cvs = generate_cvs(size, seed)
+        generation_seconds = time.perf_counter() - start
+
+        repository = InMemoryCVRepository(cvs)
+        vector_recommender_module.CVRepository = lambda *args, **kwargs: repository
+        recommender = vector_recommender_module.VectorRecommender(
+            mongodb_uri="memory://benchmark",
+            vectorizer_type=mode,
+            model_name=model_name,
+            store_dir=store_dir,
+            ann_backend=ann_backend
+        )
+
+        start = time.perf_counter()
+        recommender.sync_from_mongodb(repository)
+        index_seconds = time.perf_counter() - start
+
+        offers = generate_job_offers(queries, seed)
+        # The first query builds the CV matrix
+        start = time.perf_counter()
+        recommender.recommend_cvs(offers[0], top_n)
+        first_query_seconds = time.perf_counter() - start
+
+        latencies = []
+        empty_results = 0
+        start = time.perf_counter()
+        for offer in offers:
+            query_start = time.perf_counter()
+            if not recommender.recommend_cvs(offer, top_n):
+                empty_results += 1
+            latencies.append(time.perf_counter() - query_start)
+        total_seconds = time.perf_counter() - start
+
+        # The same offers scored together in one batch
+        start = time.perf_counter()
+        recommender.recommend_cvs_batch(offers, top_n)
+        batch_seconds = time.perf_counter() - start
+
+        ann_recall = None
+        if recommender.ann_index is not None:
+            queries_matrix = recommender.vectorize_texts([recommender.preprocess_job_offer(offer) for offer in offers])
+            ann_recall = recommender.evaluate_ann_recall(k=top_n, queries=queries_matrix)
+
+        return {
+            "mode": mode,
+            "size": size,
+            "queries": queries,
+            "top_n": top_n,
+            "ann_backend": ann_backend,
+            "generation_seconds": round(generation_seconds, 3),
+            "index_seconds": round(index_seconds, 3),
+            "index_throughput_cvs_per_second": round(size / index_seconds, 1) if index_seconds else None,
+            "first_query_ms": round(first_query_seconds * 1000, 3),
+            "latency_ms": latency_summary(latencies),
+            "throughput_qps": round(queries / total_seconds, 2),
+            "batch_ms": round(batch_seconds * 1000, 3),
+            "batch_throughput_qps": round(queries / batch_seconds, 2) if batch_seconds else None,
+            "empty_results": empty_results,
+            "ann_recall": ann_recall,
+            "peak_rss_mb": peak_rss_mb()
+        }
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def run_ingestion_case(pdf_dir, profiles_file):
+    """
+    Benchmark text extraction, structuring and profile recommendation on the
+    PDFs of a directory, in a fresh process. The LLM is stubbed, so only the
+    local work (pre-extraction, prompt building, response parsing, profile
+    shortlist) is measured for the last two stages.
+
+    Returns:
+        dict: Per-file timings, stage summaries and peak RSS
+    """
+    from services.extractor import extract_pdf
+    from services.llm_structurer import LLMStructurer
+    from services.llm_recommender import LLMRecommender
+    from benchmarks.stubs import StubLLMGateway, STRUCTURED_CV_RESPONSE, RECOMMENDATIONS_RESPONSE
+
+    cache_dir = _isolate_caches()
+    structurer = LLMStructurer(api_key=None)
+    structurer.client = StubLLMGateway(STRUCTURED_CV_RESPONSE)
+    recommender = LLMRecommender(api_key=None, mode="llm")
+    recommender.client = StubLLMGateway(RECOMMENDATIONS_RESPONSE)
+
+    files = []
+    stages = {"extraction": [], "structuring": [], "recommendation": []}
+    try:
+        for pdf_path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+            result = {"file": os.path.basename(pdf_path)}
+            try:
+                start = time.perf_counter()
+                extraction = extract_pdf(pdf_path)
+                result["extraction_seconds"] = round(time.perf_counter() - start, 4)
+                text = extraction["text"]
+                result.update({
+                    "backend": extraction["backend"],
+                    "pages": extraction["pages"],
+                    "ocr_pages": len(extraction["ocr_pages"]),
+                    "parse_seconds": round(extraction["parse_seconds"], 4),
+                    "ocr_seconds": round(extraction["ocr_seconds"], 4),
+                    "characters": len(text)
+                })
+
+                start = time.perf_counter()
+                cv_json = structurer.structure_cv(text)
+                result["structuring_seconds"] = round(time.perf_counter() - start, 4)
+
+                start = time.perf_counter()
+                recommender.recommend_profiles(cv_json, profiles_file=profiles_file)
+                result["recommendation_seconds"] = round(time.perf_counter() - start, 4)
+
+                for stage in stages:
+                    stages[stage].append(result[f"{stage}_seconds"])
+            except Exception as e:
+                result["error"] = str(e)
+            files.append(result)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        "pdf_dir": pdf_dir,
+        "files": files,
+        "stages_ms": {stage: latency_summary(values) for stage, values in stages.items() if values},
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def run_isolated(func, *args, **kwargs):
+    """Run a benchmark case in a new process, so that its peak RSS is its own."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(func, *args, **kwargs).result()
+
+
+def environment():
+    """Describe the machine and the code revision of a run."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def compare(results, baseline):
+    """
+    Print the change of the main figures against a previous run.
+
+    Returns:
+        list: (case, metric, baseline value, current value, ratio) tuples
+    """
+    rows = []
+    previous = {(case["mode"], case["size"]): case for case in baseline.get("matching", []) if "error" not in case}
+    for case in results.get("matching", []):
+        old = previous.get((case["mode"], case["size"]))
+        if old is None or "error" in case:
+            continue
+        name = f"{case['mode']}/{case['size']}"
+        for metric, old_value, new_value in (
+            ("p50_ms", old["latency_ms"]["p50"], case["latency_ms"]["p50"]),
+            ("p95_ms", old["latency_ms"]["p95"], case["latency_ms"]["p95"]),
+            ("throughput_qps", old["throughput_qps"], case["throughput_qps"]),
+            ("batch_ms", old.get("batch_ms"), case.get("batch_ms")),
+            ("ann_recall_at_k", (old.get("ann_recall") or {}).get("recall_at_k"),
+             (case.get("ann_recall") or {}).get("recall_at_k")),
+            ("index_seconds", old["index_seconds"], case["index_seconds"]),
+            ("peak_rss_mb", old["peak_rss_mb"], case["peak_rss_mb"])
+        ):
+            if old_value and new_value is not None:
+                rows.append((name, metric, old_value, new_value, new_value / old_value))
+
+    old_stages = (baseline.get("ingestion") or {}).get("stages_ms", {})
+    for stage, summary in ((results.get("ingestion") or {}).get("stages_ms") or {}).items():
+        if stage in old_stages and old_stages[stage]["p50"]:
+            rows.append(("ingestion", f"{stage}_p50_ms", old_stages[stage]["p50"], summary["p50"],
+                         summary["p50"] / old_stages[stage]["p50"]))
+
+    for name, metric, old_value, new_value, ratio in rows:
+        print(f"{name:<32} {metric:<24} {old_value:>12} -> {new_value:<12} x{ratio:.2f}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Matching and ingestion benchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated numbers of synthetic CVs")
+    parser.add_argument("--modes", default=DEFAULT_MODES, help="Comma-separated vectorizer types")
+    parser.add_argument("--queries", type=int, default=50, help="Job offers searched per case")
+    parser.add_argument("--top-n", type=int, default=5, help="CVs returned per search")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--model-name", default=None, help="Sentence Transformer model")
+    parser.add_argument("--ann-backend", default=None, help="ANN index in sentence_transformer mode (hnsw, ivf)")
+    parser.add_argument("--pdf-dir", default="data/cvs", help="Directory of the PDFs of the ingestion benchmark")
+    parser.add_argument("--profiles-file", default="data/profiles/it_profiles.json", help="IT profiles file")
+    parser.add_argument("--skip-matching", action="store_true", help="Do not run the matching benchmark")
+    parser.add_argument("--skip-ingestion", action="store_true", help="Do not run the ingestion benchmark")
+    parser.add_argument("--output", default=None, help="Path of the JSON results (defaults to benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare with")
+    args = parser.parse_args(argv)
+
+    results = {"environment": environment(), "parameters": vars(args), "matching": [], "ingestion": None}
+
+    if not args.skip_matching:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+                print(f"Matching benchmark: {mode}, {size} CVs")
+                try:
+                    case = run_isolated(
+                        run_matching_case, mode, size, args.queries, args.top_n, args.seed,
+                        args.model_name, args.ann_backend
+                    )
+                    print(f"  p50 {case['latency_ms']['p50']} ms, p95 {case['latency_ms']['p95']} ms, "
+                          f"{case['throughput_qps']} queries/s, batch of {args.queries} in {case['batch_ms']} ms, "
+                          f"peak RSS {case['peak_rss_mb']} MB")
+                    if case.get("ann_recall"):
+                        recall = case["ann_recall"]
+                        print(f"  ANN recall@{recall['k']} ({recall['backend']}): {recall['recall_at_k']:.3f}, "
+                              f"{recall['ann_ms']:.3f} ms vs {recall['exact_ms']:.3f} ms exact")
+                except Exception as e:
+                    case = {"mode": mode, "size": size, "error": str(e)}
+                    print(f"  failed: {e}")
+                results["matching"].append(case)
+
+    if not args.skip_ingestion:
+        print(f"Ingestion benchmark: {args.pdf_dir}")
+        try:
+            results["ingestion"] = run_isolated(run_ingestion_case, args.pdf_dir, args.profiles_file)
+            for stage, summary in results["ingestion"]["stages_ms"].items():
+                print(f"  {stage}: p50 {summary['p50']} ms, max {summary['max']} ms")
+        except Exception as e:
+            results["ingestion"] = {"pdf_dir": args.pdf_dir, "error": str(e)}
+            print(f"  failed: {e}")
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
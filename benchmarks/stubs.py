@@ -0,0 +1,80 @@
+import json
+from types import SimpleNamespace
+
+# Answers of the stubbed LLM, in the formats the prompts ask for
+STRUCTURED_CV_RESPONSE = {
+    "competences_autres": ["Communication", "Travail en équipe"],
+    "education": [
+        {"diplome": "Diplôme d'ingénieur", "etablissement": "ENSIAS", "filiere": "Génie Logiciel", "dates": "2020 - 2023"}
+    ],
+    "experiences_professionnelles": [
+        {"poste": "Stagiaire développeur", "entreprise": "Entreprise", "dates": "2022", "description": "Développement d'une API REST"}
+    ],
+    "projets": [
+        {"nom": "Plateforme e-commerce", "techs": ["React", "Node.js", "MongoDB"], "detail": "Application web"}
+    ],
+    "langues": {"Français": "Courant", "Anglais": "Intermédiaire"},
+    "activites_extra_scolaires": [{"description": "Membre d'un club d'informatique"}]
+}
+
+RECOMMENDATIONS_RESPONSE = {
+    "profils_recommandés": [
+        {"nom": "Développeur Full Stack", "score_similarité": 0.9, "raisons": "Compétences web"},
+        {"nom": "Développeur Backend", "score_similarité": 0.8, "raisons": "API REST"},
+        {"nom": "Data Scientist", "score_similarité": 0.6, "raisons": "Python"}
+    ]
+}
+
+
+class StubLLMGateway:
+    """
+    Offline stand-in for the LLM gateway: answers every call with a fixed
+    JSON response, streamed in small chunks like the Groq API.
+    """
+
+    def __init__(self, response, chunk_size=16):
+        self.text = json.dumps(response, ensure_ascii=False)
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def complete(self, model, messages, temperature=0.0, max_tokens=1024, timeout=None):
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))],
+            usage=None
+        )
+
+    def stream(self, model, messages, temperature=0.0, max_tokens=1024, on_text=None, timeout=None):
+        self.calls += 1
+        received = []
+        for i in range(0, len(self.text), self.chunk_size):
+            received.append(self.text[i:i + self.chunk_size])
+            if on_text is not None and on_text(received[-1]):
+                break
+        return "".join(received)
+
+
+class InMemoryCVRepository:
+    """CV repository over a list of documents, with the methods used by VectorRecommender."""
+
+    def __init__(self, cvs):
+        self.cvs = {str(cv["_id"]): cv for cv in cvs}
+
+    def find_all(self, projection=None):
+        if not projection:
+            return iter(self.cvs.values())
+        fields = [field for field, included in projection.items() if included]
+        return ({"_id": cv["_id"], **{f: cv[f] for f in fields if f in cv}} for cv in self.cvs.values())
+
+    def find_by_ids(self, cv_ids, projection=None):
+        return {cv_id: self.cvs[cv_id] for cv_id in cv_ids if cv_id in self.cvs}
+
+    def find_changed_since(self, updated_after=None, after_id=None, projection=None):
+        # The synthetic corpus does not change during a run
+        return iter(())
+
+    def find_ids(self):
+        return set(self.cvs)
+
+    def watch(self, pipeline=None, resume_after=None):
+        raise NotImplementedError("change streams are not available in memory")
@@ -0,0 +1,108 @@
+import random
+
+# Vocabulary of the synthetic CVs, close to the CVs structured by the LLM
+SKILLS = {
+    "langages": ["Python", "Java", "JavaScript", "TypeScript", "C", "C++", "C#", "PHP", "Go", "Rust",
+                 "Kotlin", "Swift", "Scala", "R", "SQL", "Bash", "HTML", "CSS"],
+    "frameworks": ["React", "Angular", "Vue.js", "Node.js", "Express", "Django", "Flask", "FastAPI",
+                   "Spring Boot", "Laravel", "Symfony", ".NET", "Flutter", "React Native", "Next.js"],
+    "bases_de_donnees": ["MySQL", "PostgreSQL", "MongoDB", "Oracle", "Redis", "Cassandra", "Elasticsearch",
+                         "SQLite", "Neo4j", "Firebase"],
+    "data_et_ia": ["Machine Learning", "Deep Learning", "TensorFlow", "PyTorch", "scikit-learn", "Pandas",
+                   "NumPy", "NLP", "Computer Vision", "Spark", "Hadoop", "Power BI", "Tableau"],
+    "devops_et_cloud": ["Docker", "Kubernetes", "Jenkins", "GitLab CI", "AWS", "Azure", "GCP", "Terraform",
+                        "Ansible", "Linux", "Nginx"],
+    "outils": ["Git", "Jira", "Scrum", "UML", "Figma", "Postman", "Selenium", "JUnit", "Maven"]
+}
+
+DEGREES = ["Diplôme d'ingénieur", "Master", "Licence", "DUT", "BTS", "Baccalauréat", "Doctorat"]
+SCHOOLS = ["ENSIAS", "EMI", "INPT", "ENSA Marrakech", "FST Settat", "Université Mohammed V", "ENSAM Casablanca",
+           "EHTP", "ESI", "Université Hassan II", "ENSET Mohammedia", "UIR"]
+FIELDS = ["Génie Informatique", "Génie Logiciel", "Data Science", "Intelligence Artificielle", "Réseaux et Télécoms",
+          "Systèmes Embarqués", "Cybersécurité", "Sciences Mathématiques", "Big Data", "Cloud Computing"]
+PROJECT_KINDS = ["Application web de gestion", "Plateforme e-commerce", "Chatbot", "Système de recommandation",
+                 "Application mobile", "Tableau de bord analytique", "API REST", "Outil de détection de fraude",
+                 "Pipeline de données", "Jeu vidéo", "Site vitrine", "Système de réservation"]
+PROJECT_DOMAINS = ["hospitalière", "scolaire", "bancaire", "touristique", "logistique", "RH", "immobilière",
+                   "agricole", "sportive", "culturelle"]
+JOB_TITLES = ["Développeur Full Stack", "Data Scientist", "Ingénieur DevOps", "Développeur Backend Java",
+              "Développeur Frontend React", "Ingénieur Machine Learning", "Administrateur Base de Données",
+              "Développeur Mobile", "Ingénieur Cloud", "Analyste BI"]
+
+
+def _sample(rng, items, low, high):
+    return rng.sample(items, rng.randint(low, min(high, len(items))))
+
+
+def generate_cv(rng, index):
+    """
+    Generate a synthetic structured CV.
+
+    Args:
+        rng: random.Random instance
+        index: Number of the CV, used for its id and e-mail
+
+    Returns:
+        dict: CV in the schema read by VectorRecommender.preprocess_cv
+    """
+    competences = {
+        category: _sample(rng, skills, 1, 6)
+        for category, skills in SKILLS.items()
+        if rng.random() < 0.8
+    }
+    all_skills = [skill for skills in competences.values() for skill in skills] or ["Git"]
+
+    education = []
+    for _ in range(rng.randint(1, 3)):
+        start = rng.randint(2008, 2022)
+        education.append({
+            "diplome": rng.choice(DEGREES),
+            "etablissement": rng.choice(SCHOOLS),
+            "filiere": rng.choice(FIELDS),
+            "dates": f"{start} - {start + rng.randint(1, 5)}"
+        })
+
+    projets = []
+    for _ in range(rng.randint(1, 4)):
+        kind = rng.choice(PROJECT_KINDS)
+        techs = _sample(rng, all_skills, 1, 4)
+        projets.append({
+            "nom": f"{kind} {rng.choice(PROJECT_DOMAINS)}",
+            "techs": techs,
+            "detail": f"Conception et développement d'un(e) {kind.lower()} avec {', '.join(techs)}."
+        })
+
+    return {
+        "_id": f"{index:024x}",
+        "informations_personnelles": {
+            "nom": f"Nom{index}",
+            "prenom": f"Prenom{index}",
+            "email": f"candidat{index}@example.com"
+        },
+        "competences": competences,
+        "education": education,
+        "projets": projets
+    }
+
+
+def generate_cvs(count, seed=0):
+    """Generate count synthetic CVs, the same ones for a given seed."""
+    rng = random.Random(seed)
+    return [generate_cv(rng, i) for i in range(count)]
+
+
+def generate_job_offers(count, seed=0):
+    """Generate count synthetic job offers in the JobOffer.to_dict format."""
+    rng = random.Random(seed + 1)
+    all_skills = [skill for skills in SKILLS.values() for skill in skills]
+    offers = []
+    for _ in range(count):
+        title = rng.choice(JOB_TITLES)
+        offers.append({
+            "titre": title,
+            "competences_requises": _sample(rng, all_skills, 3, 8),
+            "experience": f"{rng.randint(0, 10)} ans",
+            "diplome": rng.choice(DEGREES),
+            "description": f"Nous recherchons un(e) {title} pour rejoindre notre équipe {rng.choice(PROJECT_DOMAINS)}."
+        })
+    return offers
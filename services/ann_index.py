@@ -0,0 +1,531 @@
+import os
+import glob
+import time
+import uuid
+import pickle
+import logging
+import threading
+import numpy as np
+from services.scoring import top_k_cosine, top_k_from_scores
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors):
+    """Return float32 copies of vectors with L2-normalized rows."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class ANNIndex:
+    """
+    Base class of the approximate nearest-neighbour indexes over CV embeddings.
+
+    An index follows a CVVectorStore as an observer: it is built from the
+    stored embeddings, updated when CVs are saved or deleted, and persisted
+    to disk when the store is compacted so it can be reloaded at startup.
+    """
+
+    backend = None
+
+    def __init__(self, index_dir, version):
+        """
+        Initialize the index.
+
+        Args:
+            index_dir: Directory where the index files are kept
+            version: Version tag of the embeddings accepted by the index
+        """
+        self.index_dir = index_dir
+        self.version = version
+        self.generation = None
+        self._lock = threading.RLock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def add(self, ids, vectors):
+        """Insert (or replace) the vectors of a list of CV ids."""
+        raise NotImplementedError
+
+    def remove(self, ids):
+        """Delete a list of CV ids from the index."""
+        raise NotImplementedError
+
+    def search(self, query_vector, k):
+        """
+        Find the approximate k nearest CVs of a query.
+
+        Returns:
+            tuple: (ids, scores) of the best CVs, best first
+        """
+        raise NotImplementedError
+
+    def save(self, generation):
+        """Write the index files of a generation to disk."""
+        raise NotImplementedError
+
+    def load(self, generation):
+        """Load the index files of a generation from disk."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Empty the index."""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def _cleanup(self, generation):
+        """Remove the index files of older generations."""
+        for path in glob.glob(os.path.join(self.index_dir, f"{self.backend}.*")):
+            if f".{generation}." not in os.path.basename(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # Vector store observer interface
+
+    def _accepts(self, entry):
+        """Check whether a store entry carries an embedding for this index."""
+        return entry is not None and entry["version"] == self.version and entry["vector"] is not None
+
+    def rebuild(self, entries):
+        """Build the index from all the entries of the store."""
+        with self._lock:
+            self.reset()
+            pairs = [(cv_id, entry["vector"]) for cv_id, entry in entries if self._accepts(entry)]
+            if pairs:
+                self.add([cv_id for cv_id, _ in pairs], np.vstack([vector for _, vector in pairs]))
+
+    def update(self, cv_id, old_entry, new_entry):
+        """Apply a change of store entry to the index."""
+        if self._accepts(new_entry):
+            self.add([cv_id], new_entry["vector"])
+        elif old_entry is not None:
+            self.remove([cv_id])
+
+    def state(self):
+        """Persist the index and return the reference saved in the store snapshot."""
+        with self._lock:
+            # Unique across processes: the files of a generation loaded elsewhere
+            # (memory-mapped vectors) are never overwritten
+            self.generation = uuid.uuid4().hex
+            self.save(self.generation)
+            self._cleanup(self.generation)
+            return {"backend": self.backend, "version": self.version, "generation": self.generation}
+
+    def restore(self, state):
+        """
+        Reload the index saved with the store snapshot.
+
+        Returns:
+            bool: False if the saved index cannot be used
+        """
+        if state.get("backend") != self.backend or state.get("version") != self.version:
+            return False
+        try:
+            with self._lock:
+                self.load(state["generation"])
+                self.generation = state["generation"]
+            return True
+        except Exception as e:
+            logger.warning(f"Unable to load {self.backend} index, rebuilding it: {e}")
+            return False
+
+
+class NumpyIVFIndex(ANNIndex):
+    """
+    Pure NumPy inverted-file (IVF) index.
+
+    Vectors are clustered with spherical k-means; a query only scores the
+    vectors of the nprobe closest clusters. Until the corpus reaches
+    min_train_size vectors, the index is not clustered and queries score
+    every vector. Clusters are retrained whenever the corpus has doubled
+    since the last training, whether vectors arrive in bulk or one by one.
+    Saved vectors are memory-mapped when the index is loaded, and new
+    vectors are kept in memory until the next save.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, index_dir, version, nlist=None, nprobe=8, train_iterations=10, min_train_size=1000):
+        """
+        Initialize the index.
+
+        Args:
+            index_dir: Directory where the index files are kept
+            version: Version tag of the embeddings accepted by the index
+            nlist: Number of clusters (defaults to the square root of the corpus size)
+            nprobe: Number of clusters scored per query
+            train_iterations: Number of k-means iterations
+            min_train_size: Number of vectors from which the index is clustered (exact search below)
+        """
+        super().__init__(index_dir, version)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.min_train_size = min_train_size
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._centroids = None
+            self._trained_size = 0
+            self._base = np.empty((0, 0), dtype=np.float32)
+            self._extra = []
+            self._ids = []
+            self._rows = {}
+            self._assign = []
+            self._deleted = set()
+            self._lists = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _train(self, vectors):
+        """Cluster vectors with spherical k-means."""
+        n = vectors.shape[0]
+        nlist = self.nlist or int(np.sqrt(n))
+        nlist = max(1, min(nlist, n, 4096))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(n, min(n, max(nlist * 64, 1000), 50000), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            # Empty clusters keep their previous centroid
+            sums[counts == 0] = centroids[counts == 0]
+            centroids = _normalize(sums)
+        self._centroids = centroids
+        self._trained_size = n
+
+    def _needs_training(self):
+        """Check whether the corpus is large enough to be clustered, or has doubled since the last training."""
+        size = len(self._rows)
+        return size >= max(self.min_train_size, 1) and (
+            self._centroids is None or size >= 2 * self._trained_size
+        )
+
+    def _retrain(self):
+        """Train the clusters on the live vectors and reassign every row to its closest cluster."""
+        live = np.asarray(sorted(self._rows.values()), dtype=np.int64)
+        vectors = self._vectors(live)
+        self._train(vectors)
+        self._lists = {}
+        for row, cluster in zip(live, self._nearest_lists(vectors)):
+            self._assign[row] = int(cluster)
+            self._lists.setdefault(int(cluster), []).append(int(row))
+
+    def _nearest_lists(self, vectors, chunk_size=8192):
+        """Assign vectors to their closest cluster, by chunks to bound memory."""
+        if self._centroids is None:
+            return np.zeros(vectors.shape[0], dtype=np.int32)
+        assign = [np.argmax(vectors[i:i + chunk_size] @ self._centroids.T, axis=1)
+                  for i in range(0, vectors.shape[0], chunk_size)]
+        return np.concatenate(assign).astype(np.int32)
+
+    def _vectors(self, rows):
+        """Gather the vectors of a list of rows (memory-mapped or in memory)."""
+        n_base = self._base.shape[0]
+        if not self._extra:
+            return self._base[rows]
+        if len(self._extra) > 1:
+            self._extra = [np.vstack(self._extra)]
+        extra = self._extra[0]
+        if n_base == 0:
+            return extra[rows]
+        base_mask = rows < n_base
+        result = np.empty((rows.shape[0], extra.shape[1]), dtype=np.float32)
+        result[base_mask] = self._base[rows[base_mask]]
+        result[~base_mask] = extra[rows[~base_mask] - n_base]
+        return result
+
+    def add(self, ids, vectors):
+        with self._lock:
+            vectors = _normalize(vectors)
+            self.remove(ids)
+
+            first_row = len(self._ids)
+            assign = self._nearest_lists(vectors)
+            self._extra.append(vectors)
+            for offset, (cv_id, cluster) in enumerate(zip(ids, assign)):
+                row = first_row + offset
+                self._ids.append(str(cv_id))
+                self._rows[str(cv_id)] = row
+                self._assign.append(int(cluster))
+                self._lists.setdefault(int(cluster), []).append(row)
+            if self._needs_training():
+                self._retrain()
+
+    def remove(self, ids):
+        with self._lock:
+            for cv_id in ids:
+                row = self._rows.pop(str(cv_id), None)
+                if row is not None:
+                    self._deleted.add(row)
+
+    def search(self, query_vector, k):
+        with self._lock:
+            if not self._rows:
+                return [], np.empty(0, dtype=np.float32)
+            query = _normalize(query_vector)[0]
+            if self._centroids is None:
+                probe = list(self._lists)
+            else:
+                probe, _ = top_k_from_scores(self._centroids @ query, self.nprobe)
+            rows = [row for cluster in probe for row in self._lists.get(int(cluster), [])
+                    if row not in self._deleted]
+            if not rows:
+                return [], np.empty(0, dtype=np.float32)
+            rows = np.asarray(rows, dtype=np.int64)
+            order, scores = top_k_from_scores(self._vectors(rows) @ query, k)
+            return [self._ids[row] for row in rows[order]], scores
+
+    def save(self, generation):
+        with self._lock:
+            live = sorted(self._rows.values())
+            rows = np.asarray(live, dtype=np.int64)
+            vectors = self._vectors(rows) if live else np.empty((0, 0), dtype=np.float32)
+            ids = [self._ids[row] for row in live]
+
+            # Retrain once the corpus has doubled since the last training
+            if self._needs_training():
+                self._train(vectors)
+            assign = self._nearest_lists(vectors) if live else np.empty(0, dtype=np.int32)
+
+            vectors_path = os.path.join(self.index_dir, f"{self.backend}.{generation}.npy")
+            np.save(vectors_path, vectors)
+            with open(os.path.join(self.index_dir, f"{self.backend}.{generation}.pkl"), "wb") as f:
+                pickle.dump({
+                    "ids": ids,
+                    "assign": assign,
+                    "centroids": self._centroids,
+                    "trained_size": self._trained_size
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.load(generation)
+
+    def load(self, generation):
+        with self._lock:
+            with open(os.path.join(self.index_dir, f"{self.backend}.{generation}.pkl"), "rb") as f:
+                meta = pickle.load(f)
+            self.reset()
+            # Saved vectors stay on disk and are paged in on demand
+            self._base = np.load(os.path.join(self.index_dir, f"{self.backend}.{generation}.npy"), mmap_mode="r")
+            self._centroids = meta["centroids"]
+            self._trained_size = meta["trained_size"]
+            self._ids = list(meta["ids"])
+            self._rows = {cv_id: row for row, cv_id in enumerate(self._ids)}
+            self._assign = [int(cluster) for cluster in meta["assign"]]
+            for row, cluster in enumerate(self._assign):
+                self._lists.setdefault(cluster, []).append(row)
+
+
+class HNSWIndex(ANNIndex):
+    """
+    Hierarchical navigable small world graph index backed by hnswlib.
+    """
+
+    backend = "hnsw"
+
+    def __init__(self, index_dir, version, dim=None, m=16, ef_construction=200, ef_search=64):
+        """
+        Initialize the index.
+
+        Args:
+            index_dir: Directory where the index files are kept
+            version: Version tag of the embeddings accepted by the index
+            dim: Dimension of the embeddings (inferred from the first insert if omitted)
+            m: Number of graph links per element
+            ef_construction: Size of the candidate list while building the graph
+            ef_search: Size of the candidate list while searching
+        """
+        if hnswlib is None:
+            raise ImportError("hnswlib is required for the 'hnsw' ANN backend")
+        super().__init__(index_dir, version)
+        self.dim = dim
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._labels = {}
+            self._ids = {}
+            self._next_label = 0
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _ensure_capacity(self, dim, extra):
+        """Create or grow the hnswlib index."""
+        if self._index is None:
+            self.dim = self.dim or dim
+            self._index = hnswlib.Index(space="cosine", dim=self.dim)
+            self._index.init_index(max_elements=max(1024, extra * 2), ef_construction=self.ef_construction,
+                                   M=self.m, allow_replace_deleted=True)
+            self._index.set_ef(self.ef_search)
+        needed = self._index.get_current_count() + extra
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+
+    def add(self, ids, vectors):
+        with self._lock:
+            vectors = _normalize(vectors)
+            self.remove(ids)
+            self._ensure_capacity(vectors.shape[1], vectors.shape[0])
+            labels = []
+            for cv_id in ids:
+                label = self._next_label
+                self._next_label += 1
+                self._labels[str(cv_id)] = label
+                self._ids[label] = str(cv_id)
+                labels.append(label)
+            self._index.add_items(vectors, np.asarray(labels), replace_deleted=True)
+
+    def remove(self, ids):
+        with self._lock:
+            for cv_id in ids:
+                label = self._labels.pop(str(cv_id), None)
+                if label is not None:
+                    self._ids.pop(label, None)
+                    self._index.mark_deleted(label)
+
+    def search(self, query_vector, k):
+        with self._lock:
+            k = min(k, len(self._labels))
+            if k == 0:
+                return [], np.empty(0, dtype=np.float32)
+            labels, distances = self._index.knn_query(_normalize(query_vector), k=k)
+            return [self._ids[label] for label in labels[0]], (1 - distances[0]).astype(np.float32)
+
+    def save(self, generation):
+        with self._lock:
+            if self._index is None:
+                self._ensure_capacity(self.dim or 1, 0)
+            self._index.save_index(os.path.join(self.index_dir, f"{self.backend}.{generation}.bin"))
+            with open(os.path.join(self.index_dir, f"{self.backend}.{generation}.pkl"), "wb") as f:
+                pickle.dump({"dim": self.dim, "labels": self._labels, "next_label": self._next_label}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, generation):
+        with self._lock:
+            with open(os.path.join(self.index_dir, f"{self.backend}.{generation}.pkl"), "rb") as f:
+                meta = pickle.load(f)
+            self.reset()
+            self.dim = meta["dim"]
+            self._index = hnswlib.Index(space="cosine", dim=self.dim)
+            self._index.load_index(os.path.join(self.index_dir, f"{self.backend}.{generation}.bin"),
+                                   allow_replace_deleted=True)
+            self._index.set_ef(self.ef_search)
+            self._labels = meta["labels"]
+            self._ids = {label: cv_id for cv_id, label in self._labels.items()}
+            self._next_label = meta["next_label"]
+
+
+ANN_BACKENDS = {
+    "ivf": NumpyIVFIndex,
+    "hnsw": HNSWIndex,
+}
+
+
+def create_ann_index(backend, index_dir, version, **kwargs):
+    """
+    Create an ANN index.
+
+    Args:
+        backend: 'hnsw', 'ivf', or 'auto' (hnsw when hnswlib is installed, ivf otherwise)
+        index_dir: Directory where the index files are kept
+        version: Version tag of the embeddings accepted by the index
+        **kwargs: Backend-specific parameters
+
+    Returns:
+        ANNIndex: New index
+    """
+    if backend == "auto":
+        backend = "hnsw" if hnswlib is not None else "ivf"
+    if backend not in ANN_BACKENDS:
+        raise ValueError(f"Unsupported ANN backend: {backend}")
+    return ANN_BACKENDS[backend](index_dir, version, **kwargs)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_ann_index(vector_store, backend, version, **kwargs):
+    """
+    Return the process-wide ANN index following a vector store.
+
+    The index is kept next to the store files and is reloaded from its last
+    saved generation when the store is opened.
+
+    Args:
+        vector_store: CVVectorStore holding the CV embeddings
+        backend: 'hnsw', 'ivf' or 'auto'
+        version: Version tag of the embeddings accepted by the index
+        **kwargs: Backend-specific parameters
+
+    Returns:
+        ANNIndex: Shared index instance
+    """
+    key = (id(vector_store), backend, version)
+    with _indexes_lock:
+        if key not in _indexes:
+            index_dir = os.path.join(vector_store.store_dir, f"{vector_store.namespace}.ann")
+            index = create_ann_index(backend, index_dir, version, **kwargs)
+            vector_store.attach(f"ann:{index.backend}", index)
+            _indexes[key] = index
+        return _indexes[key]
+
+
+def recall_at_k(index, matrix, ids, queries, k=10):
+    """
+    Measure the recall@k of an ANN index against exact search.
+
+    Args:
+        index: ANN index to evaluate
+        matrix: Dense matrix of the indexed vectors (L2-normalized rows)
+        ids: CV ids of the rows of the matrix
+        queries: Query vectors (one per row)
+        k: Number of neighbours compared
+
+    Returns:
+        dict: Recall@k and average latencies of both searches in milliseconds
+    """
+    queries = np.atleast_2d(queries)
+    hits = 0
+    total = 0
+    ann_time = 0.0
+    exact_time = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        exact_rows, _ = top_k_cosine(query, matrix, k)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        ann_ids, _ = index.search(query, k)
+        ann_time += time.perf_counter() - start
+
+        expected = {ids[row] for row in exact_rows}
+        hits += len(expected & set(ann_ids))
+        total += len(expected)
+
+    n_queries = max(len(queries), 1)
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": hits / total if total else 1.0,
+        "ann_ms": 1000 * ann_time / n_queries,
+        "exact_ms": 1000 * exact_time / n_queries
+    }
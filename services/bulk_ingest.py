@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from services.extractor import extract_text_from_pdf
+from services.llm_structurer import LLMStructurer
+from services.vector_recommender import VectorRecommender
+from services.shortlists import ShortlistService
+from utils.mongodb import CVRepository, ensure_indexes
+from utils.disk_cache import sha256_file
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    """
+    Throughput statistics of a pipeline stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds, success=True, count=1):
+        """Record processed items and the time spent on them."""
+        with self._lock:
+            now = time.perf_counter()
+            if self.started is None:
+                self.started = now - seconds
+            self.finished = now
+            self.busy_seconds += seconds
+            if success:
+                self.count += count
+            else:
+                self.failures += count
+
+    def to_dict(self):
+        wall = (self.finished - self.started) if self.started is not None else 0.0
+        return {
+            "stage": self.name,
+            "processed": self.count,
+            "failed": self.failures,
+            "wall_seconds": round(wall, 3),
+            "avg_ms": round(1000 * self.busy_seconds / max(self.count + self.failures, 1), 1),
+            "per_second": round(self.count / wall, 2) if wall > 0 else None
+        }
+
+
+class Checkpoint:
+    """
+    Append-only checkpoint file recording the outcome of each ingested file,
+    so an interrupted bulk ingestion can be resumed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("status") == "done":
+                        self.done.add(record["file"])
+        self._lock = threading.Lock()
+
+    def record(self, file_path, status, **details):
+        """Append the outcome of a file to the checkpoint."""
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"file": file_path, "status": status, **details}, ensure_ascii=False) + "\n")
+            if status == "done":
+                self.done.add(file_path)
+
+
+def list_input_files(source):
+    """
+    List the PDF files to ingest.
+
+    Args:
+        source: Directory (searched recursively) or manifest file
+            (one path per line, or a JSON list of paths)
+
+    Returns:
+        list: Absolute paths of the PDF files
+    """
+    if os.path.isdir(source):
+        files = []
+        for root, _, names in os.walk(source):
+            files.extend(os.path.join(root, name) for name in names if name.lower().endswith(".pdf"))
+        return sorted(os.path.abspath(path) for path in files)
+
+    with open(source, "r", encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        paths = json.loads(content)
+    else:
+        paths = [line.strip() for line in content.splitlines() if line.strip() and not line.startswith("#")]
+    base = os.path.dirname(os.path.abspath(source))
+    return [os.path.abspath(os.path.join(base, path)) for path in paths]
+
+
+def _extract(pdf_path, output_txt_path):
+    """Extract the text of a PDF (run in a worker process)."""
+    start = time.perf_counter()
+    # Files are already extracted in parallel: OCR the pages of each file in its own process
+    text = extract_text_from_pdf(pdf_path, output_txt_path, ocr_workers=1)
+    return text, time.perf_counter() - start
+
+
+def _structure(structurer, raw_text):
+    """Structure a CV text with the LLM (run in a worker thread)."""
+    start = time.perf_counter()
+    cv_json = structurer.structure_cv(raw_text)
+    return cv_json, time.perf_counter() - start
+
+
+def bulk_ingest(
+    files,
+    checkpoint_path="data/outputs/bulk_checkpoint.jsonl",
+    output_folder="data/outputs/bulk",
+    extract_workers=None,
+    llm_concurrency=4,
+    batch_size=100,
+    api_key=None,
+    mongodb_uri=None,
+    vectorizer_type="tfidf"
+):
+    """
+    Ingest many CV files: extraction in a process pool, LLM structuring with
+    bounded concurrency, and batched MongoDB inserts.
+
+    Files already recorded as done in the checkpoint are skipped.
+
+    Args:
+        files: List of PDF paths
+        checkpoint_path: Path of the checkpoint file
+        output_folder: Folder where the extracted texts are saved
+        extract_workers: Number of extraction processes (defaults to the CPU count)
+        llm_concurrency: Maximum number of concurrent LLM calls
+        batch_size: Number of CVs per MongoDB bulk upsert
+        api_key: Groq API key (optional)
+        mongodb_uri: MongoDB connection URI (optional)
+        vectorizer_type: Vectorizer used to precompute the CV vectors
+
+    Returns:
+        list: Throughput report of each stage
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    pending = [path for path in files if path not in checkpoint.done]
+    print(f"{len(files)} files, {len(files) - len(pending)} already ingested, {len(pending)} to process")
+    os.makedirs(output_folder, exist_ok=True)
+
+    structurer = LLMStructurer(api_key=api_key)
+    ensure_indexes(mongodb_uri)
+    repository = CVRepository(mongodb_uri)
+    vector_recommender = VectorRecommender(mongodb_uri=mongodb_uri, vectorizer_type=vectorizer_type)
+    shortlists = ShortlistService(vector_recommender)
+    stats = {name: StageStats(name) for name in ("extraction", "structuring", "mongodb_insert")}
+    buffer = []
+
+    def flush():
+        if not buffer:
+            return
+        start = time.perf_counter()
+        try:
+            # Upserts: re-ingesting a file or a new CV of a known candidate does not add a duplicate
+            ids = repository.upsert_many([cv_json for _, cv_json in buffer])
+        except Exception as e:
+            stats["mongodb_insert"].record(time.perf_counter() - start, success=False, count=len(buffer))
+            logger.error(f"Error inserting batch of {len(buffer)} CVs: {e}")
+            for path, _ in buffer:
+                checkpoint.record(path, "failed", stage="mongodb_insert", error=str(e))
+            buffer.clear()
+            return
+        stats["mongodb_insert"].record(time.perf_counter() - start, count=len(buffer))
+        cvs = list(zip(ids, [cv_json for _, cv_json in buffer]))
+        try:
+            vector_recommender.index_cvs(cvs)
+        except Exception as e:
+            # The CVs are saved: the vector store picks them up at its next sync
+            logger.error(f"Error vectorizing batch of {len(buffer)} CVs: {e}")
+        try:
+            shortlists.add_cvs(cvs)
+        except Exception as e:
+            # The shortlists catch up when they are rebuilt
+            logger.error(f"Error updating the job offer shortlists: {e}")
+        for (path, _), cv_id in zip(buffer, ids):
+            checkpoint.record(path, "done", id=cv_id)
+        buffer.clear()
+
+    with ProcessPoolExecutor(max_workers=extract_workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool:
+        futures = {}
+        for path in pending:
+            txt_path = os.path.join(output_folder, os.path.splitext(os.path.basename(path))[0] + ".txt")
+            futures[extract_pool.submit(_extract, path, txt_path)] = ("extraction", path)
+
+        running = set(futures)
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, path = futures.pop(future)
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    stats[stage].record(0.0, success=False)
+                    logger.error(f"{stage} failed for {path}: {e}")
+                    checkpoint.record(path, "failed", stage=stage, error=str(e))
+                    continue
+
+                if stage == "extraction":
+                    stats[stage].record(seconds)
+                    llm_future = llm_pool.submit(_structure, structurer, result)
+                    futures[llm_future] = ("structuring", path)
+                    running.add(llm_future)
+                elif result:
+                    stats[stage].record(seconds)
+                    result["content_hash"] = sha256_file(path)
+                    buffer.append((path, result))
+                    if len(buffer) >= batch_size:
+                        flush()
+                else:
+                    stats[stage].record(seconds, success=False)
+                    checkpoint.record(path, "failed", stage=stage, error="CV structuring failed")
+        flush()
+
+    report = [stage.to_dict() for stage in stats.values()]
+    print("\n--- Throughput per stage ---\n")
+    for stage in report:
+        print(f"{stage['stage']}: {stage['processed']} ok, {stage['failed']} failed, "
+              f"{stage['avg_ms']} ms avg, {stage['per_second']} per second")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk CV ingestion")
+    parser.add_argument("source", help="Directory of PDF files or manifest file")
+    parser.add_argument("--checkpoint", default="data/outputs/bulk_checkpoint.jsonl", help="Checkpoint file")
+    parser.add_argument("--output-folder", default="data/outputs/bulk", help="Folder for extracted texts")
+    parser.add_argument("--extract-workers", type=int, default=None, help="Number of extraction processes")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Maximum concurrent LLM calls")
+    parser.add_argument("--batch-size", type=int, default=100, help="CVs per MongoDB insert")
+    parser.add_argument("--mongodb-uri", default=os.environ.get("MONGODB_URI"), help="MongoDB connection URI")
+    parser.add_argument("--vectorizer", default="tfidf", choices=["tfidf", "sentence_transformer"])
+    parser.add_argument("--report", help="Path where the throughput report is saved as JSON")
+    args = parser.parse_args(argv)
+
+    report = bulk_ingest(
+        list_input_files(args.source),
+        checkpoint_path=args.checkpoint,
+        output_folder=args.output_folder,
+        extract_workers=args.extract_workers,
+        llm_concurrency=args.llm_concurrency,
+        batch_size=args.batch_size,
+        mongodb_uri=args.mongodb_uri,
+        vectorizer_type=args.vectorizer
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+import os
+import time
+import logging
+import threading
+from datetime import timedelta, timezone
+from bson import ObjectId
+from utils.mongodb import utc_now, to_object_id
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Fields of the CVs read by VectorRecommender.preprocess_cv and skill_index.cv_attributes
+MATCHING_PROJECTION = {
+    "competences": 1, "education": 1, "projets": 1, "experiences_professionnelles": 1, "updated_at": 1
+}
+
+
+def _naive_utc(value):
+    """Convert an aware datetime to naive UTC, leaving naive datetimes (already UTC) unchanged."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class CorpusSync:
+    """
+    Keeps the vector store of a VectorRecommender in line with the CV collection.
+
+    Changes are followed with a MongoDB change stream when the server supports
+    it (replica set), applied from a background thread. Otherwise the
+    collection is polled with an updated_at / _id high-water mark, so each poll
+    is one small delta query. Deletions cannot be seen by polling: the ids of
+    the collection are reconciled with the store at a longer interval (and
+    deleted CVs met in search results are dropped by recommend_cvs).
+
+    The high-water marks and resume token are kept in the vector store
+    metadata, so they are shared by the processes using the same store.
+    """
+
+    def __init__(self, recommender, repository, mode=None, poll_interval=None, reconcile_interval=None,
+                 overlap=2.0, batch_size=256):
+        """
+        Initialize the synchronization.
+
+        Args:
+            recommender: VectorRecommender whose store is kept up to date
+            repository: CVRepository of the CV collection
+            mode: 'auto', 'change_stream', 'poll' or 'off', defaults to CORPUS_SYNC_MODE ('auto')
+            poll_interval: Minimum seconds between two polls, defaults to CORPUS_SYNC_INTERVAL (5)
+            reconcile_interval: Seconds between two id reconciliations, defaults to
+                CORPUS_RECONCILE_INTERVAL (300)
+            overlap: Seconds re-read before the high-water mark, covering clock skew between writers
+            batch_size: Number of CVs vectorized together
+        """
+        self.recommender = recommender
+        self.repository = repository
+        self.store = recommender.vector_store
+        self.mode = mode or os.environ.get("CORPUS_SYNC_MODE", "auto")
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.environ.get("CORPUS_SYNC_INTERVAL", 5))
+        self.reconcile_interval = reconcile_interval if reconcile_interval is not None else float(
+            os.environ.get("CORPUS_RECONCILE_INTERVAL", 300)
+        )
+        self.overlap = timedelta(seconds=overlap)
+        self.batch_size = batch_size
+        self.stats = {"polls": 0, "indexed": 0, "deleted": 0, "reconciliations": 0, "stream_events": 0}
+
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        self._last_reconcile = time.monotonic()
+        self._stream_thread = None
+        self._stop = threading.Event()
+
+    @property
+    def streaming(self):
+        """True while changes are followed through a change stream."""
+        return self._stream_thread is not None and self._stream_thread.is_alive()
+
+    def start(self):
+        """Start following the collection with a change stream if the mode allows it."""
+        if self.mode not in ("auto", "change_stream") or self.streaming:
+            return
+        projection = {"operationType": 1, "documentKey": 1}
+        projection.update({f"fullDocument.{field}": 1 for field in MATCHING_PROJECTION})
+        try:
+            stream = self.repository.watch(
+                pipeline=[{"$project": projection}],
+                resume_after=self.store.get_meta("sync_resume_token")
+            )
+        except Exception as e:
+            if self.mode == "change_stream":
+                raise
+            logger.info(f"Change streams unavailable ({e}), polling the CV collection")
+            self.mode = "poll"
+            return
+        self._stream_thread = threading.Thread(target=self._follow, args=(stream,), name="corpus-sync", daemon=True)
+        self._stream_thread.start()
+        logger.debug("Following the CV collection with a change stream")
+
+    def stop(self):
+        """Stop the change stream thread."""
+        self._stop.set()
+
+    def _follow(self, stream):
+        """Apply the events of a change stream until stopped."""
+        try:
+            with stream:
+                while not self._stop.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    self._apply_change(change)
+                    self.store.set_meta("sync_resume_token", stream.resume_token)
+        except Exception as e:
+            # Back to polling: the high-water marks make it catch up from the last stamped write
+            logger.error(f"Change stream interrupted, polling the CV collection: {e}")
+
+    def _apply_change(self, change):
+        self.stats["stream_events"] += 1
+        operation = change["operationType"]
+        cv_id = str(change["documentKey"]["_id"])
+        if operation == "delete":
+            self.store.delete(cv_id)
+            self.stats["deleted"] += 1
+        elif operation in ("insert", "update", "replace") and change.get("fullDocument"):
+            cv = change["fullDocument"]
+            self.recommender.index_cvs([(cv_id, cv)])
+            self.stats["indexed"] += 1
+            # Keeps the high-water mark current in case the stream stops and polling takes over
+            self._save_marks(_naive_utc(cv.get("updated_at")), None)
+
+    def poll(self, force=False):
+        """
+        Apply the changes written to the collection since the last poll.
+
+        Does nothing while a change stream is followed, or if the last poll is
+        more recent than the poll interval (unless forced).
+
+        Returns:
+            int: Number of CVs (re)vectorized
+        """
+        if self.mode == "off" or self.streaming:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_poll < self.poll_interval:
+                return 0
+            self._last_poll = now
+            self.stats["polls"] += 1
+
+            updated_after = _naive_utc(self.store.get_meta("sync_updated_at"))
+            after_id = self.store.get_meta("sync_last_id")
+            if updated_after is None and after_id is None:
+                # No high-water mark yet: reconcile once, then only deltas are read
+                return self.reconcile()
+
+            indexed = 0
+            batch = []
+            cursor = self.repository.find_changed_since(
+                updated_after - self.overlap if updated_after else None, after_id, MATCHING_PROJECTION
+            )
+            for cv in cursor:
+                stamp = _naive_utc(cv.get("updated_at"))
+                if stamp is not None:
+                    updated_after = max(updated_after, stamp) if updated_after else stamp
+                elif isinstance(cv["_id"], ObjectId):
+                    after_id = max(after_id, cv["_id"]) if isinstance(after_id, ObjectId) else cv["_id"]
+                batch.append((str(cv["_id"]), cv))
+                if len(batch) >= self.batch_size:
+                    self.recommender.index_cvs(batch)
+                    indexed += len(batch)
+                    batch = []
+            self.recommender.index_cvs(batch)
+            indexed += len(batch)
+            self._save_marks(updated_after, after_id)
+            self.stats["indexed"] += indexed
+            if indexed:
+                logger.debug(f"Corpus sync: {indexed} CVs vectorized")
+
+            if now - self._last_reconcile >= self.reconcile_interval:
+                self.reconcile()
+            return indexed
+
+    def reconcile(self):
+        """
+        Compare the ids of the collection with the store: vectorize the missing
+        CVs, remove the deleted ones and reset the high-water marks.
+
+        Returns:
+            int: Number of CVs vectorized
+        """
+        self._last_reconcile = time.monotonic()
+        self.stats["reconciliations"] += 1
+        started = utc_now()
+
+        ids = self.repository.find_ids()
+        missing = [cv_id for cv_id in ids if cv_id not in self.store]
+        indexed = 0
+        for i in range(0, len(missing), self.batch_size):
+            cvs = self.repository.find_by_ids(missing[i:i + self.batch_size], MATCHING_PROJECTION)
+            self.recommender.index_cvs(list(cvs.items()))
+            indexed += len(cvs)
+
+        deleted = 0
+        for cv_id, _ in self.store.items():
+            if cv_id not in ids:
+                self.store.delete(cv_id)
+                deleted += 1
+
+        # Ids of the documents written by other tools (ObjectIds grow with their creation time)
+        last_id = max((to_object_id(cv_id) for cv_id in ids if ObjectId.is_valid(cv_id)), default=None)
+        self._save_marks(started, last_id)
+        self.stats["indexed"] += indexed
+        self.stats["deleted"] += deleted
+        logger.debug(f"Corpus reconciled: {indexed} CVs vectorized, {deleted} removed")
+        return indexed
+
+    def _save_marks(self, updated_after, after_id):
+        if updated_after is not None and updated_after != self.store.get_meta("sync_updated_at"):
+            self.store.set_meta("sync_updated_at", updated_after)
+        if after_id is not None and after_id != self.store.get_meta("sync_last_id"):
+            self.store.set_meta("sync_last_id", after_id)
@@ -0,0 +1,167 @@
+import os
+import json
+import logging
+import traceback
+from services.extractor import extract_text_from_pdf
+from services.llm_structurer import LLMStructurer
+from services.llm_recommender import LLMRecommender
+from utils.mongodb import convert_objectid_to_str, cv_content
+from utils.disk_cache import get_disk_cache, sha256_file
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+class CVPipelineError(Exception):
+    """
+    Raised when a stage of the CV ingestion pipeline fails.
+    The message is returned to the client as is.
+    """
+
+
+def process_cv_file(
+    file_path,
+    api_key=None,
+    mongodb_client=None,
+    vector_recommender=None,
+    output_folder="data/outputs",
+    profiles_file="data/profiles/it_profiles.json",
+    on_stage=None,
+    shortlists=None
+):
+    """
+    Run the whole ingestion pipeline on an uploaded CV: text extraction,
+    LLM structuring, MongoDB upsert and profile recommendation.
+
+    The extracted text, structured CV and CV vector are cached by the SHA-256
+    of the file's bytes, so re-uploading the same PDF skips the OCR and LLM
+    calls. Intermediate outputs are saved in a subfolder named after that hash.
+
+    Args:
+        file_path: Path to the CV PDF file
+        api_key: Groq API key (defaults to GROQ_API_KEY)
+        mongodb_client: MongoDB client (defaults to the shared pooled client)
+        vector_recommender: VectorRecommender used to precompute the CV vector (optional)
+        output_folder: Folder under which the intermediate outputs are saved
+        profiles_file: Path to the JSON file containing IT profiles
+        on_stage: Function called with the name of each stage as it starts (optional)
+        shortlists: ShortlistService whose job offer shortlists receive the new CV (optional)
+
+    Returns:
+        dict: Response data with the structured CV, the recommendations and the document ID
+
+    Raises:
+        CVPipelineError: If a stage fails
+    """
+    on_stage = on_stage or (lambda stage: None)
+    content_hash = sha256_file(file_path)
+    cache = get_disk_cache("cv")
+    output_folder = os.path.join(output_folder, content_hash)
+    os.makedirs(output_folder, exist_ok=True)
+    output_txt_path = os.path.join(output_folder, "output.txt")
+    output_json_path = os.path.join(output_folder, "structured_cv.json")
+    output_recommendations_path = os.path.join(output_folder, "recommendations.json")
+
+    try:
+        on_stage("extraction")
+        raw_text = cache.get(f"text:{content_hash}")
+        if raw_text is None:
+            raw_text = extract_text_from_pdf(file_path, output_txt_path)
+            cache.set(f"text:{content_hash}", raw_text)
+            logger.debug("Extraction du texte terminée")
+        else:
+            logger.debug(f"Texte extrait trouvé dans le cache ({content_hash})")
+
+        # Structure CV via LLM
+        logger.debug("Début de la structuration via LLM")
+        api_key = api_key or os.environ.get("GROQ_API_KEY")
+        structurer = LLMStructurer(api_key=api_key)
+        if not api_key and not structurer.offline_fallback:
+            logger.error("Clé API GROQ non définie")
+            raise CVPipelineError("GROQ API key not set")
+
+        on_stage("structuring")
+        structured_key = f"structured:{structurer.model}:{content_hash}"
+        cv_json = cache.get(structured_key)
+        if cv_json is None:
+            cv_json, source = structurer.structure_cv_with_source(raw_text)
+            if source == "offline":
+                # Rule-based result: not cached under the model, so that the LLM is tried next time
+                logger.debug("CV structuré par les règles locales (LLM indisponible)")
+                structured_key = f"structured:offline:{content_hash}"
+            elif cv_json:
+                # Cached before the save, without any storage field
+                cache.set(structured_key, cv_json)
+        else:
+            logger.debug(f"CV structuré trouvé dans le cache ({content_hash})")
+    except CVPipelineError:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur lors du traitement du CV: {str(e)}")
+        logger.debug(traceback.format_exc())
+        raise CVPipelineError(f"Error processing CV: {str(e)}")
+
+    if not cv_json:
+        logger.error("Échec de la structuration du CV")
+        raise CVPipelineError("CV structuring failed")
+
+    logger.debug(f"CV JSON content preview: {json.dumps(cv_json, ensure_ascii=False)[:200]}...")
+    with open(output_json_path, "w", encoding="utf-8") as f:
+        json.dump(cv_json, f, ensure_ascii=False, indent=2)
+
+    # Save to MongoDB, precomputing the CV vector (the file hash identifies CVs without an email)
+    cv_json["content_hash"] = content_hash
+    try:
+        on_stage("saving")
+        cv_vector = None
+        if vector_recommender is not None:
+            vector_key = f"vector:{vector_recommender.vector_version}:{structured_key}"
+            cv_vector = cache.get(vector_key)
+            if cv_vector is None:
+                try:
+                    cv_vector = vector_recommender.compute_cv_vector(vector_recommender.preprocess_cv(cv_json))
+                    cache.set(vector_key, cv_vector)
+                except Exception as e:
+                    logger.error(f"Erreur lors de la vectorisation du CV: {str(e)}")
+        inserted_id = structurer.save_to_mongodb(
+            cv_json, mongodb_client, vector_recommender=vector_recommender, cv_vector=cv_vector
+        )
+        logger.debug(f"Données sauvegardées avec ID: {inserted_id}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la sauvegarde dans MongoDB: {str(e)}")
+        logger.debug(traceback.format_exc())
+        raise CVPipelineError(f"Error saving to MongoDB: {str(e)}")
+
+    # Score the new CV against the open job offers: a failure here does not fail the whole process
+    if shortlists is not None and inserted_id:
+        try:
+            shortlists.add_cvs([(inserted_id, cv_json)])
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour des shortlists: {str(e)}")
+
+    # Recommend profiles: a failure here does not fail the whole process
+    recommendations_data = None
+    try:
+        on_stage("recommendation")
+        llm_recommender = LLMRecommender(api_key=api_key)
+        recommendations = llm_recommender.recommend_profiles(
+            cv_json=convert_objectid_to_str(cv_json),
+            profiles_file=profiles_file
+        )
+        if recommendations:
+            llm_recommender.save_recommendations_to_file(recommendations, output_recommendations_path)
+            logger.debug(f"Recommandations de profils sauvegardées dans {output_recommendations_path}")
+            recommendations_data = recommendations
+    except Exception as e:
+        logger.error(f"Erreur lors de la recommandation de profils: {str(e)}")
+
+    response_data = {
+        "success": True,
+        "message": "CV processed and saved successfully",
+        "cv_data": cv_content(cv_json),
+        "recommendations": recommendations_data,
+        "id": str(inserted_id) if inserted_id is not None else None
+    }
+
+    # Convert any ObjectId objects to strings in the entire response
+    return convert_objectid_to_str(response_data)
@@ -0,0 +1,450 @@
+import re
+import unicodedata
+
+# Known skills by category; a tuple lists the name kept followed by its aliases
+SKILL_LEXICON = {
+    "langages_et_frameworks": [
+        "Python", "Java", "JavaScript", "TypeScript", "C++", "C#", "PHP", "Ruby", ("Go", "Golang"), "Rust",
+        "Kotlin", "Swift", "Scala", "Dart", "HTML", "CSS", "SQL", "Bash", "MATLAB", ("React", "React.js", "ReactJS"),
+        "Redux", "Angular", ("Vue.js", "VueJS"), "Next.js", ("Node.js", "NodeJS"), ("Express", "Express.js"),
+        "Django", "Flask", "FastAPI", "Spring Boot", "Spring", "Laravel", "Symfony", ".NET", "ASP.NET", "Flutter",
+        "React Native", "Bootstrap", "Tailwind", "jQuery", "Three.js", "GraphQL", "JWT"
+    ],
+    "bases_de_donnees": [
+        "MySQL", "PostgreSQL", "MongoDB", "Oracle Database", "Oracle APEX", "PL/SQL", "SQLite", "Redis",
+        "Cassandra", "Elasticsearch", "Firebase", "SQL Server", "MariaDB", "Neo4j", "DynamoDB"
+    ],
+    "intelligence_artificielle_et_data": [
+        "NumPy", "Pandas", "Matplotlib", ("Scikit-learn", "sklearn"), "TensorFlow", "Keras", "PyTorch", "OpenCV",
+        "NLTK", "spaCy", "Hugging Face", "Spark", "Hadoop", "Power BI", "Tableau", "Machine Learning",
+        "Deep Learning", "NLP", "Computer Vision", "Data Warehouse", "SSIS", "Talend", "Airflow", "Kafka"
+    ],
+    "cloud_et_devops": [
+        "AWS", "Azure", ("GCP", "Google Cloud"), "Docker", "Kubernetes", "Jenkins", "GitLab CI", "GitHub Actions",
+        "Terraform", "Ansible", "VMware", "Linux", "Nginx", "CI/CD", "OpenShift"
+    ],
+    "outils_et_methodologies": [
+        "Git", "GitHub", "GitLab", "Jira", "Postman", "Figma", "UML", "Merise", "Scrum", "Agile",
+        "Design Patterns", "Android Studio", "Maven", "Gradle", "Selenium", "JUnit", "XML", "REST", "Microservices"
+    ]
+}
+
+# Skills matched with their exact case only (common words otherwise)
+CASE_SENSITIVE_SKILLS = {"Go", "REST", "Express", "Spring", "Swift", "Rust", "Agile", "Spark", "Tableau"}
+
+# Section headers, compared without accents, spaces or symbols
+SECTION_HEADERS = {
+    "informations_personnelles": ["contact", "coordonnees", "informationspersonnelles", "profil", "apropos",
+                                  "objectif", "resume"],
+    "education": ["education", "formation", "formations", "parcoursacademique", "diplomes", "etudes",
+                  "cursus"],
+    "competences": ["competences", "competencestechniques", "skills", "technicalskills", "outils"],
+    "experiences_professionnelles": ["experience", "experiences", "experiencesprofessionnelles",
+                                     "experienceprofessionnelle", "stages", "workexperience"],
+    "projets": ["projets", "projects", "projetsacademiques", "projetspersonnels", "realisations"],
+    "langues": ["langues", "languages"],
+    "certifications": ["certifications", "certificats", "certificates"],
+    "activites_extra_scolaires": ["parascolaire", "activites", "activitesparascolaires",
+                                  "activitesextrascolaires", "centresdinteret", "loisirs", "vieassociative",
+                                  "interets"]
+}
+
+SPOKEN_LANGUAGES = {
+    "anglais": "anglais", "english": "anglais", "francais": "français", "french": "français",
+    "arabe": "arabe", "arabic": "arabe", "espagnol": "espagnol", "spanish": "espagnol",
+    "allemand": "allemand", "german": "allemand", "italien": "italien", "italian": "italien",
+    "portugais": "portugais", "chinois": "chinois", "japonais": "japonais", "russe": "russe",
+    "amazigh": "amazigh", "tamazight": "amazigh", "neerlandais": "néerlandais"
+}
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"\+?\(?\d[\d\s().-]{7,18}\d")
+YEAR_RANGE_RE = re.compile(r"(19|20)\d{2}\s*[-–—]\s*(19|20)\d{2}")
+DATE_TOKEN = r"(?:[A-Za-zéûÉ]{3,9}\.?\s*)?(?:\d{1,2}[/.])?(?:19|20)\d{2}"
+DATE_RANGE_RE = re.compile(
+    rf"(?P<debut>{DATE_TOKEN})\s*(?:-|–|—|à|au|to)\s*"
+    rf"(?P<fin>{DATE_TOKEN}|présent|present|aujourd'hui|actuel|now|current|en cours)",
+    re.IGNORECASE
+)
+YEAR_RE = re.compile(r"(?<!\d)(19|20)\d{2}(?!\d)")
+ITEM_START_RE = re.compile(r"^\s*(?:\d{1,2}\s*[.)]|[-•▪●◦*∠])\s*")
+LABEL_RE = re.compile(r"^\s*([^:]{2,60}):\s*")
+
+
+def fold(text):
+    """Lowercase a text and remove its accents, keeping one character per character."""
+    return "".join(unicodedata.normalize("NFKD", ch)[0] for ch in text).lower()
+
+
+def squash(text):
+    """Keep only the unaccented letters of a text, in lowercase."""
+    return re.sub(r"[^a-z]", "", fold(text))
+
+
+def _skill_pattern(name):
+    """Build the regex of a skill name, tolerant to missing spaces (frequent in PDF extraction)."""
+    parts = [re.escape(part) for part in name.split()]
+    body = r"\s*".join(parts)
+    flags = 0 if name in CASE_SENSITIVE_SKILLS else re.IGNORECASE
+    return re.compile(rf"(?<![A-Za-z0-9+#]){body}(?![A-Za-z0-9+#])", flags)
+
+
+def _compile_lexicon():
+    entries = []
+    for category, skills in SKILL_LEXICON.items():
+        for skill in skills:
+            names = skill if isinstance(skill, tuple) else (skill,)
+            entries.append((category, names[0], [_skill_pattern(name) for name in names], {squash(n) for n in names}))
+    return entries
+
+
+def _longest_first(entries):
+    """Order lexicon entries so that 'Spring Boot' is matched before 'Spring'."""
+    return sorted(range(len(entries)), key=lambda i: -max(len(name) for name in entries[i][3]))
+
+
+_LEXICON = _compile_lexicon()
+_MATCH_ORDER = _longest_first(_LEXICON)
+# Lone "C" is only taken from comma-separated skill lists
+C_LANGUAGE_RE = re.compile(r"(?:(?<=[,:])|(?<=[,:]\s))C(?=\s*(?:,|$))", re.MULTILINE)
+
+
+def find_skills(text):
+    """
+    Find the known skills mentioned in a text.
+
+    Longer names are matched first and masked, so that 'Spring Boot' or
+    'PL/SQL' are not also reported as 'Spring' or 'SQL'.
+
+    Returns:
+        dict: Skills by category, in lexicon order
+    """
+    found = set()
+    for i in _MATCH_ORDER:
+        for pattern in _LEXICON[i][2]:
+            text, count = pattern.subn(lambda match: " " * len(match.group(0)), text)
+            if count:
+                found.add(i)
+
+    skills = {}
+    for i in sorted(found):
+        category, name, _, _ = _LEXICON[i]
+        skills.setdefault(category, []).append(name)
+    if C_LANGUAGE_RE.search(text):
+        skills.setdefault("langages_et_frameworks", []).append("C")
+    return skills
+
+
+def is_known_skill(item):
+    """Return True if a list item is exactly a known skill."""
+    key = squash(item)
+    return bool(key) and (key == "c" or any(key in names for _, _, _, names in _LEXICON))
+
+
+def split_sections(lines):
+    """
+    Split the lines of a CV into sections, using the recognized headers.
+
+    Returns:
+        dict: Lines by section name ('header' for the lines before the first section)
+    """
+    sections = {"header": []}
+    current = "header"
+    for line in lines:
+        key = squash(line)
+        header = None
+        if 0 < len(key) <= 30:
+            for section, names in SECTION_HEADERS.items():
+                if key in names:
+                    header = section
+                    break
+        if header:
+            current = header
+            sections.setdefault(current, [])
+        else:
+            sections.setdefault(current, []).append(line)
+    return sections
+
+
+def find_phone(text):
+    """Return the first phone number of a text, or None."""
+    for match in PHONE_RE.finditer(text):
+        candidate = match.group(0).strip()
+        digits = re.sub(r"\D", "", candidate)
+        if 9 <= len(digits) <= 15 and not YEAR_RANGE_RE.search(candidate):
+            return re.sub(r"[\s().-]", "", candidate)
+    return None
+
+
+def _name_tokens(line):
+    """Split a name line into words, also when the PDF extraction removed the spaces (MTEJJALAya)."""
+    return re.findall(r"[A-ZÀ-Ý]{2,}(?![a-zà-ÿ])|[A-ZÀ-Ý][a-zà-ÿ]+(?:-[A-ZÀ-Ý][a-zà-ÿ]+)?", line)
+
+
+def find_name(header_lines, email=None):
+    """
+    Guess the candidate's last and first names from the first lines of the CV.
+
+    Lines whose words all appear in the email address are preferred; in a
+    name, the word written in capitals is taken as the last name.
+
+    Returns:
+        dict: 'nom' and 'prenom' (empty dict if no name was found)
+    """
+    local_part = squash(email.split("@")[0]) if email else ""
+    best, best_score = None, 0
+    for position, line in enumerate(header_lines[:8]):
+        if re.search(r"[\d@:]", line):
+            continue
+        tokens = _name_tokens(line)
+        if not 2 <= len(tokens) <= 4 or squash("".join(tokens)) != squash(line):
+            continue
+        score = 1
+        if local_part and all(squash(token) in local_part for token in tokens):
+            score += 2
+        if position == 0:
+            score += 1
+        if score > best_score:
+            best, best_score = tokens, score
+    if not best:
+        return {}
+
+    upper = [token for token in best if token.isupper()]
+    others = [token for token in best if not token.isupper()]
+    if upper and others:
+        return {"nom": " ".join(token.capitalize() for token in upper), "prenom": " ".join(others)}
+    return {"nom": " ".join(best[1:]), "prenom": best[0]}
+
+
+def find_date_ranges(text):
+    """
+    Find the date ranges of a text (2021-2023, 09/2022 - présent...).
+
+    Returns:
+        list: Dictionaries with 'debut', 'fin' and the line they were found in
+    """
+    ranges = []
+    for line in text.splitlines():
+        for match in DATE_RANGE_RE.finditer(line):
+            ranges.append({"debut": match.group("debut").strip(), "fin": match.group("fin").strip(),
+                           "ligne": line.strip()})
+    return ranges
+
+
+def find_languages(lines):
+    """
+    Find the spoken languages and their levels in the lines of the languages section.
+
+    Returns:
+        dict: Level by language
+    """
+    text = " ".join(lines)
+    folded = fold(text)
+    matches = []
+    for name, language in SPOKEN_LANGUAGES.items():
+        for match in re.finditer(rf"(?<![a-z]){name}(?![a-z])", folded):
+            matches.append((match.start(), match.end(), language))
+    matches.sort()
+
+    languages = {}
+    for i, (start, end, language) in enumerate(matches):
+        stop = matches[i + 1][0] if i + 1 < len(matches) else len(text)
+        level = text[end:stop].strip(" :-–,;()|")
+        languages.setdefault(language, level[:40])
+    return languages
+
+
+def _list_items(line):
+    """Split a skill line ('Label: a, b, c') into its items."""
+    line = LABEL_RE.sub("", line)
+    return [item.strip() for item in re.split(r"[,;|•]", line) if item.strip()]
+
+
+def _split_entries(lines, starts_entry):
+    """Group lines into entries, a new entry starting at each line for which starts_entry is True."""
+    entries = []
+    for line in lines:
+        if not line.strip():
+            continue
+        if not entries or starts_entry(line):
+            entries.append([line])
+        else:
+            entries[-1].append(line)
+    return entries
+
+
+def pre_extract(raw_text):
+    """
+    Extract the fields of a CV that can be found without an LLM.
+
+    Args:
+        raw_text: Text extracted from the CV
+
+    Returns:
+        dict: 'informations_personnelles', 'competences', 'langues', 'dates',
+            the 'sections' of the text and the 'residual_text' left for the LLM
+    """
+    lines = [line.strip() for line in raw_text.splitlines()]
+    sections = split_sections(lines)
+
+    email_match = EMAIL_RE.search(raw_text)
+    email = email_match.group(0) if email_match else None
+    phone = find_phone(raw_text)
+    info = find_name(sections.get("header", []) + sections.get("informations_personnelles", []), email)
+    if phone:
+        info["telephone"] = phone
+    if email:
+        info["email"] = email
+
+    skills_text = "\n".join(sections.get("competences", []) + sections.get("certifications", []))
+    competences = find_skills(skills_text or raw_text)
+    languages = find_languages(sections.get("langues", []))
+
+    # Residual text: everything the rules did not capture
+    residual = []
+    for section, section_lines in sections.items():
+        if section == "langues" and languages:
+            continue
+        if section != "header":
+            residual.append(f"[{section}]")
+        for line in section_lines:
+            if section in ("header", "informations_personnelles"):
+                line = EMAIL_RE.sub("", line)
+                if phone:
+                    line = PHONE_RE.sub("", line)
+                if not squash(line) or (info.get("nom") and squash(line) in (
+                        squash(info.get("nom", "") + info.get("prenom", "")),
+                        squash(info.get("prenom", "") + info.get("nom", "")))):
+                    continue
+            elif section == "competences":
+                unknown = [item for item in _list_items(line) if not is_known_skill(item)]
+                if not unknown:
+                    continue
+                line = ", ".join(unknown)
+            if line.strip():
+                residual.append(line.strip())
+
+    return {
+        "informations_personnelles": info,
+        "competences": competences,
+        "langues": languages,
+        "dates": find_date_ranges(raw_text),
+        "sections": sections,
+        "residual_text": "\n".join(residual)
+    }
+
+
+def merge_structured(pre, llm_data):
+    """
+    Merge the pre-extracted fields with the fields structured by the LLM from the residual text.
+
+    Args:
+        pre: Result of pre_extract
+        llm_data: JSON returned by the LLM for the residual text
+
+    Returns:
+        dict: Structured CV
+    """
+    competences = {category: list(skills) for category, skills in pre["competences"].items()}
+    other_skills = [skill for skill in llm_data.get("competences_autres", []) or []
+                    if isinstance(skill, str) and not is_known_skill(skill)]
+    if other_skills:
+        competences["autres"] = other_skills
+
+    structured = {
+        "informations_personnelles": dict(pre["informations_personnelles"]),
+        "education": llm_data.get("education", []),
+        "competences": competences,
+        "experiences_professionnelles": llm_data.get("experiences_professionnelles", []),
+        "projets": llm_data.get("projets", []),
+        "langues": pre["langues"] or llm_data.get("langues", {}),
+        "activites_extra_scolaires": llm_data.get("activites_extra_scolaires", [])
+    }
+    for key, value in llm_data.items():
+        if key not in structured and key != "competences_autres":
+            structured[key] = value
+    return structured
+
+
+def _dated_entries(lines, first_field):
+    """Structure lines as entries starting at a date (education, experiences)."""
+    entries = []
+    for entry_lines in _split_entries(lines, lambda line: bool(YEAR_RE.search(line))):
+        first = ITEM_START_RE.sub("", entry_lines[0])
+        date_match = DATE_RANGE_RE.search(first) or YEAR_RE.search(first)
+        dates = date_match.group(0) if date_match else ""
+        title = (first.replace(dates, "", 1) if dates else first).strip(" -–,")
+        entries.append({
+            first_field: title,
+            "dates": dates,
+            "details": " ".join(line.strip() for line in entry_lines[1:])
+        })
+    return entries
+
+
+def offline_structure(raw_text, pre=None):
+    """
+    Structure a CV with the rules only, when the LLM is unavailable.
+
+    The document has the shape consumed by VectorRecommender.preprocess_cv:
+    a 'competences' dictionary of skill lists, 'education' entries with
+    'diplome', 'etablissement' and 'filiere', and 'projets' with 'nom',
+    'techs' and 'detail'.
+
+    Args:
+        raw_text: Text extracted from the CV
+        pre: Result of pre_extract, if already computed
+
+    Returns:
+        dict: Structured CV
+    """
+    pre = pre or pre_extract(raw_text)
+    sections = pre["sections"]
+
+    education = []
+    for entry in _dated_entries(sections.get("education", []), "diplome"):
+        field_re = re.compile(r"[-–,\s]*(?:fili[eè]re|option|sp[ée]cialit[ée])\s*:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+        filiere = field_re.search(entry["diplome"]) or field_re.search(entry["details"])
+        education.append({
+            "diplome": field_re.sub("", entry["diplome"]).strip(),
+            "etablissement": "",
+            "filiere": filiere.group(1).strip() if filiere else "",
+            "dates": entry["dates"]
+        })
+
+    projects = []
+    for entry_lines in _split_entries(sections.get("projets", []),
+                                      lambda line: bool(re.match(r"^\s*\d{1,2}\s*[.)]", line))):
+        name = ITEM_START_RE.sub("", entry_lines[0]).strip()
+        techs, details = [], []
+        for line in entry_lines[1:]:
+            line = ITEM_START_RE.sub("", line)
+            label = LABEL_RE.match(line)
+            if label and squash(label.group(1)) in ("techs", "technologies", "stack", "outils", "environnement"):
+                techs.extend(_list_items(line))
+            else:
+                details.append(LABEL_RE.sub("", line) if label else line)
+        if not techs:
+            techs = [skill for skills in find_skills("\n".join(entry_lines)).values() for skill in skills]
+        projects.append({"nom": name, "techs": techs, "detail": " ".join(details).strip()})
+
+    experiences = [
+        {"poste": entry["poste"], "entreprise": "", "dates": entry["dates"], "description": entry["details"]}
+        for entry in _dated_entries(sections.get("experiences_professionnelles", []), "poste")
+    ]
+
+    activities = [
+        {"description": " ".join(entry_lines)}
+        for entry_lines in _split_entries(sections.get("activites_extra_scolaires", []),
+                                          lambda line: bool(ITEM_START_RE.match(line)))
+    ]
+
+    return {
+        "informations_personnelles": dict(pre["informations_personnelles"]),
+        "education": education,
+        "competences": {category: list(skills) for category, skills in pre["competences"].items()},
+        "experiences_professionnelles": experiences,
+        "projets": projects,
+        "langues": pre["langues"],
+        "activites_extra_scolaires": activities
+    }
@@ -0,0 +1,188 @@
+import os
+import time
+import queue
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+class EncoderService:
+    """
+    Process-wide Sentence Transformer encoding service.
+
+    The model is loaded once. Concurrent encode calls are grouped into
+    micro-batches by a background thread, and recent embeddings are kept in
+    an LRU cache keyed by the hash of the text.
+    """
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", batch_size=32, max_wait_ms=5, cache_size=10000):
+        """
+        Load the model and start the batching thread.
+
+        Args:
+            model_name: Name of the Sentence Transformer model
+            batch_size: Maximum number of texts encoded together
+            max_wait_ms: Time to wait for more texts before encoding a partial batch
+            cache_size: Number of embeddings kept in the LRU cache (0 to disable)
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.model = SentenceTransformer(model_name)
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self.stats = {"requests": 0, "cache_hits": 0, "batches": 0, "encoded": 0}
+
+        self._worker = threading.Thread(target=self._run, name=f"encoder-{model_name}", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def text_key(text):
+        """Return the cache key of a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_sentence_embedding_dimension(self):
+        """Return the dimension of the embeddings."""
+        return self.model.get_sentence_embedding_dimension()
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key, vector):
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _collect_batch(self):
+        """Wait for a first text, then gather more until the batch is full or the window closes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Texts already queued by large calls are taken without waiting
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Encode queued texts in micro-batches."""
+        while True:
+            batch = self._collect_batch()
+
+            # Identical texts queued together are encoded once
+            pending = OrderedDict()
+            for key, text, future in batch:
+                pending.setdefault(key, (text, []))[1].append(future)
+
+            try:
+                vectors = self.model.encode([text for text, _ in pending.values()],
+                                            batch_size=self.batch_size, convert_to_numpy=True)
+            except Exception as e:
+                logger.error(f"Error encoding batch of {len(pending)} texts: {e}")
+                for _, futures in pending.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["encoded"] += len(pending)
+            for (key, (_, futures)), vector in zip(pending.items(), vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                self._cache_put(key, vector)
+                for future in futures:
+                    future.set_result(vector)
+
+    def encode(self, texts, **kwargs):
+        """
+        Encode one or several texts.
+
+        Mirrors SentenceTransformer.encode: a single text returns a 1D vector,
+        a list of texts returns a 2D array.
+
+        Args:
+            texts: Text or list of texts
+
+        Returns:
+            vectors: Embedding(s) of the text(s)
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+
+        results = [None] * len(texts)
+        futures = []
+        for i, text in enumerate(texts):
+            self.stats["requests"] += 1
+            key = self.text_key(text)
+            vector = self._cache_get(key)
+            if vector is not None:
+                self.stats["cache_hits"] += 1
+                results[i] = vector
+            else:
+                future = Future()
+                self._queue.put((key, text, future))
+                futures.append((i, future))
+
+        for i, future in futures:
+            results[i] = future.result()
+
+        if single:
+            return results[0]
+        if not results:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.vstack(results)
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(model_name="all-MiniLM-L6-v2"):
+    """
+    Return the process-wide encoding service of a model, loading it on first use.
+
+    Batching and cache settings are read from the ENCODER_BATCH_SIZE,
+    ENCODER_MAX_WAIT_MS and ENCODER_CACHE_SIZE environment variables.
+
+    Args:
+        model_name: Name of the Sentence Transformer model
+
+    Returns:
+        EncoderService: Shared encoding service
+    """
+    with _encoders_lock:
+        if model_name not in _encoders:
+            logger.info(f"Loading Sentence Transformer model {model_name}")
+            _encoders[model_name] = EncoderService(
+                model_name=model_name,
+                batch_size=int(os.environ.get("ENCODER_BATCH_SIZE", 32)),
+                max_wait_ms=float(os.environ.get("ENCODER_MAX_WAIT_MS", 5)),
+                cache_size=int(os.environ.get("ENCODER_CACHE_SIZE", 10000))
+            )
+        return _encoders[model_name]
@@ -1,30 +1,202 @@
 from PyPDF2 import PdfReader  
 from pdf2image import convert_from_path  
+from concurrent.futures import ProcessPoolExecutor  
+from utils.metrics import span, registry  
 import pytesseract  
+import logging  
+import time  
 import os  
   
-def extract_text_from_pdf(pdf_path, output_txt_path):  
+try:  
+    import fitz  # PyMuPDF  
+except ImportError:  
+    fitz = None  
+  
+# Initialize logger  
+logger = logging.getLogger(__name__)  
+  
+# OCR settings, overridable per call  
+OCR_DPI = int(os.environ.get("OCR_DPI", 200))  
+OCR_LANG = os.environ.get("OCR_LANG", "eng")  
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", 0)) or os.cpu_count() or 1  
+  
+# Pages whose text layer has fewer characters than this are OCR'd  
+OCR_MIN_CHARS = int(os.environ.get("OCR_MIN_CHARS", 10))  
+  
+class PyPDF2Backend:  
     """  
-    Extracts text from a PDF file, prints it to the terminal, and saves it to a text file.  
+    Text layer extraction with PyPDF2 (pure Python, always available).  
     """  
-    reader = PdfReader(pdf_path)  
-    # Extract text using PyPDF2  
-    text = "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])  
+    name = "pypdf2"  
   
-    # If PyPDF2 failed (image-based PDF), apply OCR  
-    if not text.strip():  
-        print("PyPDF2 failed to extract text. Using OCR...")  
-        images = convert_from_path(pdf_path)  # Convert PDF pages to images  
-        text = "\n".join([pytesseract.image_to_string(img) for img in images])  # OCR on each image page  
+    def page_texts(self, pdf_path):  
+        """Return the text layer of each page, in page order."""  
+        reader = PdfReader(pdf_path)  
+        return [page.extract_text() or "" for page in reader.pages]  
   
-    # Print the extracted text to the terminal  
-    print("\n--- Extracted Text ---\n")  
-    print(text.strip())  
+class PyMuPDFBackend:  
+    """  
+    Text layer extraction with PyMuPDF (native MuPDF parser, much faster than PyPDF2).  
+    """  
+    name = "pymupdf"  
+  
+    def page_texts(self, pdf_path):  
+        """Return the text layer of each page, in page order."""  
+        with fitz.open(pdf_path) as document:  
+            return [page.get_text() for page in document]  
+  
+def get_pdf_backend(name=None):  
+    """  
+    Return a PDF text extraction backend.  
+  
+    Args:  
+        name: 'pymupdf', 'pypdf2' or 'auto' (PyMuPDF when installed), defaults to PDF_BACKEND ('auto')  
+  
+    Returns:  
+        Backend with a page_texts(pdf_path) method  
+    """  
+    name = (name or os.environ.get("PDF_BACKEND", "auto")).lower()  
+    if name == "pymupdf" or (name == "auto" and fitz is not None):  
+        if fitz is None:  
+            raise ValueError("PDF_BACKEND=pymupdf requires the PyMuPDF package")  
+        return PyMuPDFBackend()  
+    if name in ("pypdf2", "auto"):  
+        return PyPDF2Backend()  
+    raise ValueError(f"Unsupported PDF backend: {name}")  
+  
+def render_page(pdf_path, page_number, dpi=OCR_DPI):  
+    """  
+    Renders a single page of a PDF as an image, with PyMuPDF when installed  
+    (no poppler needed), with pdf2image otherwise.  
+    """  
+    if fitz is not None:  
+        from PIL import Image  
+        with fitz.open(pdf_path) as document:  
+            pixmap = document[page_number - 1].get_pixmap(dpi=dpi)  
+            return [Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)]  
+    return convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)  
+  
+def ocr_page(pdf_path, page_number, dpi=OCR_DPI, lang=OCR_LANG):  
+    """  
+    Renders a single page of a PDF and runs OCR on it.  
+    Only this page is held in memory.  
+    """  
+    images = render_page(pdf_path, page_number, dpi)  
+    return "\n".join(pytesseract.image_to_string(img, lang=lang) for img in images)  
+  
+def ocr_pages(pdf_path, page_numbers, dpi=OCR_DPI, lang=OCR_LANG, workers=OCR_WORKERS):  
+    """  
+    Runs OCR on some pages of a PDF in a process pool.  
+    Pages are rendered inside the workers and at most `workers` pages are  
+    processed at a time, so peak memory does not grow with the page count.  
+  
+    Returns:  
+        dict: OCR text by page number  
+    """  
+    page_numbers = list(page_numbers)  
+    workers = max(1, min(workers, len(page_numbers)))  
+    if workers == 1:  
+        return {n: ocr_page(pdf_path, n, dpi, lang) for n in page_numbers}  
+  
+    texts = {}  
+    with ProcessPoolExecutor(max_workers=workers) as pool:  
+        in_flight = []  
+        for n in page_numbers:  
+            in_flight.append((n, pool.submit(ocr_page, pdf_path, n, dpi, lang)))  
+            if len(in_flight) >= workers:  
+                page_number, future = in_flight.pop(0)  
+                texts[page_number] = future.result()  
+        for page_number, future in in_flight:  
+            texts[page_number] = future.result()  
+    return texts  
+  
+def ocr_pdf(pdf_path, page_count, dpi=OCR_DPI, lang=OCR_LANG, workers=OCR_WORKERS):  
+    """  
+    Runs OCR on every page of a PDF, returning the texts in page order.  
+    """  
+    texts = ocr_pages(pdf_path, range(1, page_count + 1), dpi, lang, workers)  
+    return [texts[n] for n in range(1, page_count + 1)]  
+  
+def extract_pdf(pdf_path, backend=None, ocr_dpi=None, ocr_lang=None, ocr_workers=None, ocr_min_chars=None):  
+    """  
+    Extracts the text of a PDF, choosing for each page between its text layer and OCR.  
+  
+    The text layer of all pages is read in a single pass; only the pages with  
+    no usable text layer (scanned pages) are OCR'd, so mixed PDFs keep their  
+    text pages and pay OCR only for their scanned ones.  
+  
+    Args:  
+        pdf_path: Path of the PDF file  
+        backend: Text extraction backend name (see get_pdf_backend)  
+        ocr_dpi, ocr_lang, ocr_workers: OCR settings, default to OCR_DPI, OCR_LANG and OCR_WORKERS  
+        ocr_min_chars: Pages with fewer text layer characters are OCR'd, defaults to OCR_MIN_CHARS  
+  
+    Returns:  
+        dict: Text, backend, page count, OCR'd page numbers, parse and OCR times in seconds  
+    """  
+    backend = get_pdf_backend(backend)  
+    min_chars = OCR_MIN_CHARS if ocr_min_chars is None else ocr_min_chars  
+  
+    start = time.perf_counter()  
+    with span("pdf_extraction"):  
+        texts = backend.page_texts(pdf_path)  
+    parse_seconds = time.perf_counter() - start  
+  
+    scanned = [n for n, text in enumerate(texts, start=1) if len(text.strip()) < min_chars]  
+    ocr_seconds = 0.0  
+    if scanned:  
+        logger.info(f"{len(scanned)} of {len(texts)} pages without a text layer, using OCR on them")  
+        start = time.perf_counter()  
+        try:  
+            with span("ocr"):  
+                ocr_texts = ocr_pages(  
+                    pdf_path,  
+                    scanned,  
+                    dpi=ocr_dpi or OCR_DPI,  
+                    lang=ocr_lang or OCR_LANG,  
+                    workers=ocr_workers or OCR_WORKERS  
+                )  
+        except Exception as e:  
+            registry.inc("ocr_failures_total", len(scanned))  
+            if len(scanned) == len(texts):  
+                raise  
+            # The text pages of a mixed PDF are still usable  
+            logger.error(f"OCR failed, keeping the text layer only: {e}")  
+            ocr_texts = {}  
+        ocr_seconds = time.perf_counter() - start  
+        registry.inc("ocr_pages_total", len(ocr_texts))  
+        for n, text in ocr_texts.items():  
+            texts[n - 1] = text  
+  
+    text = "\n".join(page_text for page_text in texts if page_text.strip())  # Pages in page order  
+    return {  
+        "text": text.strip(),  
+        "backend": backend.name,  
+        "pages": len(texts),  
+        "ocr_pages": scanned,  
+        "parse_seconds": parse_seconds,  
+        "ocr_seconds": ocr_seconds  
+    }  
+  
+def extract_text_from_pdf(pdf_path, output_txt_path, ocr_dpi=None, ocr_lang=None, ocr_workers=None):  
+    """  
+    Extracts text from a PDF file and saves it to a text file.  
+    Pages without a text layer go through page-level OCR; DPI, language and number of  
+    OCR processes default to the OCR_DPI, OCR_LANG and OCR_WORKERS environment variables.  
+    """  
+    result = extract_pdf(pdf_path, ocr_dpi=ocr_dpi, ocr_lang=ocr_lang, ocr_workers=ocr_workers)  
+    text = result["text"]  
+  
+    logger.debug(  
+        f"Extracted text: {len(text)} characters, {result['pages']} pages ({result['backend']}, "  
+        f"parsed in {result['parse_seconds']:.3f}s), {len(result['ocr_pages'])} pages OCR'd "  
+        f"in {result['ocr_seconds']:.3f}s"  
+    )  
   
     # Save the extracted text to a file  
     with open(output_txt_path, "w", encoding="utf-8") as f:  
-        f.write(text.strip())  
-      
-    print(f"\nText successfully extracted and saved to {output_txt_path}")  
-      
-    return text.strip()
\ No newline at end of file
+        f.write(text)  
+  
+    logger.debug(f"Text successfully extracted and saved to {output_txt_path}")  
+  
+    return text
\ No newline at end of file
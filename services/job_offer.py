@@ -35,6 +35,25 @@ class JobOffer:
             "description": self.description  
         }  
       
+    def normalized_dict(self):  
+        """  
+        Convert job offer to a dictionary where formatting-only differences are removed  
+        (case, spacing, order and repetition of the skills).  
+          
+        Returns:  
+            dict: Normalized dictionary, used as a cache key  
+        """  
+        def normalize(text):  
+            return " ".join(str(text).split()).casefold()  
+          
+        return {  
+            "titre": normalize(self.title),  
+            "competences_requises": sorted({normalize(skill) for skill in self.required_skills if normalize(skill)}),  
+            "experience": normalize(self.experience),  
+            "diplome": normalize(self.education),  
+            "description": normalize(self.description)  
+        }  
+      
     @classmethod  
     def from_dict(cls, data):  
         """  
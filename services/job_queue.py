@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import traceback
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Persistent job queue backed by a local SQLite database.
+
+    Jobs go through the statuses 'queued', 'running', 'done' and 'failed'.
+    The current stage of a running job and its result (or error) are stored
+    with it so they can be polled by the client.
+
+    A running job holds a lease, identified by a token given to the worker
+    that claimed it, which its worker pool renews while it is alive. A job
+    whose lease has expired was left by a crashed process and is put back in
+    the queue, or failed once it has been attempted max_attempts times; only
+    the holder of the current lease can record the outcome of a job.
+    """
+
+    def __init__(self, db_path="data/jobs.sqlite3", lease_seconds=None, max_attempts=None):
+        """
+        Initialize the queue and create its table if needed.
+
+        Args:
+            db_path: Path of the SQLite database file
+            lease_seconds: Lifetime of the lease of a running job, defaults to INGESTION_JOB_LEASE (60)
+            max_attempts: Number of claims after which an interrupted job is failed instead of
+                requeued, defaults to INGESTION_MAX_ATTEMPTS (3)
+        """
+        self.db_path = db_path
+        self.lease_seconds = float(os.environ.get("INGESTION_JOB_LEASE", 60)) if lease_seconds is None \
+            else lease_seconds
+        self.max_attempts = int(os.environ.get("INGESTION_MAX_ATTEMPTS", 3)) if max_attempts is None \
+            else max_attempts
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    lease_token TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            # Queue created before leases were used
+            for column, column_type in (("lease_until", "REAL"), ("lease_token", "TEXT")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        """Open a connection (SQLite connections are not shared between threads)."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return _Closing(conn)
+
+    def enqueue(self, kind, payload):
+        """
+        Add a job to the queue.
+
+        Args:
+            kind: Type of job (selects the handler)
+            payload: JSON-serializable job parameters
+
+        Returns:
+            str: ID of the job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+        return job_id
+
+    def claim(self):
+        """
+        Take the oldest queued job and mark it as running.
+
+        Returns:
+            dict: The claimed job with its lease_token, or None if the queue is empty
+        """
+        token = uuid.uuid4().hex
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE takes the write lock: two workers cannot claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, lease_token = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, token, now, row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        job = self._to_dict(row)
+        job["status"] = "running"
+        job["lease_token"] = token
+        return job
+
+    def _update_leased(self, job_id, lease_token, assignments, values):
+        """
+        Update a running job if the lease is still held, returning True if it was.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND status = 'running' AND lease_token = ?",
+                list(values) + [time.time(), job_id, lease_token]
+            )
+            return cursor.rowcount > 0
+
+    def set_stage(self, job_id, lease_token, stage):
+        """Record the stage a running job has reached."""
+        return self._update_leased(job_id, lease_token, "stage = ?", [stage])
+
+    def complete(self, job_id, lease_token, result):
+        """
+        Mark a job as done and store its result.
+
+        Returns:
+            bool: False if the lease was lost (the job was requeued and belongs to another worker)
+        """
+        return self._update_leased(
+            job_id, lease_token, "status = 'done', result = ?, lease_until = NULL",
+            [json.dumps(result, ensure_ascii=False, default=str)]
+        )
+
+    def fail(self, job_id, lease_token, error):
+        """
+        Mark a job as failed and store its error.
+
+        Returns:
+            bool: False if the lease was lost (the job was requeued and belongs to another worker)
+        """
+        return self._update_leased(job_id, lease_token, "status = 'failed', error = ?, lease_until = NULL", [error])
+
+    def renew(self, leases):
+        """
+        Extend the leases of running jobs whose worker is alive.
+
+        Args:
+            leases: Dictionary of the lease tokens by job id
+        """
+        if not leases:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND lease_token = ?",
+                [(time.time() + self.lease_seconds, job_id, token) for job_id, token in leases.items()]
+            )
+
+    def requeue_stale(self):
+        """
+        Put back in the queue the running jobs whose lease has expired (left by a crashed process).
+
+        Jobs already attempted max_attempts times (such as a file that crashes or
+        hangs the worker every time) are failed instead.
+
+        Returns:
+            tuple: Numbers of requeued and failed jobs
+        """
+        now = time.time()
+        expired = "status = 'running' AND COALESCE(lease_until, updated_at + ?) < ?"
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                failed = conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, lease_token = NULL, "
+                    f"updated_at = ? WHERE {expired} AND attempts >= ?",
+                    (f"Job interrupted after {self.max_attempts} attempts", now, self.lease_seconds, now,
+                     self.max_attempts)
+                ).rowcount
+                requeued = conn.execute(
+                    "UPDATE jobs SET status = 'queued', lease_until = NULL, lease_token = NULL, "
+                    f"updated_at = ? WHERE {expired}",
+                    (now, self.lease_seconds, now)
+                ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return requeued, failed
+
+    def get(self, job_id):
+        """
+        Return a job.
+
+        Returns:
+            dict: The job, or None if it does not exist
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class _Closing:
+    """Context manager closing a SQLite connection on exit."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Pool of background threads processing the jobs of a JobQueue.
+    """
+
+    def __init__(self, job_queue, handlers, workers=2, poll_interval=0.5):
+        """
+        Initialize the pool.
+
+        Args:
+            job_queue: JobQueue to process
+            handlers: Dictionary mapping a job kind to a function handler(payload, set_stage) -> result
+            workers: Number of worker threads
+            poll_interval: Seconds to wait when the queue is empty
+        """
+        self.job_queue = job_queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._running = {}
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads and the lease heartbeat, after requeuing jobs interrupted by a crash."""
+        self._requeue_stale()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingestion-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="ingestion-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """Ask the worker threads to stop after their current job."""
+        self._stop.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """Wake up idle workers after a job has been enqueued."""
+        self._wakeup.set()
+
+    def _requeue_stale(self):
+        requeued, failed = self.job_queue.requeue_stale()
+        if failed:
+            logger.error(f"Failed {failed} jobs interrupted {self.job_queue.max_attempts} times")
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted jobs")
+            self.notify()
+
+    def _heartbeat(self):
+        # Renew the leases of our running jobs and take over the jobs of crashed processes,
+        # several times per lease so that a live job never loses its lease
+        while not self._stop.wait(self.job_queue.lease_seconds / 3):
+            try:
+                with self._running_lock:
+                    running = dict(self._running)
+                self.job_queue.renew(running)
+                self._requeue_stale()
+            except Exception as e:
+                logger.error(f"Job lease heartbeat failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.job_queue.claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            with self._running_lock:
+                self._running[job["id"]] = job["lease_token"]
+            try:
+                self._process(job)
+            finally:
+                with self._running_lock:
+                    self._running.pop(job["id"], None)
+
+    def _process(self, job):
+        job_id, token = job["id"], job["lease_token"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.job_queue.fail(job_id, token, f"No handler for job kind: {job['kind']}")
+            return
+        try:
+            logger.debug(f"Processing job {job_id} ({job['kind']})")
+            result = handler(job["payload"], lambda stage: self.job_queue.set_stage(job_id, token, stage))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            logger.debug(traceback.format_exc())
+            recorded = self.job_queue.fail(job_id, token, str(e))
+        else:
+            try:
+                recorded = self.job_queue.complete(job_id, token, result)
+            except Exception as e:
+                # The work is done but its result cannot be stored
+                logger.error(f"Unable to store the result of job {job_id}: {e}")
+                logger.debug(traceback.format_exc())
+                recorded = self.job_queue.fail(job_id, token, f"Unable to store the job result: {e}")
+        if not recorded:
+            logger.warning(f"Job {job_id} lost its lease, its outcome was left to the current holder")
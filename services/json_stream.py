@@ -0,0 +1,283 @@
+import re
+import json
+
+# Parser states inside a container
+KEY, COLON, VALUE, AFTER_VALUE = "key", "colon", "value", "after_value"
+
+LITERAL_CHARS = set("0123456789+-.eEtruefalsnTRUEFALSN")
+NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$")
+TRAILING_DOT_RE = re.compile(r"-?(0|[1-9]\d*)\.$")
+LITERALS = {"true": "true", "false": "false", "null": "null", "none": "null"}
+
+
+def literal_token(text):
+    """Return the JSON token of a number or keyword literal ('1.' -> '1.0', 'None' -> 'null'), or None."""
+    if NUMBER_RE.match(text):
+        return text
+    if TRAILING_DOT_RE.match(text):
+        return text + "0"
+    return LITERALS.get(text.lower())
+
+
+def rename_duplicate_keys(pairs):
+    """
+    object_pairs_hook keeping duplicate keys under numbered names
+    (description, description2, description3...).
+    """
+    result = {}
+    for key, value in pairs:
+        if key in result:
+            n = 2
+            while f"{key}{n}" in result:
+                n += 1
+            key = f"{key}{n}"
+        result[key] = value
+    return result
+
+
+class IncrementalJSONParser:
+    """
+    Tolerant JSON parser fed with the text of an LLM completion as it streams.
+
+    The text is repaired while it is read: prose and code fences around the
+    object are skipped, missing commas and colons are inserted, trailing
+    commas and unmatched closing brackets are dropped, raw newlines in
+    strings are escaped, and duplicate keys are renamed with a number.
+    The parser knows which top-level members are complete, so the caller
+    can stop the completion once the sections it needs have been received.
+    At any point, result() closes what is still open and returns the object.
+    """
+
+    def __init__(self):
+        self.out = []
+        self.stack = []
+        self.started = False
+        self.done = False
+        self.completed_keys = []
+        self._in_string = False
+        self._escape = False
+        self._is_key = False
+        self._key_chars = []
+        self._literal = []
+
+    def feed(self, text):
+        """
+        Consume a chunk of the completion.
+
+        Returns:
+            IncrementalJSONParser: The parser itself
+        """
+        for ch in text:
+            if self.done:
+                break
+            self._consume(ch)
+        return self
+
+    def has_sections(self, keys):
+        """Return True once the top-level members of all the given keys are complete."""
+        return set(keys).issubset(self.completed_keys)
+
+    # --- Tokenizer ---
+
+    def _consume(self, ch):
+        if not self.started:
+            if ch == "{":
+                self.started = True
+                self._open(ch)
+            return
+
+        if self._in_string:
+            self._consume_string(ch)
+            return
+
+        if self._literal:
+            if ch in LITERAL_CHARS or ch.isalnum():
+                self._literal.append(ch)
+                return
+            self._end_literal()
+
+        if ch.isspace():
+            return
+
+        frame = self.stack[-1]
+        if ch == ",":
+            if frame["state"] == AFTER_VALUE:
+                self._comma(frame)
+            return
+        if ch == ":":
+            if frame["state"] == COLON:
+                self.out.append(":")
+                frame["state"] = VALUE
+            return
+        if ch in "}]":
+            self._close_matching("{" if ch == "}" else "[")
+            return
+
+        if frame["type"] == "{":
+            if frame["state"] == AFTER_VALUE:
+                # Missing comma between two members
+                self._comma(frame)
+            if frame["state"] == KEY:
+                if ch == '"':
+                    self._start_string(is_key=True)
+                return
+            if frame["state"] == COLON:
+                # Missing colon after a key
+                self.out.append(":")
+                frame["state"] = VALUE
+        elif frame["state"] == AFTER_VALUE:
+            # Missing comma between two array items
+            self._comma(frame)
+
+        self._start_value(ch)
+
+    def _consume_string(self, ch):
+        if self._escape:
+            self._escape = False
+            self.out.append(ch)
+        elif ch == "\\":
+            self._escape = True
+            self.out.append(ch)
+            return
+        elif ch == '"':
+            self.out.append(ch)
+            self._in_string = False
+            self._end_string()
+            return
+        elif ch == "\n":
+            self.out.append("\\n")
+        elif ch == "\r":
+            self.out.append("\\r")
+        elif ch == "\t":
+            self.out.append("\\t")
+        elif ord(ch) < 0x20:
+            return
+        else:
+            self.out.append(ch)
+        if self._is_key:
+            self._key_chars.append(ch)
+
+    def _start_string(self, is_key):
+        self._in_string = True
+        self._is_key = is_key
+        self._key_chars = []
+        self.out.append('"')
+
+    def _end_string(self):
+        frame = self.stack[-1]
+        if self._is_key:
+            frame["key"] = "".join(self._key_chars)
+            frame["state"] = COLON
+        else:
+            self._value_done()
+
+    def _start_value(self, ch):
+        if ch in "{[":
+            self._open(ch)
+        elif ch == '"':
+            self._start_string(is_key=False)
+        elif ch in LITERAL_CHARS or ch.isalpha():
+            self._literal = [ch]
+
+    def _end_literal(self):
+        text = "".join(self._literal)
+        self._literal = []
+        token = literal_token(text)
+        if token is not None:
+            self.out.append(token)
+        else:
+            # Unquoted word: keep it as a string
+            self.out.append(json.dumps(text, ensure_ascii=False))
+        self._value_done()
+
+    def _comma(self, frame):
+        frame["member_start"] = len(self.out)
+        self.out.append(",")
+        frame["state"] = KEY if frame["type"] == "{" else VALUE
+
+    def _open(self, ch):
+        self.out.append(ch)
+        self.stack.append({
+            "type": ch,
+            "state": KEY if ch == "{" else VALUE,
+            "member_start": len(self.out),
+            "key": None
+        })
+
+    def _value_done(self):
+        frame = self.stack[-1]
+        frame["state"] = AFTER_VALUE
+        if len(self.stack) == 1:
+            self.completed_keys.append(frame["key"])
+
+    def _close_matching(self, opener):
+        if not any(frame["type"] == opener for frame in self.stack):
+            # Closing bracket without a matching opening one
+            return
+        while self.stack[-1]["type"] != opener:
+            self._close_frame()
+        self._close_frame()
+
+    def _close_frame(self):
+        frame = self.stack[-1]
+        if frame["state"] != AFTER_VALUE:
+            # Drop a trailing comma or a key without value
+            del self.out[frame["member_start"]:]
+        self.out.append("}" if frame["type"] == "{" else "]")
+        self.stack.pop()
+        if self.stack:
+            self._value_done()
+        else:
+            self.done = True
+
+    # --- Result ---
+
+    def text(self):
+        """
+        Return the repaired JSON text received so far, with the incomplete
+        trailing member dropped and the open containers closed.
+
+        A number or keyword literal cut by the end of the text is kept, as it
+        is a valid value (the last digits of a number may be missing).
+        """
+        if not self.started:
+            return None
+        out = list(self.out)
+        if self.stack:
+            innermost = self.stack[-1]
+            complete = innermost["state"] == AFTER_VALUE
+            if self._literal:
+                token = literal_token("".join(self._literal))
+                if token is not None:
+                    out.append(token)
+                complete = token is not None
+            if self._in_string or not complete:
+                del out[innermost["member_start"]:]
+            for frame in reversed(self.stack):
+                out.append("}" if frame["type"] == "{" else "]")
+        return "".join(out)
+
+    def result(self):
+        """
+        Parse the repaired JSON received so far.
+
+        Returns:
+            dict: The parsed object, or None if no object could be recovered
+        """
+        text = self.text()
+        if text is None:
+            return None
+        try:
+            return json.loads(text, object_pairs_hook=rename_duplicate_keys)
+        except json.JSONDecodeError:
+            return None
+
+
+def parse_tolerant(text):
+    """
+    Parse a possibly malformed JSON object produced by an LLM.
+
+    Returns:
+        dict: The parsed object, or None if no object could be recovered
+    """
+    return IncrementalJSONParser().feed(text).result()
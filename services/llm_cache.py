@@ -0,0 +1,69 @@
+import os
+import json
+import hashlib
+import unicodedata
+from utils.disk_cache import get_disk_cache
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+
+def normalize_text(text):
+    """Normalize a text so that formatting-only differences give the same cache key."""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def normalize_json(data):
+    """Serialize a JSON-like structure canonically, without MongoDB ids."""
+    if isinstance(data, dict):
+        data = {key: value for key, value in data.items() if key != "_id"}
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM results.
+
+    Entries are keyed by model, prompt template version and the hash of the
+    normalized input, so changing the model or the prompt invalidates them.
+    """
+
+    def __init__(self, name, ttl=None, max_bytes=None):
+        """
+        Initialize the cache.
+
+        Args:
+            name: Name of the cache (one per service)
+            ttl: Lifetime of the entries in seconds, defaults to LLM_CACHE_TTL (7 days);
+                0 disables the cache
+            max_bytes: Maximum size of the cache, defaults to LLM_CACHE_MAX_BYTES (128 MB)
+        """
+        self.ttl = int(os.environ.get("LLM_CACHE_TTL", DEFAULT_TTL)) if ttl is None else ttl
+        self.enabled = self.ttl > 0
+        self.cache = get_disk_cache(
+            os.path.join("llm", name),
+            max_bytes=max_bytes or int(os.environ.get("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            ttl=self.ttl or None
+        )
+
+    @staticmethod
+    def key(model, template_version, normalized_input):
+        """Return the cache key of an LLM call."""
+        digest = hashlib.sha256(normalized_input.encode("utf-8")).hexdigest()
+        return f"{model}:v{template_version}:{digest}"
+
+    def get(self, key):
+        """Return the cached result of a call, or None."""
+        if not self.enabled:
+            return None
+        return self.cache.get(key)
+
+    def set(self, key, result):
+        """Cache the result of a call (failed calls, returning None, are not cached)."""
+        if self.enabled and result is not None:
+            self.cache.set(key, result)
+
+    def metrics(self):
+        """Return the hit rate and usage statistics of the cache."""
+        return self.cache.metrics()
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import httpx
+from groq import AsyncGroq, APIStatusError, APIConnectionError, APITimeoutError
+from services.token_budget import count_tokens
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    """Token count of a text, used to reserve the tokens-per-minute quota."""
+    return count_tokens(text)
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket: holds up to `capacity` tokens, refilled
+    continuously at `capacity` tokens per `period` seconds.
+    """
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """Wait until `amount` tokens are available and take them."""
+        # A request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount):
+        """Give back tokens reserved but not used."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMGateway:
+    """
+    Shared asynchronous access to the Groq API.
+
+    The gateway owns an AsyncGroq client and its HTTP connection pool, running
+    on an event loop in a background thread. Calls are limited in concurrency,
+    scheduled under the requests-per-minute and tokens-per-minute quotas,
+    retried with jittered exponential backoff on 429 and 5xx responses, and
+    identical in-flight requests are sent only once.
+    """
+
+    def __init__(self, api_key, max_concurrency=4, requests_per_minute=30, tokens_per_minute=6000,
+                 max_retries=5, timeout=120.0):
+        """
+        Start the event loop thread and create the client.
+
+        Args:
+            api_key: Groq API key
+            max_concurrency: Maximum number of requests in flight
+            requests_per_minute: Requests-per-minute quota
+            tokens_per_minute: Tokens-per-minute quota (prompt and completion)
+            max_retries: Number of retries of a rate-limited or failed request
+            timeout: Timeout of a request in seconds
+        """
+        self.max_retries = max_retries
+        self.stats = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0, "tokens": 0, "early_stops": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+
+        async def setup():
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+            self._request_bucket = TokenBucket(requests_per_minute)
+            self._token_bucket = TokenBucket(tokens_per_minute)
+            self._in_flight = {}
+            http_client = httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+            )
+            # Retries are handled by the gateway, which knows about the quotas
+            self._client = AsyncGroq(api_key=api_key, http_client=http_client, max_retries=0)
+
+        asyncio.run_coroutine_threadsafe(setup(), self._loop).result()
+
+    @staticmethod
+    def request_key(model, messages, temperature, max_tokens):
+        """Return the key identifying identical requests."""
+        data = json.dumps([model, messages, temperature, max_tokens], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    async def _complete(self, model, messages, temperature, max_tokens):
+        """Send a request, or wait for the identical request already in flight."""
+        key = self.request_key(model, messages, temperature, max_tokens)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._send(model, messages, temperature, max_tokens))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _send(self, model, messages, temperature, max_tokens):
+        """Send a request and return the response."""
+        async def call():
+            response = await self._client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            return response, getattr(getattr(response, "usage", None), "total_tokens", None)
+
+        return await self._request(messages, max_tokens, call)
+
+    async def _stream(self, model, messages, temperature, max_tokens, on_text):
+        """Send a streaming request, passing each piece of text to on_text until it returns True."""
+        async def call():
+            received = []
+            stream = await self._client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            try:
+                async for chunk in stream:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if not text:
+                        continue
+                    received.append(text)
+                    if on_text(text):
+                        # Closing the response stops the generation
+                        self.stats["early_stops"] += 1
+                        break
+            except (APIStatusError, APIConnectionError, APITimeoutError) as e:
+                if received:
+                    # Part of the text was already consumed: the request cannot be retried
+                    raise RuntimeError(f"Groq stream interrupted: {e}") from e
+                raise
+            finally:
+                await stream.response.aclose()
+            text = "".join(received)
+            prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+            return text, prompt_tokens + estimate_tokens(text)
+
+        return await self._request(messages, max_tokens, call)
+
+    async def _request(self, messages, max_tokens, call):
+        """
+        Run an API call within the quotas, retrying on 429 and 5xx responses.
+        The call returns its result and the number of tokens it used (or None).
+        """
+        reserved = sum(estimate_tokens(message["content"]) for message in messages) + max_tokens
+        for attempt in range(self.max_retries + 1):
+            await self._request_bucket.acquire()
+            await self._token_bucket.acquire(reserved)
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    result, used = await call()
+            except (APIStatusError, APIConnectionError, APITimeoutError) as e:
+                self._token_bucket.refund(reserved)
+                status = getattr(e, "status_code", None)
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._retry_delay(e, attempt)
+                self.stats["retries"] += 1
+                logger.warning(f"Groq request failed ({status or type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            # Give back the part of the reservation the request did not use
+            if used is not None:
+                self.stats["tokens"] += used
+                self._token_bucket.refund(max(reserved - used, 0))
+            return result
+
+    @staticmethod
+    def _retry_delay(error, attempt):
+        """Delay before a retry: the server's retry-after if given, else jittered exponential backoff."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            if retry_after is not None:
+                return float(retry_after) + random.uniform(0, 1)
+        except ValueError:
+            pass
+        return random.uniform(0, min(60.0, 2.0 ** attempt))
+
+    def complete(self, model, messages, temperature=0.0, max_tokens=1024, timeout=None):
+        """
+        Send a chat completion request and wait for the response.
+
+        Can be called from any thread; the request runs on the gateway's event loop.
+
+        Args:
+            model: Name of the model
+            messages: Chat messages
+            temperature: Sampling temperature
+            max_tokens: Maximum number of completion tokens
+            timeout: Maximum time to wait in seconds (optional)
+
+        Returns:
+            ChatCompletion: Response of the API
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._complete(model, messages, temperature, max_tokens), self._loop
+        )
+        return future.result(timeout)
+
+    def stream(self, model, messages, temperature=0.0, max_tokens=1024, on_text=None, timeout=None):
+        """
+        Send a streaming chat completion request and wait for its text.
+
+        Args:
+            model: Name of the model
+            messages: Chat messages
+            temperature: Sampling temperature
+            max_tokens: Maximum number of completion tokens
+            on_text: Function called with each piece of text as it arrives; returning
+                True stops the completion early (called on the gateway's thread)
+            timeout: Maximum time to wait in seconds (optional)
+
+        Returns:
+            str: Text of the completion, up to the point where it was stopped
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(model, messages, temperature, max_tokens, on_text or (lambda text: False)), self._loop
+        )
+        return future.result(timeout)
+
+    async def acomplete(self, model, messages, temperature=0.0, max_tokens=1024):
+        """Asynchronous version of complete, usable from any event loop."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._complete(model, messages, temperature, max_tokens), self._loop
+        )
+        return await asyncio.wrap_future(future)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_llm_gateway(api_key):
+    """
+    Return the process-wide gateway of an API key.
+
+    Limits are read from the GROQ_MAX_CONCURRENCY, GROQ_REQUESTS_PER_MINUTE,
+    GROQ_TOKENS_PER_MINUTE and GROQ_MAX_RETRIES environment variables.
+
+    Args:
+        api_key: Groq API key
+
+    Returns:
+        LLMGateway: Shared gateway
+    """
+    with _gateways_lock:
+        if api_key not in _gateways:
+            _gateways[api_key] = LLMGateway(
+                api_key,
+                max_concurrency=int(os.environ.get("GROQ_MAX_CONCURRENCY", 4)),
+                requests_per_minute=int(os.environ.get("GROQ_REQUESTS_PER_MINUTE", 30)),
+                tokens_per_minute=int(os.environ.get("GROQ_TOKENS_PER_MINUTE", 6000)),
+                max_retries=int(os.environ.get("GROQ_MAX_RETRIES", 5))
+            )
+        return _gateways[api_key]
@@ -1,48 +1,74 @@
 import json
 import os
 import re
-from groq import Groq
-from pymongo import MongoClient
+import time
+from services.llm_gateway import get_llm_gateway
+from services.profile_retriever import get_profile_retriever, profile_name
+from services.llm_cache import LLMResponseCache, normalize_json
+from services.token_budget import TokenBudget, compact_json, count_tokens, log_llm_call
+from utils.metrics import timed
+from utils.mongodb import ProfileRepository, cv_content
 
 
 class LLMRecommender:
     """
     Compare a structured CV to a database of IT profiles and return the most similar profiles
     using LLaMA3 via the Groq API.
+
+    The catalogue is first narrowed down by vector similarity, so only a
+    shortlist of profiles is sent to the LLM. In 'vector' mode the shortlist
+    is returned directly, without any LLM call.
     """
 
-    def __init__(self, api_key=None, mongodb_uri=None):
-        """Initialize the Groq client with the API key and MongoDB connection."""
+    # Bump when the prompts change so cached responses are not reused
+    PROMPT_VERSION = 2
+
+    SYSTEM_PROMPT = "You are an assistant specialized in CV analysis and IT profile recommendation. You must compare a CV to a list of profiles and identify the 3 most similar profiles. Your response must be ONLY a valid and well-formatted JSON."
+
+    # CV sections never sent to the LLM, and sections dropped in this order when the CV is too long
+    CV_EXCLUDED_SECTIONS = ("informations_personnelles",)
+    CV_DROP_ORDER = ("activites_extra_scolaires", "langues", "certifications", "education")
+
+    # Three recommendations with their explanations
+    EXPECTED_COMPLETION_TOKENS = 700
+
+    def __init__(self, api_key=None, mongodb_uri=None, mode=None, shortlist_size=None, vectorizer_type=None):
+        """
+        Initialize the Groq client with the API key and MongoDB connection.
+
+        Args:
+            api_key: Groq API key (defaults to GROQ_API_KEY)
+            mongodb_uri: MongoDB connection URI (defaults to MONGODB_URI)
+            mode: 'llm' or 'vector', defaults to PROFILE_RECOMMENDATION_MODE ('llm' if unset)
+            shortlist_size: Number of profiles sent to the LLM, defaults to PROFILE_SHORTLIST_SIZE (30)
+            vectorizer_type: Vectorization of the profiles, defaults to PROFILE_VECTORIZER_TYPE ('tfidf')
+        """
         self.api_key = api_key or os.environ.get("GROQ_API_KEY")
         self.mongodb_uri = mongodb_uri or os.environ.get("MONGODB_URI")
+        self.mode = mode or os.environ.get("PROFILE_RECOMMENDATION_MODE", "llm")
+        self.shortlist_size = shortlist_size or int(os.environ.get("PROFILE_SHORTLIST_SIZE", 30))
+        self.vectorizer_type = vectorizer_type
 
         if not self.api_key:
             print("WARNING: No Groq API key provided. LLM recommendation will not be available.")
             self.client = None
         else:
-            self.client = Groq(api_key=self.api_key)
+            # Shared gateway: rate limits, retries and connection pool
+            self.client = get_llm_gateway(self.api_key)
 
         self.model = "llama3-70b-8192"  # LLaMA3 model via Groq
+        self.cache = LLMResponseCache("recommender")
+        self.budget = TokenBudget()
 
-    def load_profiles_from_mongodb(self, collection_name="profiles", limit=50):
-        """Load IT profiles from MongoDB."""
+    def load_profiles_from_mongodb(self, collection_name="profiles", limit=None):
+        """Load IT profiles from MongoDB (the whole catalogue unless a limit is given)."""
         if not self.mongodb_uri:
             print("WARNING: No MongoDB URI provided. Unable to load profiles.")
             return []
 
         try:
-            client = MongoClient(self.mongodb_uri)
-            db = client.get_default_database()
-            collection = db[collection_name]
-
-            profiles = list(collection.find().limit(limit))
-
-            for profile in profiles:
-                if '_id' in profile:
-                    profile['_id'] = str(profile['_id'])
-
-            client.close()
-            return profiles
+            repository = ProfileRepository(self.mongodb_uri, collection_name=collection_name)
+            return repository.list(limit=limit)
 
         except Exception as e:
             print(f"Error loading profiles from MongoDB: {e}")
@@ -89,10 +115,10 @@ class LLMRecommender:
         """Create a suitable prompt to compare the CV with profiles."""
         return f"""
         Here is a structured CV of a candidate:
-        {json.dumps(cv_json, ensure_ascii=False, indent=2)}
+        {compact_json(cv_json)}
 
         And here is a list of available profiles:
-        {json.dumps(profiles, ensure_ascii=False, indent=2)}
+        {compact_json(profiles)}
 
         What are the 3 most similar profiles to this CV?
         Analyze technical skills, experience, projects, and education.
@@ -112,14 +138,55 @@ class LLMRecommender:
         IMPORTANT: Make sure your response is a valid and well-formatted JSON, without any additional text.
         """
 
+    def shortlist_profiles(self, cv_json, profiles, k=None):
+        """
+        Select the profiles of the catalogue most similar to a CV by vector similarity.
+
+        Args:
+            cv_json: Structured CV
+            profiles: Profile catalogue
+            k: Number of profiles to keep (defaults to shortlist_size)
+
+        Returns:
+            list: (profile, score) tuples, best first
+        """
+        retriever = get_profile_retriever(profiles, self.vectorizer_type)
+        return retriever.shortlist(cv_json, k or self.shortlist_size)
+
+    def recommend_profiles_by_vector(self, cv_json, profiles, top_n=3):
+        """
+        Recommend the profiles most similar to a CV without calling the LLM.
+
+        Returns:
+            dict: Recommendations in the same format as the LLM response
+        """
+        retriever = get_profile_retriever(profiles, self.vectorizer_type)
+        recommendations = []
+        for profile, score in retriever.shortlist(cv_json, top_n):
+            terms = retriever.matching_terms(cv_json, profile)
+            reasons = f"Vector similarity with the CV ({retriever.vectorizer_type})"
+            if terms:
+                reasons += f", shared terms: {', '.join(terms)}"
+            recommendations.append({
+                "nom": profile_name(profile),
+                "score_similarité": round(max(score, 0.0), 4),
+                "raisons": reasons
+            })
+        return {"profils_recommandés": recommendations}
+
+    @timed("profile_recommendation")
     def recommend_profiles(self, cv_json, profiles=None, profiles_file=None, collection_name="profiles"):
         """
         Compare a structured CV to a list of IT profiles and return the 3 most similar profiles.
         """
-        if not self.client:
+        if self.mode != "vector" and not self.client:
             print("Unable to make recommendations: no Groq API key available.")
             return None
 
+        # The fields stamped when the CV is saved change on every upload: they would
+        # defeat the response cache and waste prompt tokens
+        cv_json = cv_content(cv_json)
+
         if not profiles:
             if profiles_file:
                 profiles = self.load_profiles_from_file(profiles_file)
@@ -130,23 +197,80 @@ class LLMRecommender:
             print("No profiles available for comparison.")
             return None
 
-        prompt = self.create_prompt(cv_json, profiles)
+        if self.mode == "vector":
+            return self.recommend_profiles_by_vector(cv_json, profiles)
+
+        # Only the closest profiles of the catalogue are sent to the LLM
+        if len(profiles) > self.shortlist_size:
+            profiles = [profile for profile, _ in self.shortlist_profiles(cv_json, profiles)]
+            print(f"Profiles shortlisted for the LLM: {len(profiles)}")
+
+        # Identical CVs compared to the same profiles reuse the cached response
+        cache_key = LLMResponseCache.key(
+            self.model, self.PROMPT_VERSION, normalize_json({"cv": normalize_json(cv_json), "profiles": profiles})
+        )
+        recommendations = self.cache.get(cache_key)
+        if recommendations is not None:
+            print("Recommendations found in the LLM response cache")
+            return recommendations
+
+        recommendations = self._call_llm(cv_json, profiles)
+        self.cache.set(cache_key, recommendations)
+        return recommendations
+
+    def fit_prompt(self, cv_json, profiles):
+        """
+        Build the messages of a recommendation call within the token budget.
+
+        Personal details are never sent. Low-value CV sections are dropped while
+        the CV exceeds the input budget, then the profiles are narrowed down to
+        the closest ones until the completion fits in the context window.
+
+        Returns:
+            tuple: (messages, max_tokens), max_tokens being None if the prompt cannot fit
+        """
+        cv_prompt = {key: value for key, value in cv_json.items() if key not in self.CV_EXCLUDED_SECTIONS}
+        cv_prompt, dropped = self.budget.fit_json(cv_prompt, self.CV_DROP_ORDER)
+        if dropped:
+            print(f"CV sections left out of the prompt: {', '.join(dropped)}")
+
+        while True:
+            messages = [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": self.create_prompt(cv_prompt, profiles)}
+            ]
+            max_tokens = self.budget.max_tokens(
+                messages, self.EXPECTED_COMPLETION_TOKENS, minimum=self.EXPECTED_COMPLETION_TOKENS
+            )
+            if max_tokens is not None or len(profiles) <= 3:
+                return messages, max_tokens
+            profiles = [profile for profile, _ in self.shortlist_profiles(cv_json, profiles, k=max(3, len(profiles) // 2))]
+            print(f"Prompt over budget, profiles narrowed down to {len(profiles)}")
+
+    def _call_llm(self, cv_json, profiles):
+        """Ask the LLM for the 3 profiles most similar to the CV."""
+        messages, max_tokens = self.fit_prompt(cv_json, profiles)
+        if max_tokens is None:
+            print("Unable to make recommendations: the prompt exceeds the model's context window.")
+            return None
 
         try:
-            response = self.client.chat.completions.create(
+            start = time.perf_counter()
+            response = self.client.complete(
                 model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an assistant specialized in CV analysis and IT profile recommendation. You must compare a CV to a list of profiles and identify the 3 most similar profiles. Your response must be ONLY a valid and well-formatted JSON."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0.3,
-                max_tokens=4000
+                max_tokens=max_tokens
             )
 
             json_response = response.choices[0].message.content
+            usage = getattr(response, "usage", None)
+            log_llm_call(
+                "recommendation", self.model,
+                getattr(usage, "prompt_tokens", None) or sum(count_tokens(m["content"]) for m in messages),
+                getattr(usage, "completion_tokens", None) or count_tokens(json_response),
+                time.perf_counter() - start, max_tokens
+            )
             print("Raw API response:")
             print(json_response)
 
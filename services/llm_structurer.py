@@ -1,33 +1,112 @@
 import json  
 import os  
 import re  
+import time  
 import logging  
 import traceback  
-from groq import Groq  
+from services.llm_gateway import get_llm_gateway  
 from bson import ObjectId  # Import ObjectId for proper handling  
+from utils.mongodb import CVRepository  
+from services.llm_cache import LLMResponseCache, normalize_text  
+from services.json_stream import IncrementalJSONParser  
+from services.cv_preextractor import pre_extract, merge_structured, offline_structure  
+from services.token_budget import TokenBudget, count_tokens, split_text, log_llm_call  
+from utils.metrics import timed  
   
 # Initialize logger  
 logger = logging.getLogger(__name__)  
   
+  
+def merge_chunk_results(results):  
+    """  
+    Merge the structured data of the chunks of a long CV.  
+    Lists are concatenated without duplicates, objects are merged key by key  
+    and the first non-empty value of a field is kept.  
+    """  
+    merged = {}  
+    for result in results:  
+        merged = _merge_values(merged, result)  
+    return merged  
+  
+  
+def _merge_values(a, b):  
+    if a in (None, "", [], {}):  
+        return b  
+    if b in (None, "", [], {}):  
+        return a  
+    if isinstance(a, dict) and isinstance(b, dict):  
+        merged = dict(a)  
+        for key, value in b.items():  
+            merged[key] = _merge_values(merged.get(key), value)  
+        return merged  
+    if isinstance(a, list) and isinstance(b, list):  
+        merged = list(a)  
+        seen = {json.dumps(item, ensure_ascii=False, sort_keys=True) for item in a}  
+        for item in b:  
+            if json.dumps(item, ensure_ascii=False, sort_keys=True) not in seen:  
+                merged.append(item)  
+        return merged  
+    return a  
+  
+  
 class LLMStructurer:  
     """  
     Transforms raw text extracted from a CV into structured JSON format  
     using LLaMA3 via the Groq API.  
     """  
   
-    def __init__(self, api_key=None):  
+    # Bump when the prompts change so cached responses are not reused  
+    PROMPT_VERSION = 1  
+      
+    # Sections after which a streamed completion can be stopped  
+    REQUIRED_SECTIONS = ("informations_personnelles", "competences", "education", "projets")  
+    RESIDUAL_SECTIONS = ("competences_autres", "education", "experiences_professionnelles", "projets")  
+      
+    SYSTEM_PROMPT = "You are an assistant specialized in CV analysis. Extract relevant information and return it ONLY as valid JSON without any additional text. Make sure the JSON is properly formatted with no duplicate keys. Use numbered keys (description1, description2) for multiple descriptions."  
+    RESIDUAL_SYSTEM_PROMPT = "You extract CV sections into JSON. Return ONLY a valid JSON object following the given schema."  
+      
+    # Compact target schema of the residual prompt  
+    RESIDUAL_SCHEMA = '{"competences_autres":[str],"education":[{"diplome":str,"etablissement":str,"filiere":str,"dates":str}],"experiences_professionnelles":[{"poste":str,"entreprise":str,"dates":str,"description":str}],"projets":[{"nom":str,"techs":[str],"detail":str}],"langues":{str:str},"activites_extra_scolaires":[{"description":str}]}'  
+      
+    def __init__(self, api_key=None, streaming=None, stop_early=None, pre_extraction=None, offline_fallback=None):  
         """  
         Initialize the Groq client with the API key.  
+        Requests go through the process-wide LLM gateway, which enforces  
+        the Groq rate limits and retries rate-limited calls.  
+          
+        Args:  
+            api_key: Groq API key (defaults to GROQ_API_KEY)  
+            streaming: Parse the completion while it streams, defaults to LLM_STREAMING (on)  
+            stop_early: Stop the streamed completion once the required sections are complete,  
+                defaults to LLM_STREAM_EARLY_STOP (on)  
+            pre_extraction: Extract contact details, skills and languages with local rules and  
+                send only the rest of the text to the LLM, defaults to LLM_PRE_EXTRACTION (on)  
+            offline_fallback: Structure the CV with the local rules only when the LLM is  
+                unavailable, defaults to LLM_OFFLINE_FALLBACK (on)  
         """  
         self.api_key = api_key or os.environ.get("GROQ_API_KEY")  
+        if streaming is None:  
+            streaming = os.environ.get("LLM_STREAMING", "true").lower() in ("1", "true", "yes")  
+        if stop_early is None:  
+            stop_early = os.environ.get("LLM_STREAM_EARLY_STOP", "true").lower() in ("1", "true", "yes")  
+        if pre_extraction is None:  
+            pre_extraction = os.environ.get("LLM_PRE_EXTRACTION", "true").lower() in ("1", "true", "yes")  
+        if offline_fallback is None:  
+            offline_fallback = os.environ.get("LLM_OFFLINE_FALLBACK", "true").lower() in ("1", "true", "yes")  
+        self.streaming = streaming  
+        self.stop_early = streaming and stop_early  
+        self.pre_extraction = pre_extraction  
+        self.offline_fallback = offline_fallback  
   
         if not self.api_key:  
             logger.warning("No Groq API key provided. LLM structuring will not be available.")  
             self.client = None  
         else:  
-            self.client = Groq(api_key=self.api_key)  
+            self.client = get_llm_gateway(self.api_key)  
   
         self.model = "llama3-70b-8192"  # LLaMA3 model via Groq  
+        self.cache = LLMResponseCache("structurer")  
+        self.budget = TokenBudget()  
   
     def create_prompt(self, raw_text):  
         """  
@@ -55,32 +134,160 @@ class LLMStructurer:
         CV to analyze:  
         {raw_text}  
         """  
+      
+    def create_residual_prompt(self, residual_text):  
+        """  
+        Create the prompt for the part of the CV not covered by the local pre-extraction.  
+        """  
+        return (  
+            "Personal details, known skills and languages were already extracted from this CV. "  
+            "Structure the remaining text with this schema (French keys, [] for missing sections, "  
+            "skills not listed elsewhere in competences_autres):\n"  
+            f"{self.RESIDUAL_SCHEMA}\n\nCV text:\n{residual_text}"  
+        )  
   
     def structure_cv(self, raw_text):  
         """  
         Send the raw CV text to the LLM and retrieve the structured JSON response.  
+        Responses are cached by model, prompt version and normalized CV text.  
+        """  
+        return self.structure_cv_with_source(raw_text)[0]  
+      
+    @timed("llm_structuring")  
+    def structure_cv_with_source(self, raw_text):  
+        """  
+        Structure a CV and tell where the result comes from.  
+          
+        Returns:  
+            tuple: (structured data or None, source) with source 'cache', 'llm' or  
+                'offline' (rule-based fallback, not cached)  
+        """  
+        # Early-stopped and pre-extracted responses differ: they are cached separately  
+        template_version = str(self.PROMPT_VERSION)  
+        if self.pre_extraction:  
+            template_version += "-pre"  
+        if self.stop_early:  
+            template_version += "-early"  
+        cache_key = LLMResponseCache.key(self.model, template_version, normalize_text(raw_text))  
+        structured_data = self.cache.get(cache_key)  
+        if structured_data is not None:  
+            logger.debug("Structured CV found in the LLM response cache")  
+            return structured_data, "cache"  
+          
+        pre = None  
+        if self.pre_extraction:  
+            pre = pre_extract(raw_text)  
+            logger.debug(f"Pre-extraction done, {len(pre['residual_text'])} of {len(raw_text)} characters sent to the LLM")  
+            llm_data = self._structure_text(  
+                pre["residual_text"], self.create_residual_prompt, self.RESIDUAL_SYSTEM_PROMPT, self.RESIDUAL_SECTIONS  
+            )  
+            structured_data = merge_structured(pre, llm_data) if isinstance(llm_data, dict) else None  
+        else:  
+            structured_data = self._structure_text(raw_text, self.create_prompt)  
+          
+        if structured_data is None and self.offline_fallback:  
+            logger.warning("LLM structuring unavailable, using the rule-based extraction")  
+            return offline_structure(raw_text, pre), "offline"  
+          
+        self.cache.set(cache_key, structured_data)  
+        return structured_data, "llm"  
+      
+    def _structure_text(self, text, create_prompt, system_prompt=None, required_sections=None):  
+        """  
+        Structure a text in a single call, or map-reduce it over chunks when it  
+        exceeds the input token budget.  
+        """  
+        if self.budget.fits(text):  
+            return self._call_llm(create_prompt(text), system_prompt, required_sections)  
+          
+        chunks = split_text(text, self.budget.max_input_tokens)  
+        logger.info(f"CV text of {count_tokens(text)} tokens structured in {len(chunks)} chunks")  
+        results = []  
+        for chunk in chunks:  
+            # Chunks do not all contain every section: only a complete object ends a stream  
+            result = self._call_llm(create_prompt(chunk), system_prompt, required_sections=())  
+            if isinstance(result, dict):  
+                results.append(result)  
+        if not results:  
+            return None  
+        return merge_chunk_results(results)  
+      
+    def _stream_structure(self, messages, required_sections, max_tokens):  
+        """  
+        Stream the completion into an incremental JSON parser.  
+          
+        Returns:  
+            tuple: (structured data or None, text of the completion)  
+        """  
+        parser = IncrementalJSONParser()  
+          
+        def on_text(text):  
+            parser.feed(text)  
+            return parser.done or (self.stop_early and bool(required_sections) and parser.has_sections(required_sections))  
+          
+        json_response = self.client.stream(  
+            model=self.model,  
+            messages=messages,  
+            temperature=0.05,  
+            max_tokens=max_tokens,  
+            on_text=on_text  
+        )  
+        logger.debug(f"Streamed response length: {len(json_response)}, sections: {parser.completed_keys}")  
+        return parser.result() or None, json_response  
+      
+    def _call_llm(self, prompt, system_prompt=None, required_sections=None):  
+        """  
+        Send a structuring prompt with a Groq API call and parse the JSON response.  
         """  
         if not self.client:  
             logger.error("Unable to structure CV: no Groq API key available.")  
             return None  
               
-        prompt = self.create_prompt(raw_text)  
+        messages = [  
+            {"role": "system", "content": system_prompt or self.SYSTEM_PROMPT},  
+            {"role": "user", "content": prompt}  
+        ]  
+        if required_sections is None:  
+            required_sections = self.REQUIRED_SECTIONS  
+          
+        # The structured JSON is about twice as long as the text it comes from  
+        prompt_tokens = count_tokens(messages[0]["content"]) + count_tokens(prompt)  
+        max_tokens = self.budget.max_tokens(messages, expected=2 * count_tokens(prompt) + 256)  
+        if max_tokens is None:  
+            logger.error(f"Prompt of {prompt_tokens} tokens leaves no room for the completion")  
+            return None  
           
         try:  
             # Call to the Groq API with LLaMA3  
             logger.debug("Sending request to Groq API")  
-            response = self.client.chat.completions.create(  
-                model=self.model,  
-                messages=[  
-                    {"role": "system", "content": "You are an assistant specialized in CV analysis. Extract relevant information and return it ONLY as valid JSON without any additional text. Make sure the JSON is properly formatted with no duplicate keys. Use numbered keys (description1, description2) for multiple descriptions."},  
-                    {"role": "user", "content": prompt}  
-                ],  
-                temperature=0.05,  # Very low value for more deterministic responses  
-                max_tokens=4000  
-            )  
+            start = time.perf_counter()  
+            if self.streaming:  
+                # The tolerant parser repairs the JSON as it arrives  
+                structured_data, json_response = self._stream_structure(messages, required_sections, max_tokens)  
+                log_llm_call(  
+                    "structuring", self.model, prompt_tokens, count_tokens(json_response),  
+                    time.perf_counter() - start, max_tokens  
+                )  
+                if structured_data is not None:  
+                    return structured_data  
+                logger.debug("Streamed JSON could not be recovered, falling back to the repair cascade")  
+            else:  
+                response = self.client.complete(  
+                    model=self.model,  
+                    messages=messages,  
+                    temperature=0.05,  # Very low value for more deterministic responses  
+                    max_tokens=max_tokens  
+                )  
               
-            # Extract JSON from the response  
-            json_response = response.choices[0].message.content  
+                # Extract JSON from the response  
+                json_response = response.choices[0].message.content  
+                usage = getattr(response, "usage", None)  
+                log_llm_call(  
+                    "structuring", self.model,  
+                    getattr(usage, "prompt_tokens", None) or prompt_tokens,  
+                    getattr(usage, "completion_tokens", None) or count_tokens(json_response),  
+                    time.perf_counter() - start, max_tokens  
+                )  
               
             # Display raw response for debugging  
             logger.debug("Raw API response received")  
@@ -198,40 +405,41 @@ class LLMStructurer:
             logger.debug(traceback.format_exc())  
             return None  
   
-    def save_to_mongodb(self, structured_data, mongodb_client, collection_name="cvs"):  
+    @timed("mongo_insert")  
+    def save_to_mongodb(self, structured_data, mongodb_client=None, collection_name="cvs", vector_recommender=None, cv_vector=None):  
         """  
-        Save the structured CV data to MongoDB.  
+        Save the structured CV data to MongoDB, replacing the stored CV of the same candidate.  
           
         Args:  
             structured_data: The structured CV data as a dictionary  
-            mongodb_client: MongoDB client instance  
+            mongodb_client: MongoDB client instance (defaults to the shared pooled client)  
             collection_name: Name of the collection to save to  
+            vector_recommender: VectorRecommender used to precompute the CV vector (optional)  
+            cv_vector: Vector of the CV already computed by the vector recommender (optional)  
               
         Returns:  
-            str: The ID of the inserted document as a string (not ObjectId)  
+            str: The ID of the inserted or replaced document as a string (not ObjectId)  
         """  
         try:  
-            # Get the database - use explicit database name instead of get_database()  
-            db = mongodb_client["cv_database"]  
-            logger.debug(f"Using database: {db.name}")  
+            # Get the CV repository (MongoDB creates the collection on first insert)  
+            repository = CVRepository(client=mongodb_client, collection_name=collection_name)  
+            logger.debug(f"Using collection: {repository.collection.full_name}")  
               
             # Log the structured data before insertion  
             logger.debug(f"Structured data to save: {json.dumps(structured_data, ensure_ascii=False)[:200]}...")  
               
-            # Make sure the collection exists  
-            if collection_name not in db.list_collection_names():  
-                logger.info(f"Creating collection: {collection_name}")  
-                db.create_collection(collection_name)  
-              
-            # Get the collection  
-            collection = db[collection_name]  
-            logger.debug(f"Using collection: {collection_name}")  
-              
-            # Insert the document  
-            result = collection.insert_one(structured_data)  
-            inserted_id = result.inserted_id  
+            # Upsert the document: re-uploads update the existing CV instead of duplicating it  
+            inserted_id = repository.upsert(structured_data)  
             logger.info(f"Data saved to MongoDB with ID: {inserted_id}")  
               
+            # Precompute the CV vector so matching does not re-vectorize it  
+            if vector_recommender is not None:  
+                try:  
+                    vector_recommender.index_cv(inserted_id, structured_data, vector=cv_vector)  
+                except Exception as e:  
+                    # The CV is saved: it will be vectorized on the next store sync  
+                    logger.error(f"Error vectorizing CV {inserted_id}: {e}")  
+              
             # Return the ID as a string to avoid JSON serialization issues  
             return str(inserted_id)  
         except Exception as e:  
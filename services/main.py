@@ -3,6 +3,7 @@ from llm_structurer import LLMStructurer
 from llm_recommender import LLMRecommender  
 from vector_recommender import VectorRecommender  
 from job_offer import JobOffer  
+from utils.mongodb import get_client  
 import json  
 import os
 
@@ -43,11 +44,11 @@ def process_cv_and_recommend(
         # Save to MongoDB if URI provided  
         if mongodb_uri:  
             try:  
-                client = MongoClient(mongodb_uri)  
-                inserted_id = structurer.save_to_mongodb(cv_json, client)  
+                client = get_client(mongodb_uri)  
+                vector_recommender = VectorRecommender(mongodb_uri=mongodb_uri)  
+                inserted_id = structurer.save_to_mongodb(cv_json, client, vector_recommender=vector_recommender)  
                 if inserted_id:  
                     print(f"Data saved to MongoDB with ID: {inserted_id}")  
-                client.close()  
             except Exception as e:  
                 print(f"Error connecting to MongoDB: {e}")  
           
@@ -146,6 +147,56 @@ def match_job_offer_with_cvs(
       
     return None  
   
+def match_job_offers_with_cvs(  
+    job_offers_data,  
+    output_recommendations_path,  
+    top_n=5,  
+    vectorizer_type="tfidf",  
+    model_name=None,  
+    mongodb_uri=None  
+):  
+    """  
+    Compare several job offers with CVs stored in MongoDB in one pass.  
+      
+    Args:  
+        job_offers_data: List of job offer data (dictionaries)  
+        output_recommendations_path: Path where to save the recommendations of all offers  
+        top_n: Number of CVs to recommend per offer  
+        vectorizer_type: Type of vectorization ('tfidf', 'sentence_transformer')  
+        model_name: Name of the Sentence Transformer model (if applicable)  
+        mongodb_uri: MongoDB connection URI (optional)  
+    """  
+    job_offers = [JobOffer.from_dict(data) for data in job_offers_data]  
+      
+    # Initialize vector recommender  
+    mongodb_uri = mongodb_uri or os.environ.get("MONGODB_URI")  
+    recommender = VectorRecommender(  
+        mongodb_uri=mongodb_uri,  
+        vectorizer_type=vectorizer_type,  
+        model_name=model_name  
+    )  
+      
+    # Recommend CVs for all offers with a single offers x CVs scoring  
+    batches = recommender.recommend_cvs_batch([job_offer.to_dict() for job_offer in job_offers], top_n=top_n)  
+      
+    results = []  
+    for job_offer, recommendations in zip(job_offers, batches):  
+        results.append({"offre": job_offer.to_dict(), "recommandations": recommendations})  
+          
+        # Display recommendations  
+        print(f"\n--- Recommended CVs: {job_offer.title} ---\n")  
+        if not recommendations:  
+            print("No recommendations could be generated.")  
+        for i, recommendation in enumerate(recommendations):  
+            cv = recommendation["cv"]  
+            nom = cv.get("informations_personnelles", {}).get("nom", "")  
+            prenom = cv.get("informations_personnelles", {}).get("prenom", "")  
+            print(f"{i+1}. {prenom} {nom} (Score: {recommendation['score']:.2f})")  
+      
+    # Save recommendations  
+    recommender.save_recommendations_to_file(results, output_recommendations_path)  
+    return results  
+  
 # Example usage  
 if __name__ == "__main__":  
     # File paths  
@@ -165,8 +216,8 @@ if __name__ == "__main__":
     mongodb_uri = "mongodb://localhost:27017/cv_database"  
     os.environ["MONGODB_URI"] = mongodb_uri  
       
-    # Operation mode (1: CV processing, 2: Job offer matching)  
-    mode = int(input("Mode (1: CV processing, 2: Job offer matching): "))  
+    # Operation mode (1: CV processing, 2: Job offer matching, 3: Batch job offer matching)  
+    mode = int(input("Mode (1: CV processing, 2: Job offer matching, 3: Batch job offer matching): "))  
       
     if mode == 1:  
         # Process CV and recommend profiles  
@@ -200,5 +251,19 @@ if __name__ == "__main__":
             vectorizer_type="tfidf",  
             mongodb_uri=mongodb_uri  
         )  
+    elif mode == 3:  
+        # JSON file containing a list of job offers  
+        job_offers_file = input("Job offers file (default: data/job_offers/job_offers.json): ") or "data/job_offers/job_offers.json"  
+        with open(job_offers_file, "r", encoding="utf-8") as f:  
+            job_offers_data = json.load(f)  
+          
+        # Match all job offers with CVs  
+        recommendations = match_job_offers_with_cvs(  
+            job_offers_data,  
+            "data/outputs/batch_job_recommendations.json",  
+            top_n=5,  
+            vectorizer_type="tfidf",  
+            mongodb_uri=mongodb_uri  
+        )  
     else:  
         print("Unrecognized mode.")
\ No newline at end of file
@@ -0,0 +1,156 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from services.scoring import l2_normalize_rows, top_k_cosine
+from services.encoder_service import get_encoder
+from utils.disk_cache import get_disk_cache
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Fields of a profile document used as its name, by order of preference
+NAME_FIELDS = ("nom", "name", "titre", "title", "profil", "profile")
+
+
+def profile_name(profile):
+    """Return the display name of a profile (a string or a profile document)."""
+    if isinstance(profile, dict):
+        for field in NAME_FIELDS:
+            if profile.get(field):
+                return str(profile[field])
+        return str(profile.get("_id", ""))
+    return str(profile)
+
+
+def _flatten_text(value, skip=()):
+    """Collect the strings of a nested structure of dictionaries and lists."""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [text for key, item in value.items() if key not in skip for text in _flatten_text(item)]
+    if isinstance(value, list):
+        return [text for item in value for text in _flatten_text(item)]
+    return []
+
+
+def profile_text(profile):
+    """Return the text of a profile used for its embedding."""
+    return " ".join(_flatten_text(profile, skip=("_id",)))
+
+
+def cv_text(cv_json):
+    """Return the text of a structured CV, without its personal information."""
+    return " ".join(_flatten_text(cv_json, skip=("_id", "informations_personnelles")))
+
+
+class ProfileRetriever:
+    """
+    Shortlists the profiles of a catalogue closest to a CV by vector similarity.
+
+    The catalogue is embedded once, when the retriever is built; a CV then
+    costs one vectorization and one matrix-vector product.
+    """
+
+    def __init__(self, profiles, vectorizer_type="tfidf", model_name=None):
+        """
+        Embed the profile catalogue.
+
+        Args:
+            profiles: List of profiles (names or profile documents)
+            vectorizer_type: Type of vectorization ('tfidf', 'sentence_transformer')
+            model_name: Name of the Sentence Transformer model (if applicable)
+        """
+        self.profiles = profiles
+        self.vectorizer_type = vectorizer_type
+        texts = [profile_text(profile) for profile in profiles]
+
+        if vectorizer_type == "tfidf":
+            # Character n-grams match short profile names with CV wording ("developer" / "Développeur")
+            self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), strip_accents="unicode",
+                                              sublinear_tf=True, dtype=np.float32)
+            self.matrix = l2_normalize_rows(self.vectorizer.fit_transform(texts))
+        elif vectorizer_type == "sentence_transformer":
+            model_name = model_name or "all-MiniLM-L6-v2"
+            self.vectorizer = get_encoder(model_name)
+            # Catalogue embeddings survive restarts in the disk cache
+            cache = get_disk_cache("profiles")
+            key = f"{model_name}:{catalogue_fingerprint(profiles)}"
+            matrix = cache.get(key)
+            if matrix is None:
+                matrix = l2_normalize_rows(np.asarray(self.vectorizer.encode(texts), dtype=np.float32))
+                cache.set(key, matrix)
+            self.matrix = matrix
+        else:
+            raise ValueError(f"Unsupported vectorization type: {vectorizer_type}")
+
+    def vectorize(self, text):
+        """Vectorize a text in the space of the catalogue embeddings."""
+        if self.vectorizer_type == "tfidf":
+            return self.vectorizer.transform([text])
+        return np.asarray(self.vectorizer.encode([text]), dtype=np.float32)
+
+    def shortlist(self, cv_json, k=10):
+        """
+        Return the k profiles most similar to a CV.
+
+        Args:
+            cv_json: Structured CV
+            k: Number of profiles to return
+
+        Returns:
+            list: (profile, score) tuples sorted by decreasing similarity
+        """
+        if not self.profiles:
+            return []
+        indices, scores = top_k_cosine(self.vectorize(cv_text(cv_json)), self.matrix, k)
+        return [(self.profiles[i], float(score)) for i, score in zip(indices, scores)]
+
+    def matching_terms(self, cv_json, profile, limit=5):
+        """Return the terms a CV shares with a profile (tfidf mode only)."""
+        if self.vectorizer_type != "tfidf":
+            return []
+        analyzer = TfidfVectorizer(strip_accents="unicode").build_analyzer()
+        cv_terms = set(analyzer(cv_text(cv_json)))
+        terms = [term for term in dict.fromkeys(analyzer(profile_text(profile))) if term in cv_terms]
+        return terms[:limit]
+
+
+def catalogue_fingerprint(profiles):
+    """Return a hash identifying the content of a profile catalogue."""
+    data = json.dumps(profiles, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_profile_retriever(profiles, vectorizer_type=None, model_name=None):
+    """
+    Return the process-wide retriever of a profile catalogue.
+
+    The catalogue is embedded again only when its content changes.
+
+    Args:
+        profiles: List of profiles
+        vectorizer_type: Type of vectorization, defaults to the PROFILE_VECTORIZER_TYPE
+            environment variable ('tfidf' if unset)
+        model_name: Name of the Sentence Transformer model (if applicable)
+
+    Returns:
+        ProfileRetriever: Shared retriever
+    """
+    vectorizer_type = vectorizer_type or os.environ.get("PROFILE_VECTORIZER_TYPE", "tfidf")
+    key = (vectorizer_type, model_name, catalogue_fingerprint(profiles))
+    with _retrievers_lock:
+        if key not in _retrievers:
+            logger.info(f"Embedding {len(profiles)} profiles ({vectorizer_type})")
+            # Only the current catalogue of each vectorizer is kept
+            for old_key in [k for k in _retrievers if k[:2] == key[:2]]:
+                del _retrievers[old_key]
+            _retrievers[key] = ProfileRetriever(profiles, vectorizer_type, model_name)
+        return _retrievers[key]
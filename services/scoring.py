@@ -0,0 +1,163 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+
+def l2_normalize_rows(matrix):
+    """
+    L2-normalize the rows of a sparse or dense matrix.
+
+    Args:
+        matrix: Sparse matrix or 2D array
+
+    Returns:
+        matrix: Normalized matrix (CSR if the input was sparse, float32 array otherwise)
+    """
+    if sparse.issparse(matrix):
+        return normalize(matrix.tocsr(), norm="l2")
+    return normalize(np.asarray(matrix, dtype=np.float32), norm="l2")
+
+
+def top_k_from_scores(scores, k):
+    """
+    Select the k highest scores without sorting the whole array.
+
+    Args:
+        scores: 1D array of scores
+        k: Number of winners
+
+    Returns:
+        tuple: (indices, scores) of the winners, best first
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return order, scores[order]
+
+
+def cosine_scores(query_vector, matrix, normalized=True):
+    """
+    Compute the cosine similarity between a query and every row of a matrix.
+
+    The matrix stays sparse when it is sparse: the scores are obtained with a
+    single sparse matrix-vector product.
+
+    Args:
+        query_vector: Query vector (1D array, or sparse/dense 1 x n matrix)
+        matrix: Sparse CSR matrix or dense array with one row per document
+        normalized: True if the rows of the matrix are already L2-normalized
+
+    Returns:
+        scores: 1D float array of cosine similarities
+    """
+    if not normalized:
+        matrix = l2_normalize_rows(matrix)
+
+    if sparse.issparse(query_vector):
+        query = query_vector.toarray().ravel()
+    else:
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return np.zeros(matrix.shape[0], dtype=np.float32)
+    query = (query / norm).astype(np.float32)
+
+    scores = matrix @ query
+    return np.asarray(scores, dtype=np.float32).ravel()
+
+
+def top_k_cosine(query_vector, matrix, k, normalized=True):
+    """
+    Find the k rows of a matrix most similar to a query.
+
+    Args:
+        query_vector: Query vector (1D array, or sparse/dense 1 x n matrix)
+        matrix: Sparse CSR matrix or dense array with one row per document
+        k: Number of rows to return
+        normalized: True if the rows of the matrix are already L2-normalized
+
+    Returns:
+        tuple: (indices, scores) of the k best rows, best first
+    """
+    scores = cosine_scores(query_vector, matrix, normalized=normalized)
+    return top_k_from_scores(scores, k)
+
+
+def _merge_top_k(best_scores, best_indices, scores, indices, k):
+    """Keep the k best of two (scores, indices) column blocks, column by column."""
+    scores = np.vstack([best_scores, scores])
+    indices = np.vstack([best_indices, indices])
+    if scores.shape[0] > k:
+        keep = np.argpartition(-scores, k - 1, axis=0)[:k]
+        scores = np.take_along_axis(scores, keep, axis=0)
+        indices = np.take_along_axis(indices, keep, axis=0)
+    return scores, indices
+
+
+def top_k_cosine_batch(query_matrix, matrix, k, normalized=True, chunk_rows=16384, allowed_rows=None):
+    """
+    Find the k rows of a matrix most similar to each of several queries.
+
+    All queries are scored together with one matrix product per chunk of
+    rows, so scoring many queries costs about as much as scoring one. Only a
+    chunk_rows x queries block of scores is held in memory at a time; the k
+    best rows of each query are merged across chunks.
+
+    Args:
+        query_matrix: Sparse matrix or 2D array with one row per query
+        matrix: Sparse CSR matrix or dense array with one row per document
+        k: Number of rows to return per query
+        normalized: True if the rows of the matrix are already L2-normalized
+        chunk_rows: Number of document rows scored at a time
+        allowed_rows: Optional list with, for each query, a sorted array of the
+            rows it may return (None for all rows)
+
+    Returns:
+        list: (indices, scores) of the k best rows of each query, best first
+    """
+    if not normalized:
+        matrix = l2_normalize_rows(matrix)
+    queries = l2_normalize_rows(query_matrix)
+    n_queries, n_rows = queries.shape[0], matrix.shape[0]
+    k = min(k, n_rows)
+    if k <= 0 or n_queries == 0:
+        return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in range(n_queries)]
+    allowed_rows = allowed_rows or [None] * n_queries
+
+    best_scores = np.empty((0, n_queries), dtype=np.float32)
+    best_indices = np.empty((0, n_queries), dtype=np.int64)
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        scores = matrix[start:stop] @ queries.T
+        scores = scores.toarray() if sparse.issparse(scores) else np.asarray(scores)
+        scores = scores.astype(np.float32, copy=False)
+
+        # Rows outside the allowed set of a query can never be selected
+        for j, rows in enumerate(allowed_rows):
+            if rows is not None:
+                mask = np.ones(stop - start, dtype=bool)
+                mask[rows[(rows >= start) & (rows < stop)] - start] = False
+                scores[mask, j] = -np.inf
+
+        chunk_k = min(k, stop - start)
+        if chunk_k < stop - start:
+            top = np.argpartition(-scores, chunk_k - 1, axis=0)[:chunk_k]
+            scores = np.take_along_axis(scores, top, axis=0)
+            indices = top + start
+        else:
+            indices = np.broadcast_to(np.arange(start, stop)[:, None], scores.shape)
+        best_scores, best_indices = _merge_top_k(best_scores, best_indices, scores, indices, k)
+
+    results = []
+    for j in range(n_queries):
+        column = best_scores[:, j]
+        order = np.argsort(-column, kind="stable")
+        order = order[np.isfinite(column[order])]
+        results.append((best_indices[order, j], column[order]))
+    return results
@@ -0,0 +1,223 @@
+import os
+import logging
+import numpy as np
+from scipy import sparse
+from services.vector_store import get_vector_store
+from services.vector_recommender import PREFILTER_MIN_SKILLS
+from services.skill_index import cv_attributes, meets_requirements
+from utils.mongodb import CVRepository, JobOfferRepository
+from utils.metrics import timed
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Number of CVs kept in the materialized shortlist of each job offer
+SHORTLIST_SIZE = int(os.environ.get("SHORTLIST_SIZE", 20))
+
+# Fields of the open offers read when CVs are merged into their shortlists
+MERGE_PROJECTION = {
+    "titre": 1, "competences_requises": 1, "experience": 1, "diplome": 1, "description": 1,
+    "prefilter": 1, "shortlist": 1, "shortlist_version": 1
+}
+
+
+class ShortlistService:
+    """
+    Persisted job offers with a materialized shortlist of their best CVs.
+
+    An offer is ranked against the whole corpus once, when it is created.
+    Afterwards, each inserted CV is scored against the open offers only (one
+    CVs x offers product) and merged into the shortlists it enters, so reading
+    the best candidates of an offer is a lookup of its top entries.
+
+    Offer vectors are kept in their own vector store, next to the CV store.
+    With TF-IDF the IDF weights drift as CVs are added, so scores merged at
+    different times are close but not strictly comparable; rebuild re-ranks an
+    offer exactly, and shortlists computed with another vector version are
+    rebuilt when read.
+    """
+
+    def __init__(self, recommender, repository=None, cv_repository=None, size=None):
+        """
+        Initialize the service.
+
+        Args:
+            recommender: VectorRecommender scoring the CVs
+            repository: JobOfferRepository of the offers (defaults to the recommender's database)
+            cv_repository: CVRepository of the CVs (defaults to the recommender's database)
+            size: Length of the shortlists, defaults to SHORTLIST_SIZE (20)
+        """
+        self.recommender = recommender
+        self.repository = repository or JobOfferRepository(recommender.mongodb_uri)
+        self.cv_repository = cv_repository or CVRepository(recommender.mongodb_uri)
+        self.size = size or SHORTLIST_SIZE
+        cv_store = recommender.vector_store
+        self.offer_store = get_vector_store(f"{cv_store.namespace}-offers", cv_store.store_dir)
+
+    def offer_vector(self, offer_id, job_offer):
+        """
+        Return the stored vector of a job offer, computing it if it is missing or outdated.
+
+        Returns:
+            vector: Vector in the compute_cv_vector format (term counts for TF-IDF)
+        """
+        entry = self.offer_store.get(offer_id)
+        if entry is not None and entry["version"] == self.recommender.vector_version:
+            return entry["vector"]
+        text = self.recommender.preprocess_job_offer(job_offer)
+        vector = self.recommender.compute_cv_vector(text)
+        self.offer_store.put(offer_id, text, vector, self.recommender.vector_version)
+        return vector
+
+    def create_offer(self, job_offer, prefilter=None):
+        """
+        Save a job offer and rank the corpus to build its shortlist.
+
+        Args:
+            job_offer: Dictionary containing job offer information (JobOffer.to_dict format)
+            prefilter: recommend_cvs pre-filter arguments kept with the offer (optional)
+
+        Returns:
+            str: The ID of the job offer
+        """
+        offer = dict(job_offer, prefilter=prefilter or {}, status="open", shortlist=[], shortlist_version=None)
+        offer_id = self.repository.insert(offer)
+        self.rebuild(offer_id)
+        return offer_id
+
+    def rebuild(self, offer_id):
+        """
+        Rank the whole corpus for a job offer and replace its shortlist.
+
+        Returns:
+            list: The new shortlist, or None if the offer does not exist
+        """
+        offer = self.repository.get(offer_id, MERGE_PROJECTION)
+        if offer is None:
+            return None
+        self.recommender.load_corpus(self.cv_repository)
+
+        candidate_ids = self.recommender.select_candidates(offer, **(offer.get("prefilter") or {}))
+        ranked = []
+        if candidate_ids is None or candidate_ids:
+            query = self.recommender.stack_vectors([self.offer_vector(str(offer["_id"]), offer)])
+            ranked = self.recommender.rank_cvs(query[0], self.size, candidate_ids)
+
+        shortlist = [{"cv_id": cv_id, "score": float(score)} for cv_id, score in ranked]
+        self.repository.set_shortlist(offer_id, shortlist, self.recommender.vector_version)
+        return shortlist
+
+    def _accepts(self, offer, attributes):
+        """Check a CV against the pre-filters saved with an offer."""
+        prefilter = offer.get("prefilter") or {}
+        min_skills = prefilter.get("min_skills")
+        return meets_requirements(
+            attributes,
+            offer.get("competences_requises", []),
+            min_skills=PREFILTER_MIN_SKILLS if min_skills is None else min_skills,
+            min_degree_level=prefilter.get("min_degree_level"),
+            min_experience_years=prefilter.get("min_experience_years")
+        )
+
+    @timed("shortlist_update")
+    def add_cvs(self, cvs):
+        """
+        Score new or updated CVs against the open offers and merge them into their shortlists.
+
+        Args:
+            cvs: List of (cv_id, cv) tuples
+
+        Returns:
+            int: Number of shortlists changed
+        """
+        if not cvs:
+            return 0
+        version = self.recommender.vector_version
+        offers = [offer for offer in self.repository.find_open(MERGE_PROJECTION)
+                  if offer.get("shortlist_version") == version]
+        if not offers:
+            return 0
+
+        # Stored CV vectors are reused, as they were just computed by index_cv(s)
+        cv_vectors = []
+        for cv_id, cv in cvs:
+            entry = self.recommender.vector_store.get(cv_id)
+            if entry is not None and entry["version"] == version:
+                cv_vectors.append(entry["vector"])
+            else:
+                cv_vectors.append(self.recommender.compute_cv_vector(self.recommender.preprocess_cv(cv)))
+        cv_matrix = self.recommender.stack_vectors(cv_vectors)
+        offer_matrix = self.recommender.stack_vectors(
+            [self.offer_vector(str(offer["_id"]), offer) for offer in offers]
+        )
+
+        # Scores of every new CV against every open offer in one product
+        scores = cv_matrix @ offer_matrix.T
+        scores = scores.toarray() if sparse.issparse(scores) else np.asarray(scores)
+        attributes = [cv_attributes(cv) for _, cv in cvs]
+
+        merges = {}
+        for j, offer in enumerate(offers):
+            shortlist = offer.get("shortlist") or []
+            listed = {entry["cv_id"] for entry in shortlist}
+            threshold = shortlist[-1]["score"] if len(shortlist) >= self.size else -np.inf
+            entries = [
+                {"cv_id": str(cv_id), "score": float(scores[i, j])}
+                for i, (cv_id, _) in enumerate(cvs)
+                if (scores[i, j] > threshold or str(cv_id) in listed) and self._accepts(offer, attributes[i])
+            ]
+            if entries:
+                merges[str(offer["_id"])] = entries
+
+        self.repository.merge_into_shortlists(merges, self.size)
+        if merges:
+            logger.debug(f"{len(cvs)} CVs merged into {len(merges)} of {len(offers)} shortlists")
+        return len(merges)
+
+    def get_shortlist(self, offer_id, top_n=5, refresh=False):
+        """
+        Return the best candidates of a job offer from its materialized shortlist.
+
+        Args:
+            offer_id: ID of the job offer
+            top_n: Number of CVs to return (at most the shortlist size)
+            refresh: Re-rank the whole corpus before reading
+
+        Returns:
+            dict: The offer and its recommended CVs, or None if the offer does not exist
+        """
+        offer = self.repository.get(offer_id)
+        if offer is None:
+            return None
+        if refresh or offer.get("shortlist_version") != self.recommender.vector_version:
+            offer["shortlist"] = self.rebuild(offer_id)
+
+        ranked = [(entry["cv_id"], entry["score"]) for entry in offer["shortlist"]]
+        recommendations = []
+        missing = set()
+        start = 0
+        while len(recommendations) < top_n and start < len(ranked):
+            # CVs deleted since they were shortlisted are replaced by the next entries
+            page = ranked[start:start + top_n - len(recommendations)]
+            start += len(page)
+            found = self.recommender.build_recommendations(self.cv_repository, [page])[0]
+            missing |= {cv_id for cv_id, _ in page} - {str(rec["cv"]["_id"]) for rec in found}
+            recommendations.extend(found)
+        if missing:
+            self.repository.remove_from_shortlists(missing)
+
+        offer.pop("shortlist")
+        return {"offre": offer, "recommandations": recommendations}
+
+    def list_offers(self):
+        """Return the open job offers, without their shortlist."""
+        return list(self.repository.find_open({"shortlist": 0}))
+
+    def close_offer(self, offer_id):
+        """
+        Close a job offer: its shortlist is no longer updated.
+
+        Returns:
+            bool: True if the offer exists
+        """
+        return self.repository.set_status(offer_id, "closed")
@@ -0,0 +1,340 @@
+import re
+import threading
+import unicodedata
+from datetime import date
+from collections import Counter
+from services.cv_preextractor import SKILL_LEXICON
+
+# Spellings of the same skill, by normalized form
+SKILL_ALIASES = {
+    "js": "javascript", "ts": "typescript", "nodejs": "node.js", "node": "node.js", "reactjs": "react",
+    "react.js": "react", "vuejs": "vue.js", "vue": "vue.js", "angularjs": "angular", "expressjs": "express",
+    "postgres": "postgresql", "mongo": "mongodb", "k8s": "kubernetes", "golang": "go", "csharp": "c#",
+    "cpp": "c++", "springboot": "spring boot", "scikitlearn": "scikit-learn", "sklearn": "scikit-learn",
+    "ml": "machine learning", "dl": "deep learning", "tf": "tensorflow"
+}
+
+# Degree levels, in years of study after the baccalaureate, highest first
+DEGREE_LEVELS = [
+    (8, re.compile(r"doctorat|doctorate|\bph\.?d\b")),
+    (5, re.compile(r"master|mastere|\bmsc\b|\bmba\b|ingenieur|engineer")),
+    (3, re.compile(r"licence|bachelor|\blp\b|\bbsc\b")),
+    (2, re.compile(r"\bdut\b|\bbts\b|\bdeug\b|\bdeust\b|technicien|associate")),
+    (0, re.compile(r"baccalaureat|\bbac\b|high school"))
+]
+BAC_PLUS_RE = re.compile(r"\bbac\s*\+\s*(\d)")
+
+YEAR_RE = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)")
+ONGOING_RE = re.compile(r"present|aujourd|actuel|en cours|current|now")
+MONTHS_RE = re.compile(r"(\d+)\s*mois|(\d+)\s*months?")
+NUMBER_RE = re.compile(r"(\d+(?:[.,]\d+)?)")
+SENIORITY = [(re.compile(r"debutant|junior|stage|intern"), 0.0), (re.compile(r"confirme|intermediate"), 3.0),
+             (re.compile(r"senior|expert"), 5.0)]
+
+
+def _fold(text):
+    return unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def _normalize(name):
+    name = re.sub(r"[^a-z0-9+#./ -]", "", _fold(name)).strip(" .-")
+    return re.sub(r"\s+", " ", name)
+
+
+def _build_aliases():
+    aliases = {}
+    for skills in SKILL_LEXICON.values():
+        for skill in skills:
+            names = skill if isinstance(skill, tuple) else (skill,)
+            canonical = _normalize(names[0])
+            for name in names:
+                aliases[_normalize(name)] = canonical
+                aliases[_normalize(name).replace(" ", "")] = canonical
+    aliases.update(SKILL_ALIASES)
+    return aliases
+
+
+_ALIASES = _build_aliases()
+
+
+def normalize_skill(name):
+    """Return the normalized token of a skill name ('Node.JS', 'nodejs' -> 'node.js')."""
+    token = _normalize(name)
+    return _ALIASES.get(token) or _ALIASES.get(token.replace(" ", "")) or token
+
+
+def split_skills(value):
+    """Split a skill list given as text ('Python, SQL; Docker') into skill names."""
+    return [part.strip() for part in re.split(r"[,;|\n]", value) if part.strip()]
+
+
+def cv_skills(cv):
+    """Return the normalized skills of a CV, from its competences and its projects' technologies."""
+    names = []
+    competences = cv.get("competences", {})
+    values = competences.values() if isinstance(competences, dict) else [competences]
+    for value in values:
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, str):
+                names.extend(split_skills(item))
+    for project in cv.get("projets", []) or []:
+        if isinstance(project, dict):
+            techs = project.get("techs", [])
+            names.extend(split_skills(techs) if isinstance(techs, str) else [t for t in techs if isinstance(t, str)])
+    return sorted({normalize_skill(name) for name in names} - {""})
+
+
+def degree_level(text):
+    """Return the level of a degree in years after the baccalaureate, or None if unknown."""
+    if not text:
+        return None
+    text = _fold(text)
+    match = BAC_PLUS_RE.search(text)
+    if match:
+        return int(match.group(1))
+    for level, pattern in DEGREE_LEVELS:
+        if pattern.search(text):
+            return level
+    return None
+
+
+def cv_degree_level(cv):
+    """Return the highest degree level of a CV, or None if none is recognized."""
+    levels = [
+        degree_level(f"{edu.get('diplome', '')} {edu.get('filiere', '')}")
+        for edu in cv.get("education", []) or [] if isinstance(edu, dict)
+    ]
+    levels = [level for level in levels if level is not None]
+    return max(levels) if levels else None
+
+
+def _period_years(text):
+    text = _fold(text)
+    months = MONTHS_RE.search(text)
+    if months:
+        return int(months.group(1) or months.group(2)) / 12
+    years = [int(year) for year in YEAR_RE.findall(text)]
+    if ONGOING_RE.search(text):
+        years.append(date.today().year)
+    if len(years) >= 2:
+        return max(max(years) - min(years), 0.5)
+    # A single year: an internship or a short position
+    return 0.5 if years else 0.0
+
+
+def cv_experience_years(cv):
+    """Return the approximate number of years of professional experience of a CV."""
+    total = 0.0
+    for experience in cv.get("experiences_professionnelles", []) or []:
+        if isinstance(experience, dict):
+            total += _period_years(" ".join(str(experience.get(key, "")) for key in ("dates", "periode", "duree")))
+    return round(total, 1)
+
+
+def experience_years(text):
+    """Return the number of years of experience asked for by a job offer ('3 ans', 'Senior'), or None."""
+    if not text:
+        return None
+    text = _fold(text)
+    match = NUMBER_RE.search(text)
+    if match:
+        years = float(match.group(1).replace(",", "."))
+        return years / 12 if "mois" in text or "month" in text else years
+    for pattern, years in SENIORITY:
+        if pattern.search(text):
+            return years
+    return None
+
+
+def cv_attributes(cv):
+    """
+    Compute the attributes of a CV used by the pre-filters.
+
+    Returns:
+        dict: Normalized skills, degree level and years of experience
+    """
+    return {
+        "skills": cv_skills(cv),
+        "degree_level": cv_degree_level(cv),
+        "experience_years": cv_experience_years(cv)
+    }
+
+
+def meets_requirements(attributes, skills=None, min_skills=1, min_degree_level=None, min_experience_years=None,
+                       keep_unknown=True):
+    """
+    Check the attributes of a single CV against the requirements of a job offer.
+
+    Applies the same rules as SkillIndex.candidates, for a CV that is not
+    looked up in the index (such as a CV being inserted).
+
+    Args:
+        attributes: CV attributes (see cv_attributes)
+        skills, min_skills, min_degree_level, min_experience_years, keep_unknown: See SkillIndex.candidates
+
+    Returns:
+        bool: True if the CV passes the filters
+    """
+    required = {normalize_skill(skill) for skill in skills or []} - {""}
+    if required and min_skills:
+        if len(required & set(attributes["skills"])) < min(min_skills, len(required)):
+            return False
+    if min_degree_level is not None:
+        level = attributes["degree_level"]
+        if (not keep_unknown) if level is None else level < min_degree_level:
+            return False
+    if min_experience_years is not None and attributes["experience_years"] < min_experience_years:
+        return False
+    return True
+
+
+class SkillIndex:
+    """
+    Inverted index from normalized skills to CV ids, with the degree level and
+    experience of each CV.
+
+    It selects the candidate CVs of a job offer before vector scoring. The
+    index follows a CVVectorStore as an observer, reading the attributes
+    saved with each entry, and is saved in the store snapshot.
+    """
+
+    def __init__(self, version):
+        """
+        Initialize the index.
+
+        Args:
+            version: Version tag of the store entries accepted by the index
+        """
+        self.version = version
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._attributes = {}
+
+    def __len__(self):
+        return len(self._attributes)
+
+    def _add(self, cv_id, attributes):
+        self._attributes[cv_id] = attributes
+        for skill in attributes["skills"]:
+            self._postings.setdefault(skill, set()).add(cv_id)
+
+    def _remove(self, cv_id):
+        attributes = self._attributes.pop(cv_id, None)
+        if attributes is None:
+            return
+        for skill in attributes["skills"]:
+            postings = self._postings.get(skill)
+            if postings is not None:
+                postings.discard(cv_id)
+                if not postings:
+                    del self._postings[skill]
+
+    def candidates(self, skills=None, min_skills=1, min_degree_level=None, min_experience_years=None,
+                   keep_unknown=True):
+        """
+        Select the CVs meeting the requirements of a job offer.
+
+        Args:
+            skills: Required skills of the offer
+            min_skills: Minimum number of required skills a CV must have (capped at the
+                number of required skills; 0 disables the skill filter)
+            min_degree_level: Minimum degree level, in years after the baccalaureate
+            min_experience_years: Minimum years of professional experience
+            keep_unknown: Keep the CVs whose degree level is not recognized
+
+        Returns:
+            set: Ids of the selected CVs, or None if no filter applies
+        """
+        with self._lock:
+            selected = None
+            required = {normalize_skill(skill) for skill in skills or []} - {""}
+            if required and min_skills:
+                postings = [self._postings.get(skill, ()) for skill in required]
+                needed = min(min_skills, len(required))
+                if needed == 1:
+                    selected = set().union(*postings)
+                else:
+                    counts = Counter()
+                    for ids in postings:
+                        counts.update(ids)
+                    selected = {cv_id for cv_id, count in counts.items() if count >= needed}
+
+            if min_degree_level is not None:
+                passing = {
+                    cv_id for cv_id, attributes in self._attributes.items()
+                    if (keep_unknown if attributes["degree_level"] is None
+                        else attributes["degree_level"] >= min_degree_level)
+                }
+                selected = passing if selected is None else selected & passing
+
+            if min_experience_years is not None:
+                passing = {
+                    cv_id for cv_id, attributes in self._attributes.items()
+                    if attributes["experience_years"] >= min_experience_years
+                }
+                selected = passing if selected is None else selected & passing
+            return selected
+
+    # Vector store observer interface
+
+    def _accepts(self, entry):
+        return entry is not None and entry["version"] == self.version and entry.get("attributes") is not None
+
+    def rebuild(self, entries):
+        """Build the index from all the entries of the store."""
+        with self._lock:
+            self._postings = {}
+            self._attributes = {}
+            for cv_id, entry in entries:
+                if self._accepts(entry):
+                    self._add(cv_id, entry["attributes"])
+
+    def update(self, cv_id, old_entry, new_entry):
+        """Apply a change of store entry to the index."""
+        with self._lock:
+            self._remove(cv_id)
+            if self._accepts(new_entry):
+                self._add(cv_id, new_entry["attributes"])
+
+    def state(self):
+        """Return the state saved in the store snapshot."""
+        with self._lock:
+            return {"version": self.version, "postings": self._postings, "attributes": self._attributes}
+
+    def restore(self, state):
+        """
+        Reload the state saved with the store snapshot.
+
+        Returns:
+            bool: False if the saved state cannot be used
+        """
+        if state.get("version") != self.version:
+            return False
+        with self._lock:
+            self._postings = state["postings"]
+            self._attributes = state["attributes"]
+        return True
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_skill_index(vector_store, version):
+    """
+    Return the process-wide skill index following a vector store.
+
+    Args:
+        vector_store: CVVectorStore whose entries carry the CV attributes
+        version: Version tag of the entries accepted by the index
+
+    Returns:
+        SkillIndex: Shared index instance
+    """
+    key = (id(vector_store), version)
+    with _indexes_lock:
+        if key not in _indexes:
+            index = SkillIndex(version)
+            vector_store.attach("skills", index)
+            _indexes[key] = index
+        return _indexes[key]
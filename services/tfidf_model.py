@@ -0,0 +1,176 @@
+import threading
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+
+class IncrementalTfidf:
+    """
+    TF-IDF vectorizer that is fitted once and updated incrementally.
+
+    Term counts come from a stateless HashingVectorizer, so the vectors of
+    stored CVs never change when the vocabulary grows. Only the document
+    frequency tally is updated when CVs are added or removed, and the IDF
+    weights are applied at query time.
+    """
+
+    def __init__(self, n_features=2 ** 18, stop_words="english"):
+        """
+        Initialize the vectorizer.
+
+        Args:
+            n_features: Number of hashed features
+            stop_words: Stop words removed before counting terms
+        """
+        self.n_features = n_features
+        self.hasher = HashingVectorizer(
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None,
+            stop_words=stop_words,
+            dtype=np.float32
+        )
+        self.version = f"tfidf-hashing:{n_features}"
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.revision = 0
+        self._idf = None
+        self._lock = threading.RLock()
+
+    def count(self, texts):
+        """
+        Count the terms of a list of texts.
+
+        Args:
+            texts: List of texts
+
+        Returns:
+            counts: Sparse CSR matrix of term counts (one row per text)
+        """
+        return self.hasher.transform(texts)
+
+    def _update(self, counts, sign):
+        """Add (sign=1) or remove (sign=-1) documents from the tally."""
+        counts = sparse.csr_matrix(counts)
+        if counts.shape[1] != self.n_features:
+            return
+        with self._lock:
+            np.add.at(self.df, counts.indices, sign)
+            self.n_docs += sign * counts.shape[0]
+            self._idf = None
+            self.revision += 1
+
+    def add(self, counts):
+        """Add the term counts of new documents to the document frequency tally."""
+        self._update(counts, 1)
+
+    def remove(self, counts):
+        """Remove the term counts of deleted documents from the document frequency tally."""
+        self._update(counts, -1)
+
+    def idf(self):
+        """
+        Return the current IDF weights (smoothed, as in scikit-learn's TfidfTransformer).
+
+        Returns:
+            idf: Array of IDF weights, one per hashed feature
+        """
+        with self._lock:
+            if self._idf is None:
+                self._idf = (np.log((1 + self.n_docs) / (1 + self.df)) + 1).astype(np.float32)
+            return self._idf
+
+    def weight(self, counts):
+        """
+        Turn term counts into L2-normalized TF-IDF vectors.
+
+        Args:
+            counts: Sparse matrix of term counts
+
+        Returns:
+            vectors: Sparse CSR matrix of TF-IDF vectors
+        """
+        weighted = sparse.csr_matrix(counts) @ sparse.diags(self.idf())
+        return normalize(weighted.tocsr(), norm="l2", copy=False)
+
+    def transform(self, texts):
+        """
+        Vectorize texts with the fitted IDF weights, without refitting.
+
+        Args:
+            texts: List of texts
+
+        Returns:
+            vectors: Sparse CSR matrix of TF-IDF vectors
+        """
+        return self.weight(self.count(texts))
+
+    # Vector store observer interface: the tally follows the stored CV counts
+
+    def _is_counted(self, entry):
+        """Check whether a store entry carries term counts of this vectorizer."""
+        return entry is not None and entry["version"].startswith(self.version)
+
+    def rebuild(self, entries):
+        """Recompute the tally from all the entries of the store."""
+        rows = [entry["vector"] for _, entry in entries if self._is_counted(entry)]
+        with self._lock:
+            self.df = np.zeros(self.n_features, dtype=np.int64)
+            self.n_docs = 0
+            if rows:
+                self.add(sparse.vstack(rows, format="csr"))
+            self._idf = None
+            self.revision += 1
+
+    def update(self, cv_id, old_entry, new_entry):
+        """Apply a change of store entry to the tally."""
+        if self._is_counted(old_entry):
+            self.remove(old_entry["vector"])
+        if self._is_counted(new_entry):
+            self.add(new_entry["vector"])
+
+    def state(self):
+        """Return the tally, saved in the store snapshot."""
+        with self._lock:
+            return {"version": self.version, "df": self.df.copy(), "n_docs": self.n_docs}
+
+    def restore(self, state):
+        """
+        Restore a tally saved in the store snapshot.
+
+        Returns:
+            bool: False if the state was produced by another configuration
+        """
+        if state.get("version") != self.version:
+            return False
+        with self._lock:
+            self.df = np.asarray(state["df"], dtype=np.int64)
+            self.n_docs = state["n_docs"]
+            self._idf = None
+            self.revision += 1
+        return True
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_tfidf_model(vector_store, n_features=2 ** 18):
+    """
+    Return the process-wide TF-IDF vectorizer following a vector store.
+
+    Args:
+        vector_store: CVVectorStore holding the CV term counts
+        n_features: Number of hashed features
+
+    Returns:
+        IncrementalTfidf: Shared vectorizer instance
+    """
+    key = (id(vector_store), n_features)
+    with _models_lock:
+        if key not in _models:
+            model = IncrementalTfidf(n_features=n_features)
+            vector_store.attach(model.version, model)
+            _models[key] = model
+        return _models[key]
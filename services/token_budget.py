@@ -0,0 +1,185 @@
+import os
+import json
+import logging
+from utils.metrics import registry
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_MAX_COMPLETION_TOKENS = 4000
+DEFAULT_MAX_INPUT_TOKENS = 3000
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            # LLaMA3 has its own vocabulary, cl100k_base counts within a few percent of it
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    """
+    Count the tokens of a text with tiktoken, or estimate them (about 4 characters
+    per token) when tiktoken is not installed.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def count_message_tokens(messages):
+    """Count the tokens of chat messages, with the per-message formatting overhead."""
+    return sum(count_tokens(message["content"]) + 4 for message in messages) + 2
+
+
+def _prune(data):
+    """Remove MongoDB ids, None values and empty containers and strings."""
+    if isinstance(data, dict):
+        pruned = {key: _prune(value) for key, value in data.items() if key != "_id"}
+        return {key: value for key, value in pruned.items() if value not in (None, "", [], {})}
+    if isinstance(data, list):
+        pruned = [_prune(value) for value in data]
+        return [value for value in pruned if value not in (None, "", [], {})]
+    return data
+
+
+def compact_json(data):
+    """Serialize data for a prompt: no indentation, no ids and no empty values."""
+    return json.dumps(_prune(data), ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def split_text(text, max_tokens):
+    """
+    Split a text into chunks of at most max_tokens tokens, on line boundaries
+    (a single line longer than the limit is cut on words).
+
+    Returns:
+        list: Chunks of the text
+    """
+    chunks, current, current_tokens = [], [], 0
+    for line in text.splitlines():
+        line_tokens = count_tokens(line) + 1
+        if line_tokens > max_tokens:
+            pieces = _split_line(line, max_tokens)
+        else:
+            pieces = [(line, line_tokens)]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _split_line(line, max_tokens):
+    pieces, words = [], []
+    for word in line.split():
+        if words and count_tokens(" ".join(words + [word])) > max_tokens:
+            pieces.append(" ".join(words))
+            words = []
+        words.append(word)
+    if words:
+        pieces.append(" ".join(words))
+    return [(piece, count_tokens(piece) + 1) for piece in pieces]
+
+
+class TokenBudget:
+    """
+    Token budget of the prompts and completions sent to a model.
+
+    The context window is shared between the prompt and the completion:
+    max_tokens is sized for the expected answer and capped by what the
+    prompt leaves of the window.
+    """
+
+    def __init__(self, context_window=None, max_completion_tokens=None, max_input_tokens=None, safety_margin=64):
+        """
+        Initialize the budget.
+
+        Args:
+            context_window: Context size of the model, defaults to LLM_CONTEXT_WINDOW (8192)
+            max_completion_tokens: Upper bound of max_tokens, defaults to LLM_MAX_COMPLETION_TOKENS (4000)
+            max_input_tokens: Size of the input (CV text or data) sent in a single prompt,
+                defaults to LLM_MAX_INPUT_TOKENS (3000)
+            safety_margin: Tokens kept free to absorb the tokenizer approximation
+        """
+        self.context_window = context_window or int(os.environ.get("LLM_CONTEXT_WINDOW", DEFAULT_CONTEXT_WINDOW))
+        self.max_completion_tokens = max_completion_tokens or int(
+            os.environ.get("LLM_MAX_COMPLETION_TOKENS", DEFAULT_MAX_COMPLETION_TOKENS)
+        )
+        self.max_input_tokens = max_input_tokens or int(os.environ.get("LLM_MAX_INPUT_TOKENS", DEFAULT_MAX_INPUT_TOKENS))
+        self.safety_margin = safety_margin
+
+    def available(self, messages):
+        """Return the number of completion tokens the messages leave in the context window."""
+        return self.context_window - count_message_tokens(messages) - self.safety_margin
+
+    def max_tokens(self, messages, expected, minimum=256):
+        """
+        Return the max_tokens of a call.
+
+        Args:
+            messages: Chat messages of the call
+            expected: Expected size of the completion in tokens
+            minimum: Smallest max_tokens worth sending
+
+        Returns:
+            int: max_tokens, or None if the prompt leaves less than minimum tokens
+        """
+        available = self.available(messages)
+        if available < minimum:
+            return None
+        return max(minimum, min(expected, self.max_completion_tokens, available))
+
+    def fits(self, text):
+        """Return True if a text fits in a single prompt."""
+        return count_tokens(text) <= self.max_input_tokens
+
+    def fit_json(self, data, drop_order, limit=None):
+        """
+        Drop top-level sections of a JSON object, in the given order, until its
+        compact serialization fits in the budget.
+
+        Returns:
+            tuple: (reduced data, names of the dropped sections)
+        """
+        limit = limit or self.max_input_tokens
+        data = dict(data)
+        dropped = []
+        for key in drop_order:
+            if count_tokens(compact_json(data)) <= limit:
+                break
+            if key in data:
+                del data[key]
+                dropped.append(key)
+        return data, dropped
+
+
+def log_llm_call(stage, model, prompt_tokens, completion_tokens, elapsed, max_tokens=None):
+    """Log the tokens in and out and the latency of an LLM call, and record them in the metrics."""
+    registry.inc("llm_tokens_total", prompt_tokens, stage=stage, direction="in")
+    registry.inc("llm_tokens_total", completion_tokens, stage=stage, direction="out")
+    registry.observe("llm_call_duration_seconds", elapsed, stage=stage)
+    logger.info(
+        f"LLM call [{stage}] model={model} tokens_in={prompt_tokens} tokens_out={completion_tokens} "
+        f"max_tokens={max_tokens} latency={elapsed:.2f}s"
+    )
@@ -1,10 +1,39 @@
 import numpy as np  
-from sklearn.feature_extraction.text import TfidfVectorizer  
+from scipy import sparse  
 from sklearn.metrics.pairwise import cosine_similarity  
-from sentence_transformers import SentenceTransformer  
-import pymongo  
 import json  
 import os  
+import logging  
+from services.vector_store import get_vector_store  
+from services.tfidf_model import get_tfidf_model  
+from services.scoring import l2_normalize_rows, top_k_cosine, top_k_cosine_batch  
+from services.ann_index import get_ann_index, recall_at_k  
+from services.encoder_service import get_encoder  
+from utils.mongodb import CVRepository  
+from services.corpus_sync import CorpusSync  
+from services.skill_index import get_skill_index, cv_attributes  
+from utils.metrics import span, timed  
+  
+# Initialize logger  
+logger = logging.getLogger(__name__)  
+  
+# Bump when preprocess_cv or cv_attributes change so stored vectors are recomputed  
+PREPROCESS_VERSION = 2  
+  
+# Minimum number of required skills of the offer a CV must have to be scored. Skills are matched  
+# on exact normalized names, so the filter is opt-in: 0 (the default) disables it  
+PREFILTER_MIN_SKILLS = int(os.environ.get("PREFILTER_MIN_SKILLS", 0))  
+  
+# Candidate sets covering at least this share of the corpus are applied to an oversampled  
+# top of all CVs instead of selecting their rows before scoring  
+PREFILTER_DENSE_RATIO = float(os.environ.get("PREFILTER_DENSE_RATIO", 0.3))  
+PREFILTER_OVERSAMPLE = 4  
+  
+# Number of CV rows scored at a time by batch matching (bounds the offers x CVs score block)  
+BATCH_CHUNK_ROWS = int(os.environ.get("MATCH_BATCH_CHUNK_ROWS", 16384))  
+  
+# Stacked CV matrices and the row of each CV id, reused while the vector store is unchanged  
+_cv_matrix_cache = {}  
   
 class VectorRecommender:  
     """  
@@ -12,7 +41,8 @@ class VectorRecommender:
     using vectorization and similarity calculation techniques.  
     """  
       
-    def __init__(self, mongodb_uri=None, vectorizer_type="tfidf", model_name=None):  
+    def __init__(self, mongodb_uri=None, vectorizer_type="tfidf", model_name=None, store_dir=None,  
+                 ann_backend=None):  
         """  
         Initialize the vector recommender.  
           
@@ -20,18 +50,37 @@ class VectorRecommender:
             mongodb_uri: MongoDB connection URI  
             vectorizer_type: Type of vectorization ('tfidf', 'sentence_transformer')  
             model_name: Name of the Sentence Transformer model (if applicable)  
+            store_dir: Directory of the persistent CV vector store (optional)  
+            ann_backend: ANN index used in sentence_transformer mode ('hnsw', 'ivf', 'auto'),  
+                defaults to the VECTOR_ANN_BACKEND environment variable (exact search if unset)  
         """  
         self.mongodb_uri = mongodb_uri or os.environ.get("MONGODB_URI")  
         self.vectorizer_type = vectorizer_type  
           
         # Initialize vectorizer  
         if vectorizer_type == "tfidf":  
-            self.vectorizer = TfidfVectorizer(stop_words='english')  
+            # Precomputed CV vectors, shared by all recommenders of the process  
+            self.vector_store = get_vector_store("tfidf", store_dir)  
+            # Fitted once on the stored CVs and updated as CVs are saved  
+            self.vectorizer = get_tfidf_model(self.vector_store)  
+            self.vector_version = f"{self.vectorizer.version}:p{PREPROCESS_VERSION}"  
+            self.ann_index = None  
         elif vectorizer_type == "sentence_transformer":  
             model_name = model_name or "all-MiniLM-L6-v2"  
-            self.vectorizer = SentenceTransformer(model_name)  
+            self.vector_store = get_vector_store(f"sentence_transformer-{model_name.replace('/', '_')}", store_dir)  
+            # Model loaded once per process, with batched and cached encoding  
+            self.vectorizer = get_encoder(model_name)  
+            self.vector_version = f"sentence_transformer:{model_name}:p{PREPROCESS_VERSION}"  
+            # Approximate search over the stored embeddings, built and persisted with the store  
+            ann_backend = ann_backend or os.environ.get("VECTOR_ANN_BACKEND")  
+            self.ann_index = get_ann_index(self.vector_store, ann_backend, self.vector_version) if ann_backend else None  
         else:  
             raise ValueError(f"Unsupported vectorization type: {vectorizer_type}")  
+          
+        self.model_name = model_name  
+        self.corpus_sync = None  
+        # Skill, degree and experience pre-filters, built from the attributes saved with the vectors  
+        self.skill_index = get_skill_index(self.vector_store, self.vector_version)  
       
     def preprocess_job_offer(self, job_offer):  
         """  
@@ -107,8 +156,8 @@ class VectorRecommender:
             vector: Numerical vector representing the text  
         """  
         if self.vectorizer_type == "tfidf":  
-            # For TF-IDF, we need to fit the vectorizer on the text first  
-            vector_matrix = self.vectorizer.fit_transform([text])  
+            # For TF-IDF, the fitted IDF weights are applied without refitting  
+            vector_matrix = self.vectorizer.transform([text])  
             return vector_matrix.toarray()[0]  
         elif self.vectorizer_type == "sentence_transformer":  
             # For Sentence Transformer, we can directly encode the text  
@@ -123,10 +172,11 @@ class VectorRecommender:
               
         Returns:  
             vectors: Matrix of numerical vectors representing the texts  
+                (sparse CSR matrix for TF-IDF)  
         """  
         if self.vectorizer_type == "tfidf":  
-            # For TF-IDF, we need to fit the vectorizer on all texts  
-            return self.vectorizer.fit_transform(texts).toarray()  
+            # For TF-IDF, the fitted IDF weights are applied without refitting  
+            return self.vectorizer.transform(texts)  
         elif self.vectorizer_type == "sentence_transformer":  
             # For Sentence Transformer, we can directly encode the texts  
             return self.vectorizer.encode(texts)  
@@ -149,13 +199,321 @@ class VectorRecommender:
         # Calculate cosine similarity  
         return cosine_similarity(v1, v2)[0][0]  
       
-    def recommend_cvs(self, job_offer, top_n=5):  
+    def compute_cv_vector(self, cv_text):  
+        """  
+        Compute the vector stored for a CV.  
+          
+        Args:  
+            cv_text: Preprocessed CV text  
+          
+        Returns:  
+            vector: CV vector (raw term counts for TF-IDF, weighted at query time)  
+        """  
+        if self.vectorizer_type == "tfidf":  
+            # IDF weights change as CVs are added: only the term counts are stored  
+            return self.vectorizer.count([cv_text])  
+        return np.asarray(self.vectorize_text(cv_text), dtype=np.float32)  
+      
+    def index_cv(self, cv_id, cv, vector=None):  
+        """  
+        Compute the vector of a CV and save it in the vector store.  
+          
+        Args:  
+            cv_id: MongoDB id of the CV  
+            cv: Dictionary containing CV information  
+            vector: Vector already computed for this CV by compute_cv_vector (optional)  
+        """  
+        cv_text = self.preprocess_cv(cv)  
+        if vector is None:  
+            vector = self.compute_cv_vector(cv_text)  
+        self.vector_store.put(str(cv_id), cv_text, vector, self.vector_version, cv_attributes(cv))  
+      
+    @timed("vectorization")  
+    def index_cvs(self, cvs):  
+        """  
+        Compute the vectors of several CVs in one batch and save them in the vector store.  
+          
+        Args:  
+            cvs: List of (cv_id, cv) tuples  
+        """  
+        if not cvs:  
+            return  
+        cv_texts = [self.preprocess_cv(cv) for _, cv in cvs]  
+        if self.vectorizer_type == "tfidf":  
+            vectors = self.vectorizer.count(cv_texts)  
+        else:  
+            vectors = np.asarray(self.vectorize_texts(cv_texts), dtype=np.float32)  
+        for i, (cv_id, cv) in enumerate(cvs):  
+            self.vector_store.put(str(cv_id), cv_texts[i], vectors[i], self.vector_version, cv_attributes(cv))  
+      
+    def sync_from_mongodb(self, repository, batch_size=256):  
+        """  
+        Bring the vector store in line with the CV collection.  
+          
+        Vectorizes CVs that are missing from the store or carry an outdated  
+        version tag, and removes entries of CVs that no longer exist.  
+          
+        Args:  
+            repository: CVRepository giving access to the CVs  
+            batch_size: Number of CVs vectorized together  
+          
+        Returns:  
+            int: Number of CVs (re)vectorized  
+        """  
+        projection = {"competences": 1, "education": 1, "projets": 1, "experiences_professionnelles": 1}  
+        seen_ids = set()  
+        indexed = 0  
+        batch = []  
+        for cv in repository.find_all(projection):  
+            cv_id = str(cv["_id"])  
+            seen_ids.add(cv_id)  
+            entry = self.vector_store.get(cv_id)  
+            if entry is None or entry["version"] != self.vector_version:  
+                batch.append((cv_id, cv))  
+            if len(batch) >= batch_size:  
+                self.index_cvs(batch)  
+                indexed += len(batch)  
+                batch = []  
+        self.index_cvs(batch)  
+        indexed += len(batch)  
+          
+        for cv_id, _ in self.vector_store.items():  
+            if cv_id not in seen_ids:  
+                self.vector_store.delete(cv_id)  
+          
+        self.vector_store.set_meta("synced_version", self.vector_version)  
+        # Persist the store along with the IDF tally and ANN index built from it  
+        self.vector_store.compact()  
+        return indexed  
+      
+    def sync_corpus(self, repository):  
+        """  
+        Apply the changes of the CV collection to the vector store.  
+          
+        The first call starts the incremental synchronization (change stream,  
+        or high-water mark polling on standalone servers); later calls read  
+        at most one small delta query per poll interval.  
+          
+        Args:  
+            repository: CVRepository giving access to the CVs  
+          
+        Returns:  
+            int: Number of CVs (re)vectorized  
+        """  
+        if self.corpus_sync is None:  
+            self.corpus_sync = CorpusSync(self, repository)  
+            self.corpus_sync.start()  
+        return self.corpus_sync.poll()  
+      
+    def load_cv_matrix(self, entries):  
+        """  
+        Stack the stored CV vectors into a matrix with L2-normalized rows.  
+          
+        The matrix is cached until the vector store or the IDF weights change.  
+          
+        Args:  
+            entries: List of (cv_id, entry) tuples from the vector store  
+          
+        Returns:  
+            tuple: Sparse CSR matrix of TF-IDF vectors (or dense array of embeddings),  
+                and dictionary of the matrix row of each CV id  
+        """  
+        model_revision = self.vectorizer.revision if self.vectorizer_type == "tfidf" else None  
+        cache_key = (self.vector_store.revision, model_revision, len(entries))  
+        cached = _cv_matrix_cache.get(self.vector_version)  
+        if cached and cached[0] == cache_key:  
+            return cached[1], cached[2]  
+          
+        matrix = self.stack_vectors([entry["vector"] for _, entry in entries])  
+        positions = {cv_id: i for i, (cv_id, _) in enumerate(entries)}  
+        _cv_matrix_cache[self.vector_version] = (cache_key, matrix, positions)  
+        return matrix, positions  
+      
+    def stack_vectors(self, vectors):  
+        """  
+        Stack vectors computed by compute_cv_vector into a matrix with L2-normalized rows.  
+          
+        Args:  
+            vectors: List of stored vectors (term counts for TF-IDF, weighted with the current IDF)  
+          
+        Returns:  
+            matrix: Sparse CSR matrix of TF-IDF vectors, or dense array of embeddings  
+        """  
+        if self.vectorizer_type == "tfidf":  
+            return self.vectorizer.weight(sparse.vstack(vectors, format="csr"))  
+        return l2_normalize_rows(np.vstack(vectors))  
+      
+    def select_candidates(self, job_offer, min_skills=None, min_degree_level=None, min_experience_years=None):  
+        """  
+        Select the CVs passing the pre-filters of a job offer with the skill index.  
+          
+        Args:  
+            job_offer: Dictionary containing job offer information  
+            min_skills: Minimum number of required skills of the offer a CV must have,  
+                defaults to PREFILTER_MIN_SKILLS (0 disables the skill filter)  
+            min_degree_level: Minimum degree level in years after the baccalaureate (optional)  
+            min_experience_years: Minimum years of professional experience (optional)  
+          
+        Returns:  
+            set: Ids of the candidate CVs, or None if no filter applies  
+        """  
+        return self.skill_index.candidates(  
+            job_offer.get("competences_requises", []),  
+            min_skills=PREFILTER_MIN_SKILLS if min_skills is None else min_skills,  
+            min_degree_level=min_degree_level,  
+            min_experience_years=min_experience_years  
+        )  
+      
+    @timed("scoring")  
+    def rank_cvs(self, job_offer_vector, top_n, candidate_ids=None):  
+        """  
+        Find the stored CVs most similar to a job offer vector.  
+          
+        Uses the ANN index when one is configured, exact scoring otherwise.  
+        Pre-filtered candidates are always scored exactly: only their rows of  
+        the cached CV matrix are multiplied, or, for candidate sets covering  
+        most of the corpus, the non-candidates are dropped from an oversampled  
+        top of all CVs.  
+          
+        Args:  
+            job_offer_vector: Vector of the job offer  
+            top_n: Number of CVs to return  
+            candidate_ids: Ids of the CVs to score (optional, all CVs if None)  
+          
+        Returns:  
+            list: List of (cv_id, score) tuples, best first  
+        """  
+        if candidate_ids is None and self.ann_index is not None and len(self.ann_index) > 0:  
+            top_ids, top_scores = self.ann_index.search(job_offer_vector, top_n)  
+            return list(zip(top_ids, top_scores))  
+          
+        entries = self.vector_store.items(version=self.vector_version)  
+        if not entries:  
+            return []  
+        cv_ids = [cv_id for cv_id, _ in entries]  
+        cv_vectors, positions = self.load_cv_matrix(entries)  
+          
+        if candidate_ids is None or len(candidate_ids) >= PREFILTER_DENSE_RATIO * len(cv_ids):  
+            # Score all CVs in one sparse product and select the top_n CVs  
+            k = top_n if candidate_ids is None else top_n * PREFILTER_OVERSAMPLE  
+            top_indices, top_scores = top_k_cosine(job_offer_vector, cv_vectors, k)  
+            ranked = [(cv_ids[i], score) for i, score in zip(top_indices, top_scores)]  
+            if candidate_ids is None:  
+                return ranked  
+            ranked = [(cv_id, score) for cv_id, score in ranked if cv_id in candidate_ids][:top_n]  
+            if len(ranked) == top_n or len(top_indices) < k:  
+                return ranked  
+          
+        # Score only the rows of the candidates  
+        rows = self._candidate_rows(candidate_ids, positions)  
+        if not rows.size:  
+            return []  
+        top_indices, top_scores = top_k_cosine(job_offer_vector, cv_vectors[rows], top_n)  
+        return [(cv_ids[rows[i]], score) for i, score in zip(top_indices, top_scores)]  
+      
+    def _candidate_rows(self, candidate_ids, positions):  
+        """Return the sorted rows of the CV matrix holding the candidate CVs."""  
+        rows = np.fromiter((positions.get(cv_id, -1) for cv_id in candidate_ids), dtype=np.int64,  
+                           count=len(candidate_ids))  
+        return np.sort(rows[rows >= 0])  
+      
+    @timed("scoring")  
+    def rank_cvs_batch(self, job_offer_vectors, top_n, candidate_sets=None, chunk_rows=None):  
+        """  
+        Find the stored CVs most similar to each of several job offer vectors.  
+          
+        All offers are scored exactly with one offers x CVs matrix product,  
+        computed by chunks of CV rows to bound memory. Pre-filters are applied  
+        as in rank_cvs.  
+          
+        Args:  
+            job_offer_vectors: Matrix with one job offer vector per row  
+            top_n: Number of CVs to return per offer  
+            candidate_sets: Optional list with, for each offer, the ids of the CVs  
+                to score (None for all CVs)  
+            chunk_rows: Number of CV rows scored at a time, defaults to MATCH_BATCH_CHUNK_ROWS  
+          
+        Returns:  
+            list: For each offer, list of (cv_id, score) tuples, best first  
+        """  
+        n_offers = job_offer_vectors.shape[0]  
+        entries = self.vector_store.items(version=self.vector_version)  
+        if not entries:  
+            return [[] for _ in range(n_offers)]  
+        cv_ids = [cv_id for cv_id, _ in entries]  
+        cv_vectors, positions = self.load_cv_matrix(entries)  
+          
+        # Small candidate sets restrict the scored rows, large ones are applied after scoring  
+        candidate_sets = candidate_sets or [None] * n_offers  
+        dense = [candidates is not None and len(candidates) >= PREFILTER_DENSE_RATIO * len(cv_ids)  
+                 for candidates in candidate_sets]  
+        allowed_rows = [  
+            None if candidates is None or is_dense else self._candidate_rows(candidates, positions)  
+            for candidates, is_dense in zip(candidate_sets, dense)  
+        ]  
+        k = top_n * PREFILTER_OVERSAMPLE if any(dense) else top_n  
+          
+        results = top_k_cosine_batch(  
+            job_offer_vectors, cv_vectors, k,  
+            chunk_rows=chunk_rows or BATCH_CHUNK_ROWS,  
+            allowed_rows=allowed_rows  
+        )  
+          
+        ranked = []  
+        for j, (top_indices, top_scores) in enumerate(results):  
+            top_cvs = [(cv_ids[i], score) for i, score in zip(top_indices, top_scores)]  
+            if dense[j]:  
+                top_cvs = [(cv_id, score) for cv_id, score in top_cvs if cv_id in candidate_sets[j]]  
+                if len(top_cvs) < top_n and len(top_indices) == k:  
+                    # Too few candidates in the oversampled top: score this offer alone  
+                    top_cvs = self.rank_cvs(job_offer_vectors[j], top_n, candidate_sets[j])  
+            ranked.append(top_cvs[:top_n])  
+        return ranked  
+      
+    def evaluate_ann_recall(self, k=10, sample_size=100, queries=None):  
+        """  
+        Compare the ANN index with exact search on the stored CVs.  
+          
+        Args:  
+            k: Number of neighbours compared  
+            sample_size: Number of stored CV vectors used as queries (if queries is not provided)  
+            queries: Query vectors (optional)  
+          
+        Returns:  
+            dict: Recall@k and average latencies, or None if no ANN index is configured  
+        """  
+        if self.ann_index is None:  
+            return None  
+        entries = self.vector_store.items(version=self.vector_version)  
+        if not entries:  
+            return None  
+        cv_ids = [cv_id for cv_id, _ in entries]  
+        matrix, _ = self.load_cv_matrix(entries)  
+        if queries is None:  
+            rng = np.random.default_rng(0)  
+            queries = matrix[rng.choice(matrix.shape[0], min(sample_size, matrix.shape[0]), replace=False)]  
+          
+        report = recall_at_k(self.ann_index, matrix, cv_ids, queries, k=k)  
+        report["backend"] = self.ann_index.backend  
+        report["corpus_size"] = len(cv_ids)  
+        logger.info(f"ANN recall@{k} ({report['backend']}, {len(cv_ids)} CVs): {report['recall_at_k']:.3f}")  
+        return report  
+      
+      
+    def recommend_cvs(self, job_offer, top_n=5, min_skills=None, min_degree_level=None, min_experience_years=None):  
         """  
         Recommend the most relevant CVs for a job offer.  
           
+        CVs are first pre-filtered with the skill index (required skills,  
+        degree level, experience); only the remaining candidates are scored.  
+          
         Args:  
             job_offer: Dictionary containing job offer information  
             top_n: Number of CVs to recommend  
+            min_skills: Minimum number of required skills of the offer a CV must have,  
+                defaults to PREFILTER_MIN_SKILLS (0 disables the skill filter)  
+            min_degree_level: Minimum degree level in years after the baccalaureate (optional)  
+            min_experience_years: Minimum years of professional experience (optional)  
               
         Returns:  
             recommendations: List of recommended CVs with their similarity score  
@@ -165,59 +523,141 @@ class VectorRecommender:
             return []  
           
         try:  
-            # Connect to MongoDB  
-            client = pymongo.MongoClient(self.mongodb_uri)  
-            db = client.get_default_database()  
-            collection = db.cvs  
+            # CVs are read through the shared MongoDB connection pool  
+            repository = CVRepository(self.mongodb_uri)  
+            self.load_corpus(repository)  
               
-            # Retrieve all CVs  
-            cvs = list(collection.find())  
+            with span("prefilter"):  
+                candidate_ids = self.select_candidates(job_offer, min_skills, min_degree_level, min_experience_years)  
+            if candidate_ids is not None and not candidate_ids:  
+                return []  
               
             # Preprocess job offer  
             job_offer_text = self.preprocess_job_offer(job_offer)  
               
-            # Preprocess CVs  
-            cv_texts = [self.preprocess_cv(cv) for cv in cvs]  
+            # CV vectors are precomputed: only the job offer is vectorized  
+            with span("vectorization"):  
+                job_offer_vector = self.vectorize_texts([job_offer_text])[0]  
+            top_cvs = self.rank_cvs(job_offer_vector, top_n, candidate_ids)  
+            if not top_cvs:  
+                return []  
               
-            # Vectorize job offer and CVs  
-            if self.vectorizer_type == "tfidf":  
-                # For TF-IDF, we need to vectorize all texts together  
-                all_texts = [job_offer_text] + cv_texts  
-                all_vectors = self.vectorize_texts(all_texts)  
-                job_offer_vector = all_vectors[0]  
-                cv_vectors = all_vectors[1:]  
-            else:  
-                # For other methods, we can vectorize separately  
-                job_offer_vector = self.vectorize_text(job_offer_text)  
-                cv_vectors = [self.vectorize_text(cv_text) for cv_text in cv_texts]  
+            return self.build_recommendations(repository, [top_cvs])[0]  
               
-            # Calculate similarity scores  
-            similarities = []  
-            for i, cv_vector in enumerate(cv_vectors):  
-                similarity = self.calculate_similarity(job_offer_vector, cv_vector)  
-                similarities.append((cvs[i], similarity))  
+        except Exception as e:  
+            print(f"Error recommending CVs: {e}")  
+            return []  
+      
+    def recommend_cvs_batch(self, job_offers, top_n=5, prefilters=None):  
+        """  
+        Recommend the most relevant CVs for several job offers in one pass.  
+          
+        The corpus is synchronized once, all offers are vectorized together and  
+        scored with a single offers x CVs matrix product, and the recommended  
+        CV documents are loaded with one query.  
+          
+        Args:  
+            job_offers: List of dictionaries containing job offer information  
+            top_n: Number of CVs to recommend per offer  
+            prefilters: Optional list with, for each offer, a dictionary of  
+                recommend_cvs pre-filter arguments (min_skills, min_degree_level,  
+                min_experience_years)  
+          
+        Returns:  
+            list: For each offer, list of recommended CVs with their similarity score  
+        """  
+        if not job_offers:  
+            return []  
+        if not self.mongodb_uri:  
+            print("WARNING: No MongoDB URI provided. Unable to load CVs.")  
+            return [[] for _ in job_offers]  
+          
+        try:  
+            repository = CVRepository(self.mongodb_uri)  
+            self.load_corpus(repository)  
               
-            # Sort CVs by similarity score in descending order  
-            similarities.sort(key=lambda x: x[1], reverse=True)  
+            prefilters = prefilters or [{}] * len(job_offers)  
+            with span("prefilter"):  
+                candidate_sets = [  
+                    self.select_candidates(job_offer, **(prefilter or {}))  
+                    for job_offer, prefilter in zip(job_offers, prefilters)  
+                ]  
               
-            # Select top_n CVs  
-            top_cvs = similarities[:top_n]  
+            with span("vectorization"):  
+                job_offer_vectors = self.vectorize_texts([self.preprocess_job_offer(offer) for offer in job_offers])  
+            ranked = self.rank_cvs_batch(job_offer_vectors, top_n, candidate_sets)  
               
-            # Format recommendations  
+            return self.build_recommendations(repository, ranked)  
+          
+        except Exception as e:  
+            print(f"Error recommending CVs: {e}")  
+            return [[] for _ in job_offers]  
+      
+    def load_corpus(self, repository):  
+        """  
+        Bring the vector store up to date before a search.  
+          
+        Picks up vectors saved by other processes, backfills the store once  
+        for CVs inserted before it existed, then applies the changes made to  
+        the collection since the last query.  
+          
+        Args:  
+            repository: CVRepository giving access to the CVs  
+        """  
+        with span("corpus_load"):  
+            self.vector_store.refresh()  
+            if self.vector_store.get_meta("synced_version") != self.vector_version:  
+                self.sync_from_mongodb(repository)  
+            self.sync_corpus(repository)  
+      
+    def corpus_version(self):  
+        """  
+        Return a version of the stored corpus, changing whenever a CV is vectorized or removed.  
+          
+        Only the local vector store files are read (changes saved by other  
+        processes are picked up), not MongoDB.  
+          
+        Returns:  
+            tuple: Vector version tag and corpus version of the store  
+        """  
+        self.vector_store.refresh()  
+        return self.vector_version, self.vector_store.corpus_version  
+      
+    def build_recommendations(self, repository, ranked):  
+        """  
+        Load the ranked CV documents and format them as recommendations.  
+          
+        Args:  
+            repository: CVRepository giving access to the CVs  
+            ranked: List of rankings, each a list of (cv_id, score) tuples  
+          
+        Returns:  
+            list: For each ranking, list of recommended CVs with their similarity score  
+        """  
+        # Load only the recommended CV documents, in one query for all rankings  
+        cv_ids = list(dict.fromkeys(cv_id for top_cvs in ranked for cv_id, _ in top_cvs))  
+        if not cv_ids:  
+            return [[] for _ in ranked]  
+        with span("corpus_load"):  
+            cvs = repository.find_by_ids(cv_ids)  
+          
+        results = []  
+        for top_cvs in ranked:  
             recommendations = []  
-            for cv, score in top_cvs:  
+            for cv_id, score in top_cvs:  
+                cv = cvs.get(cv_id)  
+                if cv is None:  
+                    # CV deleted since it was vectorized  
+                    self.vector_store.delete(cv_id)  
+                    continue  
                 recommendation = {  
                     "cv": cv,  
                     "score": float(score),  # Convert to float for JSON serialization  
                     "raison": f"Similarity score: {score:.2f}"  
                 }  
                 recommendations.append(recommendation)  
-              
-            return recommendations  
-              
-        except Exception as e:  
-            print(f"Error recommending CVs: {e}")  
-            return []  
+            results.append(recommendations)  
+        return results  
       
     def save_recommendations_to_file(self, recommendations, output_file):  
         """  
@@ -232,7 +672,7 @@ class VectorRecommender:
         """  
         try:  
             with open(output_file, 'w', encoding='utf-8') as f:  
-                json.dump(recommendations, f, ensure_ascii=False, indent=2)  
+                json.dump(recommendations, f, ensure_ascii=False, indent=2, default=str)  # ObjectIds as strings  
             print(f"Recommendations saved to {output_file}")  
             return True  
         except Exception as e:  
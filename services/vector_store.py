@@ -0,0 +1,319 @@
+import os
+import pickle
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+class CVVectorStore:
+    """
+    Persistent store of precomputed CV vectors.
+
+    Each entry is keyed by the MongoDB id of the CV and holds the preprocessed
+    CV text, its vector and the version tag of the vectorizer that produced it.
+    Writes are appended to a journal file and folded into a snapshot on
+    compaction, so saving one CV never rewrites the whole store.
+
+    Observers (such as the TF-IDF document frequency tally) can be attached
+    to follow every change applied to the store, including changes written by
+    other processes. Their state is saved in the snapshot along with the entries.
+    """
+
+    def __init__(self, store_dir="data/vectors", namespace="default", compact_every=1000):
+        """
+        Initialize the vector store and load its content from disk.
+
+        Args:
+            store_dir: Directory where the store files are kept
+            namespace: Name of the store (one per vectorizer)
+            compact_every: Number of journal records after which the journal is compacted
+        """
+        self.store_dir = store_dir
+        self.namespace = namespace
+        self.compact_every = compact_every
+        self.snapshot_path = os.path.join(store_dir, f"{namespace}.pkl")
+        self.journal_path = os.path.join(store_dir, f"{namespace}.journal")
+        self.lock_path = os.path.join(store_dir, f"{namespace}.lock")
+
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._meta = {}
+        self._observers = {}
+        self._journal_offset = 0
+        self._journal_records = 0
+        self._snapshot_stamp = None
+        self.revision = 0
+        # Bumped when entries are added, replaced or removed (not on metadata changes)
+        self.corpus_version = 0
+
+        os.makedirs(store_dir, exist_ok=True)
+        self._load()
+
+    def _file_lock(self, exclusive=True):
+        """Return an open lock file, locked across processes when supported."""
+        handle = open(self.lock_path, "a")
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return handle
+
+    def _stamp(self, path):
+        """Return a value identifying the current version of a file."""
+        try:
+            stat = os.stat(path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _apply(self, record):
+        """Apply a single journal record to the in-memory entries."""
+        op = record.get("op")
+        if op == "put":
+            old_entry = self._entries.get(record["id"])
+            self._entries[record["id"]] = record["entry"]
+            self._notify(record["id"], old_entry, record["entry"])
+            self.corpus_version += 1
+        elif op == "delete":
+            old_entry = self._entries.pop(record["id"], None)
+            self._notify(record["id"], old_entry, None)
+            self.corpus_version += 1
+        elif op == "meta":
+            self._meta.update(record["meta"])
+        self.revision += 1
+
+    def _notify(self, cv_id, old_entry, new_entry):
+        """Forward a change of entry to the attached observers."""
+        for observer in self._observers.values():
+            observer.update(cv_id, old_entry, new_entry)
+
+    def _sync(self):
+        """
+        Catch up with the changes written by other processes. Called with the file lock held.
+
+        A new snapshot means another process compacted the store: its journal
+        offsets no longer match ours, so the snapshot is reloaded first.
+        """
+        if self._stamp(self.snapshot_path) != self._snapshot_stamp:
+            self._load(locked=True)
+        else:
+            self._replay_journal()
+
+    def _replay_journal(self):
+        """Apply the journal records written since the last replay."""
+        if not os.path.exists(self.journal_path):
+            self._journal_offset = 0
+            return
+
+        with open(self.journal_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < self._journal_offset:
+                # The journal was truncated by a compaction in another process
+                self._load(locked=True)
+                return
+            f.seek(self._journal_offset)
+            while True:
+                position = f.tell()
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception as e:
+                    # A partially written record: stop here and retry on next refresh
+                    logger.warning(f"Incomplete journal record in {self.journal_path}: {e}")
+                    f.seek(position)
+                    break
+                self._apply(record)
+                self._journal_records += 1
+            self._journal_offset = f.tell()
+
+    def _load(self, locked=False):
+        """
+        Load the snapshot and replay the journal.
+
+        Args:
+            locked: True if the caller already holds the file lock
+        """
+        with self._lock:
+            self._entries = {}
+            self._meta = {}
+            self._journal_offset = 0
+            self._journal_records = 0
+
+            lock = None if locked else self._file_lock(exclusive=False)
+            try:
+                self._snapshot_stamp = self._stamp(self.snapshot_path)
+                if self._snapshot_stamp is not None:
+                    with open(self.snapshot_path, "rb") as f:
+                        snapshot = pickle.load(f)
+                    self._entries = snapshot.get("entries", {})
+                    self._meta = snapshot.get("meta", {})
+                    states = snapshot.get("observers", {})
+                else:
+                    states = {}
+
+                for name, observer in self._observers.items():
+                    if states.get(name) is None or not observer.restore(states[name]):
+                        observer.rebuild(self._entries.items())
+                self._replay_journal()
+            finally:
+                if lock:
+                    lock.close()
+
+            self.revision += 1
+            self.corpus_version += 1
+            logger.debug(f"Vector store '{self.namespace}' loaded with {len(self._entries)} entries")
+
+    def _append(self, record):
+        """Append a record to the journal and apply it in memory."""
+        with self._lock:
+            lock = self._file_lock()
+            try:
+                # Pick up records written by other processes first
+                self._sync()
+                with open(self.journal_path, "ab") as f:
+                    pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    f.flush()
+                    self._journal_offset = f.tell()
+                self._apply(record)
+                self._journal_records += 1
+            finally:
+                lock.close()
+
+            if self._journal_records >= self.compact_every:
+                self.compact()
+
+    def refresh(self):
+        """
+        Pick up changes written to disk by other processes.
+
+        Returns:
+            int: Current revision of the store
+        """
+        with self._lock:
+            lock = self._file_lock(exclusive=False)
+            try:
+                self._sync()
+            finally:
+                lock.close()
+            return self.revision
+
+    def compact(self):
+        """Write all entries to a new snapshot and empty the journal."""
+        with self._lock:
+            lock = self._file_lock()
+            try:
+                # Never write stale entries over a snapshot compacted by another process
+                self._sync()
+                tmp_path = f"{self.snapshot_path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    snapshot = {
+                        "entries": self._entries,
+                        "meta": self._meta,
+                        "observers": {name: observer.state() for name, observer in self._observers.items()},
+                    }
+                    pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.snapshot_path)
+                open(self.journal_path, "wb").close()
+                self._journal_offset = 0
+                self._journal_records = 0
+                self._snapshot_stamp = self._stamp(self.snapshot_path)
+            finally:
+                lock.close()
+            logger.debug(f"Vector store '{self.namespace}' compacted ({len(self._entries)} entries)")
+
+    def attach(self, name, observer):
+        """
+        Attach an observer following the changes applied to the store.
+
+        The observer must implement rebuild(items), update(cv_id, old_entry, new_entry),
+        state() and restore(state). The store is reloaded so the observer starts
+        from the saved snapshot state and sees every journal record after it.
+
+        Args:
+            name: Name under which the observer state is saved in the snapshot
+            observer: Observer instance
+        """
+        with self._lock:
+            self._observers[name] = observer
+            self._load()
+
+    def put(self, cv_id, text, vector, version, attributes=None):
+        """
+        Add or replace the vector of a CV.
+
+        Args:
+            cv_id: Identifier of the CV document
+            text: Preprocessed CV text
+            vector: Vector of the CV (None if it is computed at query time)
+            version: Version tag of the vectorizer that produced the vector
+            attributes: Fields of the CV used by the pre-filters (see skill_index.cv_attributes)
+        """
+        entry = {"text": text, "vector": vector, "version": version}
+        if attributes is not None:
+            entry["attributes"] = attributes
+        self._append({"op": "put", "id": str(cv_id), "entry": entry})
+
+    def delete(self, cv_id):
+        """Remove the vector of a CV."""
+        if str(cv_id) in self._entries:
+            self._append({"op": "delete", "id": str(cv_id)})
+
+    def get(self, cv_id):
+        """Return the entry of a CV, or None if it is not stored."""
+        return self._entries.get(str(cv_id))
+
+    def items(self, version=None):
+        """
+        Return the stored entries.
+
+        Args:
+            version: If provided, only entries with this version tag are returned
+
+        Returns:
+            list: List of (cv_id, entry) tuples
+        """
+        with self._lock:
+            return [(cv_id, entry) for cv_id, entry in self._entries.items()
+                    if version is None or entry["version"] == version]
+
+    def get_meta(self, key, default=None):
+        """Return a metadata value of the store."""
+        return self._meta.get(key, default)
+
+    def set_meta(self, key, value):
+        """Persist a metadata value of the store."""
+        self._append({"op": "meta", "meta": {key: value}})
+
+    def __contains__(self, cv_id):
+        return str(cv_id) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(namespace, store_dir=None):
+    """
+    Return the process-wide vector store for a namespace.
+
+    Args:
+        namespace: Name of the store (one per vectorizer)
+        store_dir: Directory of the store (defaults to VECTOR_STORE_DIR or data/vectors)
+
+    Returns:
+        CVVectorStore: Shared store instance
+    """
+    store_dir = store_dir or os.environ.get("VECTOR_STORE_DIR", "data/vectors")
+    key = (os.path.abspath(store_dir), namespace)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = CVVectorStore(store_dir=store_dir, namespace=namespace)
+        return _stores[key]
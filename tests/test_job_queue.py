@@ -0,0 +1,118 @@
+import io
+import time
+from datetime import datetime
+import pytest
+from services.job_queue import JobQueue, WorkerPool
+
+
+def wait_for_status(get_job, statuses=("done", "failed"), timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_job()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job still {job['status']} after {timeout}s")
+
+
+def ingestion_result(payload, set_stage):
+    # Shaped like process_cv_file's result, with a value json cannot serialize natively
+    set_stage("structuring")
+    return {"success": True, "id": "abc", "cv_data": {"nom": "Alami"}, "saved_at": datetime(2024, 1, 2)}
+
+
+def test_worker_pool_runs_a_job_end_to_end(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    pool = WorkerPool(queue, {"cv_ingestion": ingestion_result}, workers=1, poll_interval=0.05)
+    pool.start()
+    try:
+        job_id = queue.enqueue("cv_ingestion", {"file_path": "cv.pdf"})
+        pool.notify()
+        job = wait_for_status(lambda: queue.get(job_id))
+    finally:
+        pool.stop()
+
+    assert job["status"] == "done", job["error"]
+    assert job["stage"] == "structuring"
+    assert job["attempts"] == 1
+    assert job["result"]["cv_data"] == {"nom": "Alami"}
+    assert job["result"]["saved_at"] == "2024-01-02 00:00:00"
+
+
+def test_handler_errors_fail_the_job(tmp_path):
+    def broken(payload, set_stage):
+        raise ValueError("unreadable PDF")
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    pool = WorkerPool(queue, {"cv_ingestion": broken}, workers=1, poll_interval=0.05)
+    pool.start()
+    try:
+        job_id = queue.enqueue("cv_ingestion", {})
+        job = wait_for_status(lambda: queue.get(job_id))
+    finally:
+        pool.stop()
+
+    assert job["status"] == "failed"
+    assert job["error"] == "unreadable PDF"
+
+
+def test_only_the_lease_holder_records_the_outcome(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0)
+    job_id = queue.enqueue("cv_ingestion", {})
+    first = queue.claim()
+    assert queue.requeue_stale() == (1, 0)
+    second = queue.claim()
+
+    assert not queue.complete(job_id, first["lease_token"], {"worker": 1})
+    assert not queue.fail(job_id, first["lease_token"], "late failure")
+    assert queue.complete(job_id, second["lease_token"], {"worker": 2})
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == {"worker": 2}
+
+
+def test_interrupted_job_fails_after_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0, max_attempts=2)
+    job_id = queue.enqueue("cv_ingestion", {})
+    queue.claim()
+    assert queue.requeue_stale() == (1, 0)
+    queue.claim()
+    assert queue.requeue_stale() == (0, 1)
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert queue.claim() is None
+
+
+def test_async_upload_reports_the_job_through_jobs_route(tmp_path, monkeypatch):
+    pytest.importorskip("sentence_transformers")
+    import app as app_module
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("INGESTION_QUEUE_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setitem(app_module._ingestion, "queue", None)
+    monkeypatch.setitem(app_module._ingestion, "workers", None)
+    monkeypatch.setattr(app_module, "get_mongodb_client", lambda: None)
+    monkeypatch.setattr(app_module, "get_vector_recommender", lambda vectorizer_type=None: None)
+    monkeypatch.setattr(app_module, "get_shortlist_service", lambda: None)
+    monkeypatch.setattr(app_module, "process_cv_file", lambda file_path, on_stage, **kwargs: ingestion_result(
+        {"file_path": file_path}, on_stage
+    ))
+
+    client = app_module.app.test_client()
+    response = client.post(
+        "/upload-cv",
+        data={"async": "1", "cv_file": (io.BytesIO(b"%PDF-1.4"), "cv.pdf")},
+        content_type="multipart/form-data"
+    )
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    try:
+        job = wait_for_status(lambda: client.get(f"/jobs/{job_id}").get_json())
+    finally:
+        app_module._ingestion["workers"].stop()
+    assert job["status"] == "done", job["error"]
+    assert job["success"]
+    assert job["result"]["id"] == "abc"
@@ -0,0 +1,81 @@
+import pytest
+from services.json_stream import IncrementalJSONParser, parse_tolerant
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Prose and code fences around the object
+    ('```json\n{"nom": "Alami"}\n```', {"nom": "Alami"}),
+    ('Voici le CV structuré :\n{"nom": "Alami"}\nBonne journée', {"nom": "Alami"}),
+    # Missing commas
+    ('{"nom": "Alami" "prenom": "Sara"}', {"nom": "Alami", "prenom": "Sara"}),
+    ('{"langues": ["Arabe" "Français"]}', {"langues": ["Arabe", "Français"]}),
+    ('{"a": {"b": 1}\n"c": 2}', {"a": {"b": 1}, "c": 2}),
+    # Missing colons
+    ('{"nom" "Alami"}', {"nom": "Alami"}),
+    ('{"a" [1, 2]}', {"a": [1, 2]}),
+    # Trailing commas
+    ('{"langues": ["Arabe", "Français",],}', {"langues": ["Arabe", "Français"]}),
+    ('{"a": 1, "b": }', {"a": 1}),
+    # Stray closing brackets
+    ('{"a": [1, 2]]}', {"a": [1, 2]}),
+    ('{"a": {"b": 1}}}]', {"a": {"b": 1}}),
+    ('{"a": [1, {"b": 2]}', {"a": [1, {"b": 2}]}),
+    # Duplicate keys are kept under numbered names
+    ('{"description": "a", "description": "b", "description": "c"}',
+     {"description": "a", "description2": "b", "description3": "c"}),
+    # Raw control characters in strings
+    ('{"description": "ligne 1\nligne 2\tfin"}', {"description": "ligne 1\nligne 2\tfin"}),
+    ('{"a": "x\\"y"}', {"a": 'x"y'}),
+    # Python literals and unquoted words
+    ('{"a": True, "b": False, "c": None}', {"a": True, "b": False, "c": None}),
+    ('{"niveau": avancé}', {"niveau": "avancé"}),
+    ('{"a": 1., "b": -2.5e3}', {"a": 1.0, "b": -2500.0}),
+])
+def test_parse_tolerant_repairs_malformed_output(text, expected):
+    assert parse_tolerant(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    # The open containers are closed
+    ('{"a": {"b": "x"', {"a": {"b": "x"}}),
+    ('{"a": {"b": 1', {"a": {"b": 1}}),
+    # A number cut by the end of the text is kept
+    ('{"a": [1, 2', {"a": [1, 2]}),
+    ('{"a": 1.', {"a": 1.0}),
+    ('{"a": true', {"a": True}),
+    # An incomplete string, key or word is dropped
+    ('{"a": 1, "b": "tronq', {"a": 1}),
+    ('{"a": 1, "b', {"a": 1}),
+    ('{"a": 1, "b": tru', {"a": 1}),
+    ('{"a": [1, 2, "x', {"a": [1, 2]}),
+    ('{"a": 1, "b":', {"a": 1}),
+])
+def test_parse_tolerant_recovers_truncated_output(text, expected):
+    assert parse_tolerant(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "Pas de JSON ici", "[1, 2, 3]"])
+def test_parse_tolerant_without_object(text):
+    assert parse_tolerant(text) is None
+
+
+def test_parser_stops_after_the_object():
+    parser = IncrementalJSONParser().feed('{"a": 1} {"b": 2}')
+    assert parser.done
+    assert parser.result() == {"a": 1}
+
+
+def test_streamed_chunks_give_the_same_result():
+    text = '```json\n{"nom": "Alami" "competences": {"langages": ["Python", "SQL",]}, "projets": [{"nom" "CV"}]}'
+    parser = IncrementalJSONParser()
+    for ch in text:
+        parser.feed(ch)
+    assert parser.result() == parse_tolerant(text)
+
+
+def test_has_sections_once_members_are_complete():
+    parser = IncrementalJSONParser().feed('{"nom": "Alami", "competences": ["Python"')
+    assert parser.has_sections(["nom"])
+    assert not parser.has_sections(["nom", "competences"])
+    parser.feed('], "projets": []')
+    assert parser.has_sections(["nom", "competences", "projets"])
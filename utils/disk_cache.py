@@ -0,0 +1,223 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+import tempfile
+import threading
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "data/cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Size-bounded on-disk key/value cache.
+
+    Each value is pickled in its own file, named after the hash of its key.
+    Files are replaced atomically, so the cache can be shared by several
+    processes. When the total size exceeds the limit, the least recently
+    used entries (by file modification time, refreshed on read) are evicted.
+    Entries can also expire a fixed time after they were written.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding the cache files
+            max_bytes: Maximum total size of the cache files
+            ttl: Default lifetime of the entries in seconds (None for no expiry)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(size for _, size, _ in self._scan())
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0}
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".pkl")
+
+    def _scan(self):
+        """List the cache files as (mtime, size, path) tuples."""
+        entries = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def get(self, key, default=None):
+        """
+        Return the value of a key, or default if it is not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return default
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            self.stats["misses"] += 1
+            return default
+
+        if expires_at is not None and expires_at < time.time():
+            self._remove(path)
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return default
+
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Cache the value of a key, evicting old entries if the cache is full.
+
+        Args:
+            key: Key of the entry
+            value: Picklable value
+            ttl: Lifetime of the entry in seconds (defaults to the cache's ttl)
+        """
+        ttl = ttl or self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        data = pickle.dumps((expires_at, value), protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous_size = os.path.getsize(path)
+        except OSError:
+            previous_size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+        with self._lock:
+            self.stats["writes"] += 1
+            self._size += len(data) - previous_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        """Remove a key from the cache."""
+        self._remove(self._path(key))
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache is back under 90% of its limit."""
+        entries = sorted(self._scan())
+        # Rescanning also accounts for the entries written by other processes
+        self._size = sum(size for _, size, _ in entries)
+        target = 0.9 * self.max_bytes
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """Remove all the entries."""
+        for _, _, path in self._scan():
+            self._remove(path)
+
+    def metrics(self):
+        """
+        Return the usage statistics of the cache.
+
+        Returns:
+            dict: Counters, hit rate and total size in bytes
+        """
+        metrics = dict(self.stats)
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = metrics["hits"] / lookups if lookups else None
+        metrics["size_bytes"] = self._size
+        metrics["max_bytes"] = self.max_bytes
+        return metrics
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_disk_cache(name, cache_dir=None, max_bytes=None, ttl=None):
+    """
+    Return the process-wide cache of a name, stored in a subdirectory of the cache directory.
+
+    The cache directory and size limit default to the CACHE_DIR and
+    CACHE_MAX_BYTES environment variables.
+
+    Args:
+        name: Name of the cache
+        cache_dir: Root directory of the caches (optional)
+        max_bytes: Maximum total size of this cache (optional)
+        ttl: Default lifetime of the entries in seconds (optional)
+
+    Returns:
+        DiskCache: Shared cache
+    """
+    cache_dir = os.path.join(cache_dir or os.environ.get("CACHE_DIR", DEFAULT_CACHE_DIR), name)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = DiskCache(
+                cache_dir,
+                max_bytes or int(os.environ.get("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                ttl
+            )
+        return _caches[cache_dir]
+
+
+def cache_metrics():
+    """Return the usage statistics of the process-wide caches, by directory."""
+    with _caches_lock:
+        return {cache_dir: cache.metrics() for cache_dir, cache in _caches.items()}
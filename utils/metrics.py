@@ -0,0 +1,185 @@
+import time
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Spans of the request being served, for the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters and latency histograms.
+
+    Metrics are identified by a name and a set of labels, and are rendered
+    in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        """Set the help text of a metric."""
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a value (in seconds) in a histogram."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self):
+        """
+        Return the current values of the metrics.
+
+        Returns:
+            dict: Counters and histograms (count, sum and mean) by name and labels
+        """
+        with self._lock:
+            counters = {f"{name}{_format_labels(labels)}": value for (name, labels), value in self._counters.items()}
+            histograms = {
+                f"{name}{_format_labels(labels)}": {
+                    "count": h["count"],
+                    "sum": h["sum"],
+                    "mean": h["sum"] / h["count"] if h["count"] else None
+                }
+                for (name, labels), h in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for metric_type, items in (("counter", self._counters), ("histogram", self._histograms)):
+                seen = set()
+                for name, labels in sorted(items):
+                    if name not in seen:
+                        seen.add(name)
+                        if name in self._help:
+                            lines.append(f"# HELP {name} {self._help[name]}")
+                        lines.append(f"# TYPE {name} {metric_type}")
+                    value = items[(name, labels)]
+                    if metric_type == "counter":
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(self.buckets, value["buckets"]):
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Remove all the recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+registry.describe("stage_duration_seconds", "Duration of the processing stages")
+registry.describe("stage_errors_total", "Processing stages that raised an exception")
+registry.describe("http_request_duration_seconds", "Duration of the HTTP requests")
+registry.describe("llm_tokens_total", "Tokens sent to and received from the LLM")
+registry.describe("llm_call_duration_seconds", "Duration of the LLM calls")
+registry.describe("ocr_pages_total", "PDF pages run through OCR")
+registry.describe("ocr_failures_total", "PDF pages whose OCR failed")
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a processing stage.
+
+    The duration is recorded in the stage_duration_seconds histogram, failures
+    in stage_errors_total, and the span is added to the timings of the current
+    request (Server-Timing header) when they are collected.
+
+    Args:
+        stage: Name of the stage
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.inc("stage_errors_total", stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("stage_duration_seconds", elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def timed(stage):
+    """Decorator running a function within a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request_timings():
+    """Start collecting the spans of the current request."""
+    _request_timings.set([])
+
+
+def request_timings():
+    """Return the (stage, seconds) spans collected for the current request."""
+    return _request_timings.get() or []
+
+
+def server_timing_header(timings):
+    """
+    Format spans as a Server-Timing header value.
+    Spans of the same stage are added up.
+    """
+    totals = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items())
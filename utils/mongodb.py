@@ -1,8 +1,565 @@
-from utils.mongodb import get_cv_collection
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from pymongo import MongoClient, ReplaceOne, ReturnDocument, UpdateOne, ASCENDING, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
 
-def recommander_cvs(offre):
-    collection = get_cv_collection()
-    cvs = list(collection.find())  # récupère tous les CVs
+# Initialize logger
+logger = logging.getLogger(__name__)
 
-    # logique de recommandation ici...
-    return cvs
+DEFAULT_MONGODB_URI = "mongodb://mongo:27017/cv_database"
+DEFAULT_DATABASE = "cv_database"
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Collects connection pool metrics from the pymongo monitoring events.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {
+            "pools_created": 0,
+            "pools_cleared": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkins": 0,
+        }
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def _incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        """
+        Return the current metrics.
+
+        Returns:
+            dict: Counters, open and in-use connections, checkout wait times in milliseconds
+        """
+        with self._lock:
+            metrics = dict(self.counters)
+            metrics["connections_open"] = metrics["connections_created"] - metrics["connections_closed"]
+            metrics["connections_in_use"] = metrics["checkouts"] - metrics["checkins"]
+            metrics["checkout_wait_avg_ms"] = 1000 * self.checkout_wait_total / max(metrics["checkouts"], 1)
+            metrics["checkout_wait_max_ms"] = 1000 * self.checkout_wait_max
+            return metrics
+
+    def pool_created(self, event):
+        self._incr("pools_created")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("connections_closed")
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._incr("checkout_failures")
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+        with self._lock:
+            self.counters["checkouts"] += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def connection_checked_in(self, event):
+        self._incr("checkins")
+
+
+pool_metrics_listener = PoolMetrics()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(mongodb_uri=None):
+    """
+    Return the process-wide MongoDB client of a URI.
+
+    The client owns a connection pool shared by all requests and services.
+    Pool settings are read from the MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE,
+    MONGODB_MAX_IDLE_TIME_MS, MONGODB_WAIT_QUEUE_TIMEOUT_MS and
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS environment variables.
+
+    Args:
+        mongodb_uri: MongoDB connection URI (defaults to MONGODB_URI)
+
+    Returns:
+        MongoClient: Shared client
+    """
+    mongodb_uri = mongodb_uri or os.environ.get("MONGODB_URI", DEFAULT_MONGODB_URI)
+    # A client must not be shared with forked worker processes
+    key = (mongodb_uri, os.getpid())
+    with _clients_lock:
+        if key not in _clients:
+            logger.debug(f"Creating MongoDB client for URI: {mongodb_uri}")
+            _clients[key] = MongoClient(
+                mongodb_uri,
+                maxPoolSize=int(os.environ.get("MONGODB_MAX_POOL_SIZE", 50)),
+                minPoolSize=int(os.environ.get("MONGODB_MIN_POOL_SIZE", 0)),
+                maxIdleTimeMS=int(os.environ.get("MONGODB_MAX_IDLE_TIME_MS", 300000)),
+                waitQueueTimeoutMS=int(os.environ.get("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 10000)),
+                serverSelectionTimeoutMS=int(os.environ.get("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+                event_listeners=[pool_metrics_listener]
+            )
+        return _clients[key]
+
+
+def get_database(mongodb_uri=None, client=None):
+    """
+    Return the database named in the URI, or cv_database if the URI names none.
+
+    Args:
+        mongodb_uri: MongoDB connection URI (optional)
+        client: MongoDB client to use instead of the shared one (optional)
+    """
+    client = client or get_client(mongodb_uri)
+    return client.get_default_database(default=DEFAULT_DATABASE)
+
+
+# Secondary indexes, by collection: (keys, options)
+INDEXES = {
+    "cvs": [
+        # /api/get-cv lookups
+        ([("informations_personnelles.email", ASCENDING)], {"name": "email"}),
+        # Upserts; CVs written before dedup keys existed have none
+        ([("dedup_key", ASCENDING)], {"name": "dedup_key", "unique": True, "sparse": True}),
+        ([("content_hash", ASCENDING)], {"name": "content_hash", "sparse": True}),
+        # Incremental vector store syncs (find_changed_since)
+        ([("updated_at", ASCENDING)], {"name": "updated_at"})
+    ],
+    "job_offers": [
+        ([("status", ASCENDING)], {"name": "status"})
+    ]
+}
+
+_indexed = set()
+_indexed_lock = threading.Lock()
+
+
+def ensure_indexes(mongodb_uri=None, client=None):
+    """
+    Create the secondary indexes of the collections, once per process and database.
+
+    create_index is a no-op for an index that already exists, so this is safe
+    to call at every startup.
+
+    Args:
+        mongodb_uri: MongoDB connection URI (optional)
+        client: MongoDB client to use instead of the shared one (optional)
+
+    Returns:
+        list: Names of the indexes checked, as 'collection.index'
+    """
+    database = get_database(mongodb_uri, client)
+    key = (id(database.client), database.name)
+    with _indexed_lock:
+        if key in _indexed:
+            return []
+        names = []
+        for collection_name, indexes in INDEXES.items():
+            for keys, options in indexes:
+                name = database[collection_name].create_index(keys, **options)
+                names.append(f"{collection_name}.{name}")
+        _indexed.add(key)
+    logger.info(f"MongoDB indexes ready: {', '.join(names)}")
+    return names
+
+
+def pool_metrics():
+    """Return the connection pool metrics of the shared clients."""
+    metrics = pool_metrics_listener.snapshot()
+    metrics["clients"] = len(_clients)
+    return metrics
+
+
+def convert_objectid_to_str(obj):
+    """Convert ObjectId values to strings in nested dictionaries and lists."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    elif isinstance(obj, dict):
+        return {k: convert_objectid_to_str(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_objectid_to_str(item) for item in obj]
+    return obj
+
+
+def to_object_id(document_id):
+    """Convert a document id given as a string to an ObjectId when it is a valid one."""
+    if isinstance(document_id, str) and ObjectId.is_valid(document_id):
+        return ObjectId(document_id)
+    return document_id
+
+
+def utc_now():
+    """Return the current time as a naive UTC datetime, the form in which MongoDB returns dates."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Fields added to the CV documents when they are saved, not part of the CV content
+STORAGE_FIELDS = ("_id", "updated_at", "dedup_key", "content_hash")
+
+
+def cv_content(cv):
+    """Return a copy of a CV without its storage fields."""
+    return {key: value for key, value in cv.items() if key not in STORAGE_FIELDS}
+
+
+def cv_email(cv):
+    """Return the email of a CV, or an empty string."""
+    informations = cv.get("informations_personnelles") or {}
+    email = informations.get("email") if isinstance(informations, dict) else None
+    return email.strip() if isinstance(email, str) else ""
+
+
+def cv_dedup_key(cv):
+    """
+    Return the key identifying the candidate of a CV across uploads.
+
+    The candidate's email when the CV has one (a new version of a CV replaces
+    the previous one), else the hash of the uploaded file (content_hash), else
+    the hash of the structured content.
+    """
+    email = cv_email(cv)
+    if email:
+        return f"email:{email.lower()}"
+    if cv.get("content_hash"):
+        return f"sha256:{cv['content_hash']}"
+    serialized = json.dumps(cv_content(cv), ensure_ascii=False, sort_keys=True, default=str)
+    return f"json:{hashlib.sha256(serialized.encode('utf-8')).hexdigest()}"
+
+
+class CVRepository:
+    """
+    Access to the structured CVs stored in MongoDB.
+    """
+
+    def __init__(self, mongodb_uri=None, client=None, collection_name="cvs"):
+        """
+        Initialize the repository.
+
+        Args:
+            mongodb_uri: MongoDB connection URI (optional)
+            client: MongoDB client to use instead of the shared one (optional)
+            collection_name: Name of the CV collection
+        """
+        self.collection = get_database(mongodb_uri, client)[collection_name]
+
+    def insert(self, cv):
+        """
+        Insert a structured CV, stamped with its update time.
+
+        The stored document is a copy: the caller's CV is left unchanged (and JSON-serializable).
+
+        Returns:
+            str: The ID of the inserted document
+        """
+        return str(self.collection.insert_one(dict(cv, updated_at=utc_now())).inserted_id)
+
+    def insert_many(self, cvs):
+        """
+        Insert several structured CVs in one round trip.
+
+        The insert is unordered: the server writes the documents in parallel
+        and a failing document does not stop the others. The stored documents
+        are copies: the caller's CVs are left unchanged.
+
+        Returns:
+            list: The IDs of the inserted documents, in input order
+        """
+        if not cvs:
+            return []
+        now = utc_now()
+        documents = [dict(cv, updated_at=now) for cv in cvs]
+        return [str(inserted_id) for inserted_id in self.collection.insert_many(documents, ordered=False).inserted_ids]
+
+    @staticmethod
+    def _prepare_upsert(cv, now):
+        """
+        Build the stored document of a CV for an upsert.
+
+        Returns:
+            tuple: (filter matching its stored version, stamped copy of the CV)
+        """
+        document = {key: value for key, value in cv.items() if key != "_id"}
+        document["dedup_key"] = cv_dedup_key(document)
+        document["updated_at"] = now
+        email = cv_email(document)
+        if not email:
+            return {"dedup_key": document["dedup_key"]}, document
+        # A CV saved before dedup keys existed is taken over by the new version of its candidate
+        return {"$or": [
+            {"dedup_key": document["dedup_key"]},
+            {"dedup_key": {"$exists": False}, "informations_personnelles.email": email}
+        ]}, document
+
+    def upsert(self, cv):
+        """
+        Save a structured CV, replacing the stored CV with the same dedup key (see cv_dedup_key).
+
+        Saving the same CV again, or a new version of a candidate's CV, keeps a
+        single document, under its original id. The stored document is a
+        stamped copy: the caller's CV is left unchanged.
+
+        Returns:
+            str: The ID of the inserted or replaced document
+        """
+        query, document = self._prepare_upsert(cv, utc_now())
+        try:
+            saved = self.collection.find_one_and_replace(
+                query, document, projection={"_id": 1}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent upsert inserted the same key first: replace its document
+            saved = self.collection.find_one_and_replace(
+                query, document, projection={"_id": 1}, return_document=ReturnDocument.AFTER
+            )
+        return str(saved["_id"])
+
+    def upsert_many(self, cvs):
+        """
+        Save several structured CVs in one round trip, replacing the stored CVs with the same dedup keys.
+
+        CVs of the same batch sharing a dedup key are saved once, the last one
+        winning; they all get the id of the saved document. The caller's CVs
+        are left unchanged.
+
+        Returns:
+            list: The IDs of the inserted or replaced documents, in input order
+        """
+        if not cvs:
+            return []
+        now = utc_now()
+        keys = []
+        latest = {}
+        for cv in cvs:
+            query, document = self._prepare_upsert(cv, now)
+            keys.append(document["dedup_key"])
+            latest[document["dedup_key"]] = (query, document)
+        requests = [ReplaceOne(query, document, upsert=True) for query, document in latest.values()]
+        try:
+            self.collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            # Keys inserted concurrently by another writer: replace their documents
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            retry = [requests[error["index"]] for error in e.details["writeErrors"]]
+            self.collection.bulk_write(retry, ordered=False)
+
+        ids = {
+            document["dedup_key"]: document["_id"]
+            for document in self.collection.find({"dedup_key": {"$in": list(latest)}}, {"dedup_key": 1})
+        }
+        return [str(ids[key]) for key in keys]
+
+    def find_by_email(self, email):
+        """Return the CV of a candidate from their email, or None."""
+        return self.collection.find_one({"informations_personnelles.email": email})
+
+    def find_by_ids(self, cv_ids, projection=None):
+        """
+        Load the CVs matching a list of ids.
+
+        Returns:
+            dict: CV documents indexed by their id as a string
+        """
+        query = {"_id": {"$in": [to_object_id(cv_id) for cv_id in cv_ids]}}
+        return {str(cv["_id"]): cv for cv in self.collection.find(query, projection)}
+
+    def find_all(self, projection=None):
+        """Iterate over all the CVs, loading only the projected fields."""
+        return self.collection.find({}, projection)
+
+    def find_changed_since(self, updated_after=None, after_id=None, projection=None):
+        """
+        Iterate over the CVs written after a high-water mark.
+
+        CVs stamped with updated_at are selected by their update time, CVs
+        without it (written by other tools) by their id.
+
+        Args:
+            updated_after: Last update time already seen (None for all stamped CVs)
+            after_id: Last id already seen among unstamped CVs (None for all of them)
+            projection: Fields to load
+
+        Returns:
+            Cursor: Changed CVs, loading only the projected fields
+        """
+        stamped = {"updated_at": {"$gt": updated_after}} if updated_after else {"updated_at": {"$exists": True}}
+        unstamped = {"updated_at": {"$exists": False}}
+        if after_id is not None:
+            unstamped["_id"] = {"$gt": to_object_id(after_id)}
+        return self.collection.find({"$or": [stamped, unstamped]}, projection)
+
+    def find_ids(self):
+        """Return the ids of all the CVs as strings."""
+        return {str(cv["_id"]) for cv in self.collection.find({}, {"_id": 1})}
+
+    def watch(self, pipeline=None, resume_after=None):
+        """
+        Open a change stream on the CV collection (requires a replica set).
+
+        Returns:
+            ChangeStream: Stream of the changes, with the full document of inserts and updates
+        """
+        return self.collection.watch(pipeline, full_document="updateLookup", resume_after=resume_after)
+
+    def delete(self, cv_id):
+        """
+        Delete a CV.
+
+        Returns:
+            bool: True if a document was deleted
+        """
+        return self.collection.delete_one({"_id": to_object_id(cv_id)}).deleted_count > 0
+
+
+class JobOfferRepository:
+    """
+    Access to the job offers stored in MongoDB, with their materialized shortlist.
+
+    The shortlist of an offer is a list of {"cv_id", "score"} entries, best first.
+    """
+
+    def __init__(self, mongodb_uri=None, client=None, collection_name="job_offers"):
+        """
+        Initialize the repository.
+
+        Args:
+            mongodb_uri: MongoDB connection URI (optional)
+            client: MongoDB client to use instead of the shared one (optional)
+            collection_name: Name of the job offer collection
+        """
+        self.collection = get_database(mongodb_uri, client)[collection_name]
+
+    def insert(self, offer):
+        """
+        Insert a job offer, stamped with its creation and update times.
+
+        Returns:
+            str: The ID of the inserted document
+        """
+        offer["created_at"] = offer["updated_at"] = utc_now()
+        return str(self.collection.insert_one(offer).inserted_id)
+
+    def get(self, offer_id, projection=None):
+        """Return a job offer from its id, or None."""
+        return self.collection.find_one({"_id": to_object_id(offer_id)}, projection)
+
+    def find_open(self, projection=None):
+        """Iterate over the open job offers, loading only the projected fields."""
+        return self.collection.find({"status": "open"}, projection)
+
+    def set_status(self, offer_id, status):
+        """
+        Change the status of a job offer ('open' or 'closed').
+
+        Returns:
+            bool: True if the offer exists
+        """
+        result = self.collection.update_one(
+            {"_id": to_object_id(offer_id)}, {"$set": {"status": status, "updated_at": utc_now()}}
+        )
+        return result.matched_count > 0
+
+    def set_shortlist(self, offer_id, shortlist, version):
+        """Replace the shortlist of a job offer, computed with the given vector version."""
+        self.collection.update_one(
+            {"_id": to_object_id(offer_id)},
+            {"$set": {"shortlist": shortlist, "shortlist_version": version, "updated_at": utc_now()}}
+        )
+
+    def merge_into_shortlists(self, merges, size):
+        """
+        Merge scored CVs into the shortlists of several offers in one round trip.
+
+        Entries already present for a CV are replaced; each shortlist is kept
+        sorted and cut to its size by the server.
+
+        Args:
+            merges: Dictionary of the new {"cv_id", "score"} entries by offer id
+            size: Length of the shortlists
+        """
+        operations = []
+        for offer_id, entries in merges.items():
+            query = {"_id": to_object_id(offer_id)}
+            cv_ids = [entry["cv_id"] for entry in entries]
+            operations.append(UpdateOne(query, {"$pull": {"shortlist": {"cv_id": {"$in": cv_ids}}}}))
+            operations.append(UpdateOne(query, {
+                "$push": {"shortlist": {"$each": entries, "$sort": {"score": -1}, "$slice": size}},
+                "$set": {"updated_at": utc_now()}
+            }))
+        if operations:
+            self.collection.bulk_write(operations, ordered=True)
+
+    def remove_from_shortlists(self, cv_ids):
+        """Remove CVs (deleted from the corpus) from every shortlist."""
+        self.collection.update_many(
+            {"shortlist.cv_id": {"$in": list(cv_ids)}},
+            {"$pull": {"shortlist": {"cv_id": {"$in": list(cv_ids)}}}}
+        )
+
+
+class ProfileRepository:
+    """
+    Access to the IT profiles stored in MongoDB.
+    """
+
+    def __init__(self, mongodb_uri=None, client=None, collection_name="profiles"):
+        """
+        Initialize the repository.
+
+        Args:
+            mongodb_uri: MongoDB connection URI (optional)
+            client: MongoDB client to use instead of the shared one (optional)
+            collection_name: Name of the profile collection
+        """
+        self.collection = get_database(mongodb_uri, client)[collection_name]
+
+    def list(self, limit=None):
+        """
+        Load the IT profiles, with their id converted to a string.
+
+        Args:
+            limit: Maximum number of profiles (all if None)
+        """
+        cursor = self.collection.find()
+        if limit:
+            cursor = cursor.limit(limit)
+        profiles = list(cursor)
+        for profile in profiles:
+            if '_id' in profile:
+                profile['_id'] = str(profile['_id'])
+        return profiles
+
+
+def get_cv_collection(mongodb_uri=None):
+    """Return the CV collection of the shared client."""
+    return CVRepository(mongodb_uri).collection
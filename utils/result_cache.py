@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300
+
+
+class _Flight:
+    """A computation in progress, awaited by the callers asking for the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    In-memory LRU cache of computed results with single-flight coalescing.
+
+    Concurrent lookups of a missing key run the computation once: the first
+    caller computes, the others wait for its result. Keys should embed
+    everything the result depends on (such as a corpus version), so stale
+    entries are never hit and simply age out of the LRU order.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries, defaults to RESULT_CACHE_MAX_ENTRIES (1024);
+                0 disables the cache (single-flight still applies)
+            ttl: Lifetime of the entries in seconds, defaults to RESULT_CACHE_TTL (300); 0 for no expiry
+        """
+        self.max_entries = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)) \
+            if max_entries is None else max_entries
+        self.ttl = float(os.environ.get("RESULT_CACHE_TTL", DEFAULT_TTL)) if ttl is None else ttl
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+
+    def _lookup(self, key):
+        """Return (True, result) for a live entry, (False, None) otherwise. Called with the lock held."""
+        item = self._entries.get(key)
+        if item is None:
+            return False, None
+        result, expires_at = item
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, result
+
+    def _store(self, key, result):
+        """Add an entry, evicting the least recently used ones. Called with the lock held."""
+        if not self.max_entries:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key, default=None):
+        """Return the cached result of a key, or default."""
+        with self._lock:
+            found, result = self._lookup(key)
+        return result if found else default
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        """
+        Return the cached result of a key, computing it once if it is missing.
+
+        Args:
+            key: Hashable cache key
+            compute: Function without arguments computing the result
+            should_cache: Function telling whether a result may be cached (optional, all by default)
+
+        Returns:
+            The cached or computed result (errors of compute are raised to every waiting caller)
+        """
+        with self._lock:
+            found, result = self._lookup(key)
+            if found:
+                self.stats["hits"] += 1
+                return result
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                self.stats["misses"] += 1
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and (should_cache is None or should_cache(flight.result)):
+                    self._store(key, flight.result)
+            flight.done.set()
+
+    def clear(self):
+        """Remove all the entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        """
+        Return the usage statistics of the cache.
+
+        Returns:
+            dict: Counters, hit rate and number of entries
+        """
+        with self._lock:
+            metrics = dict(self.stats)
+            metrics["entries"] = len(self._entries)
+        lookups = metrics["hits"] + metrics["misses"] + metrics["coalesced"]
+        metrics["hit_rate"] = (metrics["hits"] + metrics["coalesced"]) / lookups if lookups else None
+        metrics["max_entries"] = self.max_entries
+        return metrics
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_result_cache(name, max_entries=None, ttl=None):
+    """
+    Return the process-wide result cache of a name.
+
+    Args:
+        name: Name of the cache
+        max_entries: Maximum number of entries (optional)
+        ttl: Lifetime of the entries in seconds (optional)
+
+    Returns:
+        ResultCache: Shared cache
+    """
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = ResultCache(max_entries, ttl)
+        return _caches[name]
+
+
+def result_cache_metrics():
+    """Return the usage statistics of the process-wide result caches, by name."""
+    with _caches_lock:
+        return {name: cache.metrics() for name, cache in _caches.items()}